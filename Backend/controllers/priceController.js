@@ -1,32 +1,26 @@
 import axios from "axios";
-import Machine from "../models/Machine.js";
 import dotenv from "dotenv";
 dotenv.config();
 
+// budget for the ML call; sent along so the ML service can skip slow
+// enrichment or shed the request instead of working past our timeout
+const ML_TIMEOUT_MS = Number(process.env.ML_TIMEOUT_MS || 10000);
+
 export const predictPrice = async (req, res) => {
   try {
     const body = req.body || {};
-    const pincode = body.pincode;
-    const machine_type = (body.machine_type || "").trim();
-    const machines = await Machine.find({ pincode, type: machine_type });
-
-    let marketTrend = 1.0;
-    if (machines.length >= 1) {
-      const avgCurrent = machines.reduce((sum, m) => sum + (m.rentPerHour || 0), 0) / machines.length;
-      const avgLast = machines.reduce((sum, m) => sum + (m.last_year_price || avgCurrent), 0) / machines.length;
-      const growth = (avgCurrent - avgLast) / (avgLast || 1);
-      marketTrend = 1 + Math.max(-0.20, Math.min(0.20, growth * 0.25));
-    }
-
+    // market trend / stock / bookings are maintained by the ML service (market_stats.py)
     const mlPayload = {
       ...body,
-      market_trend_score: marketTrend,
       created_at: body.created_at || new Date().toISOString(),
     };
 
     const mlUrl = process.env.ML_SERVICE_URL || "http://127.0.0.1:5001/predict";
 
-    const mlRes = await axios.post(mlUrl, mlPayload, { timeout: 120000 });
+    const mlRes = await axios.post(mlUrl, mlPayload, {
+      timeout: ML_TIMEOUT_MS,
+      headers: { "X-Request-Timeout-Ms": String(ML_TIMEOUT_MS) },
+    });
     const price = mlRes.data?.predicted_rental_price ?? mlRes.data?.predicted_price ?? mlRes.data?.price;
     if (!price && price !== 0) {
       return res.status(500).json({ success: false, message: "ML did not return price", raw: mlRes.data });
@@ -36,11 +30,18 @@ export const predictPrice = async (req, res) => {
       success: true,
       price: Number(price),
       demand_index: mlRes.data?.demand_index,
-      market_trend_score: marketTrend,
+      market_trend_score: mlRes.data?.market_trend_score ?? 1.0,
+      // median rentPerHour of the nearest live listings (comparables.py), null when none
+      comparable_price: mlRes.data?.comparable_price ?? null,
+      comparables: mlRes.data?.comparables ?? 0,
       note: mlRes.data?.note || "OK",
     });
 
   } catch (err) {
+    if (err.response?.status === 503) {
+      res.set("Retry-After", err.response.headers?.["retry-after"] || "1");
+      return res.status(503).json({ success: false, message: "Pricing service busy, please retry" });
+    }
     console.error("🔥 BACKEND ML ERROR:", err.message || err);
     return res.status(500).json({ success: false, message: "Prediction failed", error: err.message });
   }
@@ -3,6 +3,29 @@ import Rental from "../models/Rental.js";
 import User from "../models/User.js";
 import Machine from "../models/Machine.js";
 import mongoose from "mongoose";
+import axios from "axios";
+
+// Precomputed dashboards from the ML service (analytics_engine.py); opt-in.
+// ML_ANALYTICS_URL must include the /analytics prefix,
+// e.g. http://localhost:8000/analytics
+const ANALYTICS_URL = process.env.ML_ANALYTICS_URL;
+
+// null → compute from Mongo: not configured, unreachable, or the ML
+// service's store is not seeded yet (503; its zeros would not be real)
+const fetchPrecomputed = async (path) => {
+  if (!ANALYTICS_URL) return null;
+  try {
+    const { data } = await axios.get(`${ANALYTICS_URL}${path}`, { timeout: 2000 });
+    return data;
+  } catch (err) {
+    if (err.response?.status === 503) {
+      console.warn("Precomputed analytics not seeded yet; using Mongo");
+    } else {
+      console.warn("Precomputed analytics unavailable:", err.message);
+    }
+    return null;
+  }
+};
 
 //GET OWNER MACHINE IDS
 const getOwnerMachineIds = async (ownerId) => {
@@ -335,6 +358,9 @@ export const getOwnerAnalytics = async (req, res) => {
   try {
     const { ownerId } = req.params;
 
+    const precomputed = await fetchPrecomputed(`/owner/${ownerId}`);
+    if (precomputed) return res.json(precomputed);
+
     const rentals = await Rental.find({
       ownerId,
       status: "completed",
@@ -418,6 +444,9 @@ export const getRenterAnalytics = async (req, res) => {
   try {
     const { renterId } = req.params;
 
+    const precomputed = await fetchPrecomputed(`/renter/${renterId}`);
+    if (precomputed) return res.json(precomputed);
+
     const rentals = await Rental.find({ renterId })
       .populate("machineId", "type")
       .sort({ startTime: 1 });
@@ -1,7 +1,8 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from datetime import datetime
+from services.rule_tables import RuleTables
 
 app = FastAPI(title="AgriRent Pricing API")
 
@@ -13,21 +14,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def get_season(month: int):
-    if month in [3,4,5]:
-        return "summer"
-    if month in [6,7,8]:
-        return "monsoon"
-    if month in [9,10,11]:
-        return "harvest"
-    return "winter"
-
-def confidence(multiplier: float):
-    if multiplier >= 1.25:
-        return "High"
-    if multiplier >= 1.1:
-        return "Medium"
-    return "Low"
+# season × input lookup tables, built once (formulas in services/rule_tables.py)
+rules = RuleTables()
 
 # ================= TRACTOR =================
 
@@ -43,19 +31,8 @@ class TractorInput(BaseModel):
         extra = "forbid"
 
 @app.post("/predict/tractor")
-def predict_tractor(data: TractorInput):
-    season = get_season(datetime.now().month)
-    base = 450
-    hp_factor = data.horsepower / 50
-    wear = max(0.7, 1 - data.age_years * 0.04)
-    demand = 1.25 if season == "harvest" else 1.0
-
-    price = base * hp_factor * wear * demand
-    return {
-        "final_price": round(price, 2),
-        "pricing_unit": "per_hour",
-        "confidence": confidence(demand),
-    }
+async def predict_tractor(data: TractorInput):
+    return rules.quote("tractor", horsepower=data.horsepower, age_years=data.age_years)
 
 # ================= HARVESTER =================
 
@@ -69,17 +46,8 @@ class HarvesterInput(BaseModel):
         extra = "forbid"
 
 @app.post("/predict/harvester")
-def predict_harvester(data: HarvesterInput):
-    season = get_season(datetime.now().month)
-    base = 1800
-    crop = 1.3 if data.crop_type.lower() in ["paddy","wheat"] and season=="harvest" else 1.0
-    wear = max(0.8, 1 - data.age_years * 0.03)
-    price = base * crop * wear
-    return {
-        "final_price": round(price,2),
-        "pricing_unit": "per_acre",
-        "confidence": confidence(crop),
-    }
+async def predict_harvester(data: HarvesterInput):
+    return rules.quote("harvester", crop_type=data.crop_type, age_years=data.age_years)
 
 # ================= PUMP =================
 
@@ -92,17 +60,8 @@ class PumpInput(BaseModel):
         extra = "forbid"
 
 @app.post("/predict/pump")
-def predict_pump(data: PumpInput):
-    season = get_season(datetime.now().month)
-    base = 120
-    fuel = {"diesel":1.2,"electric":0.9,"solar":0.8}.get(data.pump_type.lower(),1)
-    demand = 1.3 if season=="summer" else 1.0
-    price = base * fuel * demand
-    return {
-        "final_price": round(price,2),
-        "pricing_unit": "per_hour",
-        "confidence": confidence(demand),
-    }
+async def predict_pump(data: PumpInput):
+    return rules.quote("pump", pump_type=data.pump_type)
 
 # ================= TRAILER =================
 
@@ -115,16 +74,8 @@ class TrailerInput(BaseModel):
         extra = "forbid"
 
 @app.post("/predict/trailer")
-def predict_trailer(data: TrailerInput):
-    season = get_season(datetime.now().month)
-    base = 300
-    demand = 1.15 if season in ["harvest","summer"] else 1
-    price = base * demand
-    return {
-        "final_price": round(price,2),
-        "pricing_unit": "per_hour",
-        "confidence": confidence(demand),
-    }
+async def predict_trailer(data: TrailerInput):
+    return rules.quote("trailer")
 
 # ================= SPRAYER =================
 
@@ -138,16 +89,8 @@ class SprayerInput(BaseModel):
         extra = "forbid"
 
 @app.post("/predict/sprayer")
-def predict_sprayer(data: SprayerInput):
-    base = 200
-    cap = data.tank_capacity / 400
-    wear = max(0.8, 1 - data.age_years * 0.03)
-    price = base * cap * wear
-    return {
-        "final_price": round(price,2),
-        "pricing_unit": "per_hour",
-        "confidence": "Medium",
-    }
+async def predict_sprayer(data: SprayerInput):
+    return rules.quote("sprayer", tank_capacity=data.tank_capacity, age_years=data.age_years)
 
 # ================= WEEDER =================
 
@@ -161,13 +104,24 @@ class WeederInput(BaseModel):
         extra = "forbid"
 
 @app.post("/predict/weeder")
-def predict_weeder(data: WeederInput):
-    base = 250
-    hp = data.horsepower / 10
-    wear = max(0.75, 1 - data.age_years * 0.04)
-    price = base * hp * wear
-    return {
-        "final_price": round(price,2),
-        "pricing_unit": "per_hour",
-        "confidence": "Medium",
-    }
+async def predict_weeder(data: WeederInput):
+    return rules.quote("weeder", horsepower=data.horsepower, age_years=data.age_years)
+
+# ================= BULK (columnar, many listings per call) =================
+
+@app.post("/predict/bulk")
+async def predict_bulk(request: Request):
+    """
+    {"machine_type": "tractor" | [...], "horsepower": [...], "age_years": [...], ...}
+    → {"final_price": [...], "pricing_unit": [...], "confidence": [...]}
+
+    Columns are validated as whole arrays instead of one pydantic model per
+    listing; only the fields each machine's rule reads are needed.
+    """
+    body = await request.json()
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=422, detail="expected a JSON object of columns")
+    try:
+        return JSONResponse(rules.quote_bulk(body))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
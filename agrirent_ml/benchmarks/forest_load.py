@@ -0,0 +1,63 @@
+# benchmarks/forest_load.py
+# Load time, RSS and predict latency: joblib pipelines vs compact forests.
+# Run from agrirent_ml/:  python benchmarks/forest_load.py
+
+import json, os, subprocess, sys
+
+CHILD = r"""
+import json, resource, sys, time
+sys.path.insert(0, ".")
+import numpy as np, pandas as pd
+import joblib, sklearn.compose, sklearn.ensemble, sklearn.pipeline  # keep import cost out of load_s
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+kind, name = sys.argv[1], sys.argv[2]
+t0 = time.perf_counter()
+if kind == "joblib":
+    model = joblib.load(f"ml/{name}_model.joblib")
+    rf = model.named_steps["rf"]
+    per_tree = lambda X: np.stack([t.predict(X) for t in rf.estimators_])
+else:
+    from services.compact_forest import load_forest
+    model = load_forest(f"ml/{name}_forest")
+    per_tree = model.named_steps["rf"].predict_trees
+load_s = time.perf_counter() - t0
+
+prep = model.named_steps["prep"]
+cols = list(prep.feature_names_in_)
+num = set(prep.transformers_[1][2]) if len(prep.transformers_) > 1 else set()
+frame = pd.DataFrame([{c: (50.0 if c in num else "x") for c in cols}] * 256)
+X = prep.transform(frame)
+per_tree(X[:1])
+t0 = time.perf_counter()
+for _ in range(20):
+    per_tree(X[:1])
+single_ms = (time.perf_counter() - t0) / 20 * 1000
+t0 = time.perf_counter()
+per_tree(X)
+batch_ms = (time.perf_counter() - t0) * 1000
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base
+print(json.dumps({"load_s": load_s, "rss_kb": rss, "single_ms": single_ms, "batch256_ms": batch_ms}))
+"""
+
+
+def _size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def run(kind, name):
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", CHILD, kind, name],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    print(f"{'model':<8}{'format':<9}{'size KB':>9}{'load ms':>10}{'ΔRSS MB':>10}{'1-row ms':>10}{'256-row ms':>12}")
+    for name in ["price", "demand"]:
+        for kind, path in [("joblib", f"ml/{name}_model.joblib"), ("compact", f"ml/{name}_forest")]:
+            if not os.path.exists(path):
+                continue
+            r = run(kind, name)
+            print(f"{name:<8}{kind:<9}{_size(path) / 1024:>9.0f}{r['load_s'] * 1000:>10.1f}"
+                  f"{r['rss_kb'] / 1024:>10.1f}{r['single_ms']:>10.2f}{r['batch256_ms']:>12.2f}")
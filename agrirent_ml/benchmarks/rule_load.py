@@ -0,0 +1,132 @@
+# benchmarks/rule_load.py
+# Local load test for the rule endpoints in api.py: per-request formulas
+# (season from the clock, sync handler on the threadpool, as before) vs the
+# precomputed season tables, and per-listing calls vs one /predict/bulk call.
+# Run from agrirent_ml/:  python benchmarks/rule_load.py [--requests 4000 --concurrency 32]
+
+import argparse, asyncio, logging, os, socket, subprocess, sys, time
+from datetime import datetime
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api import TractorInput  # noqa: E402
+from services import rule_tables  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+TRACTOR = {"horsepower": 50, "attachment_type": "plough", "age_years": 3, "hours_used": 1200, "pincode": 641001}
+
+
+def formula_app() -> FastAPI:
+    """/predict/tractor as it was: season and factors evaluated per request."""
+    app = FastAPI()
+
+    @app.post("/predict/tractor")
+    def predict_tractor(data: TractorInput):
+        season = rule_tables.get_season(datetime.now().month)
+        price, conf = rule_tables.tractor(season, data.horsepower, data.age_years)
+        return {"final_price": round(price, 2), "pricing_unit": "per_hour", "confidence": conf}
+
+    return app
+
+
+def serve(target: str) -> tuple[str, subprocess.Popen]:
+    """uvicorn in its own process, so the client does not share its GIL."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    cmd = [sys.executable, "-m", "uvicorn", target, "--port", str(port), "--log-level", "warning"]
+    if target.endswith("_app"):
+        cmd.append("--factory")
+    proc = subprocess.Popen(cmd)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            httpx.get(url + "/docs")
+            return url, proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{target} did not start")
+
+
+async def closed_loop(url: str, bodies: list, concurrency: int) -> dict:
+    """`concurrency` clients, each sending its next request when the last returns."""
+    lat, queue = [], iter(bodies)
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def worker():
+            for body in queue:
+                t0 = time.perf_counter()
+                r = await client.post(url, json=body, timeout=None)
+                r.raise_for_status()
+                lat.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+    lat = np.asarray(lat)
+    return {"calls": len(lat), "wall_s": wall, "p50_ms": float(np.percentile(lat, 50)),
+            "p99_ms": float(np.percentile(lat, 99))}
+
+
+def handler_us(rng, n: int = 20000) -> dict:
+    """Pricing work per listing without HTTP: formula vs table lookup vs bulk columns."""
+    tables = rule_tables.RuleTables()
+    hp, age = rng.integers(20, 120, n).tolist(), rng.integers(0, 15, n).tolist()
+
+    def formula():
+        for h, a in zip(hp, age):
+            season = rule_tables.get_season(datetime.now().month)
+            price, conf = rule_tables.tractor(season, h, a)
+            round(price, 2)
+
+    def table():
+        for h, a in zip(hp, age):
+            tables.quote("tractor", horsepower=h, age_years=a)
+
+    def bulk():
+        tables.quote_bulk({"machine_type": "tractor", "horsepower": hp, "age_years": age})
+
+    out = {}
+    for name, fn in [("formula", formula), ("table", table), ("bulk", bulk)]:
+        t0 = time.perf_counter()
+        fn()
+        out[name] = (time.perf_counter() - t0) / n * 1e6
+    return out
+
+
+def report(name: str, listings: int, r: dict) -> None:
+    print(f"{name:<34}{r['calls']:>7}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}{listings / r['wall_s']:>14.0f}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Load-test the rule pricer: formulas vs tables, single vs bulk")
+    ap.add_argument("--requests", type=int, default=4000, help="single-listing calls per run")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--bulk-size", type=int, default=2000, help="listings per /predict/bulk call")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    hp, age = rng.integers(20, 120, args.requests), rng.integers(0, 15, args.requests)
+    singles = [{**TRACTOR, "horsepower": int(h), "age_years": int(a)} for h, a in zip(hp, age)]
+    n_bulk = max(1, args.requests // args.bulk_size) * 4
+    bulk = [{"machine_type": "tractor", "horsepower": rng.integers(20, 120, args.bulk_size).tolist(),
+             "age_years": rng.integers(0, 15, args.bulk_size).tolist()} for _ in range(n_bulk)]
+
+    h = handler_us(rng)
+    print(f"pricing work per listing (no HTTP): formula {h['formula']:.2f} us, "
+          f"table {h['table']:.2f} us, bulk {h['bulk']:.3f} us\n")
+    print(f"{'':<34}{'calls':>7}{'p50 ms':>9}{'p99 ms':>9}{'listings/s':>14}")
+    for name, target, path, bodies, per_call, conc in [
+        ("tractor, per-request formula", "benchmarks.rule_load:formula_app", "/predict/tractor", singles, 1, args.concurrency),
+        ("tractor, season tables", "api:app", "/predict/tractor", singles, 1, args.concurrency),
+        (f"bulk x{args.bulk_size}, season tables", "api:app", "/predict/bulk", bulk, args.bulk_size, 4),
+    ]:
+        base, proc = serve(target)
+        asyncio.run(closed_loop(base + path, bodies[:50], conc))            # warm up
+        r = asyncio.run(closed_loop(base + path, bodies, conc))
+        report(name, len(bodies) * per_call, r)
+        proc.terminate()
+        proc.wait()
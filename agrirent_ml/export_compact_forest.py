@@ -0,0 +1,10 @@
+# export_compact_forest.py
+# Convert the saved joblib pipelines into memory-mappable flat arrays.
+
+import joblib
+from services.compact_forest import export_forest
+
+for name in ["price", "demand"]:
+    model = joblib.load(f"ml/{name}_model.joblib")
+    export_forest(model, f"ml/{name}_forest")
+    print(f"✅ ml/{name}_model.joblib → ml/{name}_forest/")
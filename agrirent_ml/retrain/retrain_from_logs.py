@@ -1,6 +1,19 @@
-import pandas as pd, os
+# Run from agrirent_ml/:  python retrain/retrain_from_logs.py [--per-stratum 500 --half-life-days 90]
+# Logged requests → deduplicated, stratified sample (retrain/sampling.py) → combined_data.csv
+import argparse, os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from retrain.sampling import sample_logs
+
+ap = argparse.ArgumentParser(description="Prepare retrain/combined_data.csv from logs/requests.csv")
+ap.add_argument("--per-stratum", type=int, default=500, help="rows kept per (machine_type, month, state)")
+ap.add_argument("--half-life-days", type=float, default=90, help="recency weighting; 0 = uniform")
+ap.add_argument("--chunksize", type=int, default=100_000)
+args = ap.parse_args()
+
 if not os.path.exists("logs/requests.csv"):
     raise SystemExit("No logs found")
-df = pd.read_csv("logs/requests.csv")
+df, stats = sample_logs("logs/requests.csv", args.per_stratum, args.half_life_days, args.chunksize)
 df.to_csv("retrain/combined_data.csv", index=False)
-print("Retraining dataset prepared")
+print(f"Read {stats['rows_in']} rows: {stats['exact_dups']} exact / {stats['near_dups']} near duplicates, "
+      f"{stats['below_threshold'] + stats['evicted']} not sampled")
+print(f"Retraining dataset prepared: {stats['rows_out']} rows in {stats['strata']} strata")
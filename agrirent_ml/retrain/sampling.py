@@ -0,0 +1,116 @@
+# sampling.py
+# Dedup + stratified weighted reservoir sampling of logs/requests.csv for
+# retraining, streamed chunk by chunk in bounded memory.
+#
+# Each row gets two hashes of its normalized features (everything but the
+# timestamp; strings stripped/lower-cased):
+#   exact  numerics rounded to 6 decimals
+#   near   numerics snapped to NEAR_QUANTUM (price to ~2% log buckets), so
+#          smart_predict's fixed horsepower=50 / age_years=3 rows with the
+#          same inputs collapse into one
+# Sampling is per stratum (machine_type, month, region=state): keep the
+# `per_stratum` rows with the largest A-Res key log(u) / w, where u is drawn
+# from the near hash (every member of a near-duplicate group shares it, so a
+# group can hold at most one slot, its newest row) and w = 2^(age/half-life)
+# favours recent traffic. Memory is strata × per_stratum rows plus a chunk,
+# however large the log.
+import numpy as np
+import pandas as pd
+
+NEAR_QUANTUM = {"horsepower": 5, "age_years": 1, "hours_used": 100, "diesel_price": 1, "demand_signal": 0.05}
+PRICE_BUCKET = np.log(1.02)
+EPOCH = pd.Timestamp("2020-01-01")
+KEYS = ["_stratum", "_near", "_exact", "_prio"]
+
+def _hash(frame):
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+def _text(v):
+    """Hash of the stripped, lower-cased string; normalized once per distinct value."""
+    codes, uniq = pd.factorize(v, use_na_sentinel=False)
+    norm = pd.Index(uniq).astype(str).str.strip().str.lower()
+    return pd.util.hash_array(norm.to_numpy(dtype=object))[codes]
+
+def _normalize(chunk):
+    """(exact, near) frames of the normalized feature columns."""
+    exact, near = {}, {}
+    for c in chunk.columns:
+        if c == "timestamp":
+            continue
+        v = chunk[c]
+        if not pd.api.types.is_numeric_dtype(v):
+            exact[c] = near[c] = _text(v)
+            continue
+        exact[c] = v.round(6)
+        if c == "rental_price":
+            near[c] = np.floor(np.log(v.clip(lower=1e-6)) / PRICE_BUCKET)
+        else:
+            near[c] = (v / NEAR_QUANTUM.get(c, 0.01)).round()
+    return pd.DataFrame(exact), pd.DataFrame(near)
+
+class StratifiedSampler:
+    def __init__(self, per_stratum=500, half_life_days=90.0, seed=0):
+        self.per_stratum = per_stratum
+        self.decay = np.log(2) / (half_life_days * 86400) if half_life_days else 0.0
+        self.seed = np.uint64(seed)
+        self.pool = None
+        self.stats = {"rows_in": 0, "exact_dups": 0, "near_dups": 0, "below_threshold": 0, "evicted": 0}
+
+    def _keys(self, chunk):
+        ts = pd.to_datetime(chunk["timestamp"], errors="coerce")
+        exact, near = _normalize(chunk)
+        strata = pd.DataFrame({
+            "machine_type": exact["machine_type"],
+            "month": ts.dt.month.fillna(0).astype(int),
+            "region": exact["state"],
+        })
+        near = _hash(near)
+        u = (pd.util.hash_array(near ^ self.seed) >> np.uint64(11)) * 2.0 ** -53 + 2.0 ** -54
+        age_s = ((ts - EPOCH).dt.total_seconds().fillna(0.0)).to_numpy()
+        return chunk.assign(
+            _stratum=_hash(strata), _near=near, _exact=_hash(exact),
+            _prio=np.log(u) * np.exp(-self.decay * age_s),              # log(u) / w
+        )
+
+    def add(self, chunk):
+        chunk = self._keys(chunk.reset_index(drop=True))
+        self.stats["rows_in"] += len(chunk)
+        pool = chunk
+        if self.pool is not None:
+            # full strata: rows under the current k-th key can never get in
+            sizes = self.pool.groupby("_stratum")["_prio"].agg(["size", "min"])
+            full = sizes.loc[sizes["size"] >= self.per_stratum, "min"]
+            thr = chunk["_stratum"].map(full)
+            keep = thr.isna() | (chunk["_prio"] > thr)
+            self.stats["below_threshold"] += int((~keep).sum())
+            touched = self.pool["_stratum"].isin(chunk.loc[keep, "_stratum"].unique())
+            pool = pd.concat([self.pool[touched], chunk[keep]], ignore_index=True)
+            rest = self.pool[~touched]
+        pool = pool.sort_values("_prio", ascending=False, kind="stable")
+        dup = pool.duplicated(["_stratum", "_near", "_exact"])
+        self.stats["exact_dups"] += int(dup.sum())
+        pool = pool[~dup]
+        dup = pool.duplicated(["_stratum", "_near"])
+        self.stats["near_dups"] += int(dup.sum())
+        pool = pool[~dup]
+        keep = pool.groupby("_stratum", sort=False).cumcount() < self.per_stratum
+        self.stats["evicted"] += int((~keep).sum())
+        pool = pool[keep]
+        self.pool = pool if self.pool is None else pd.concat([rest, pool], ignore_index=True)
+
+    def result(self):
+        if self.pool is None:
+            return pd.DataFrame()
+        out = self.pool.sort_values(["_stratum", "_prio"], ascending=[True, False])
+        return out.drop(columns=KEYS).reset_index(drop=True)
+
+# logs written before the shared feature contract (services/logger.py rotates them aside)
+LEGACY_COLUMNS = {"region": "state", "fuel_price": "diesel_price", "demand_multiplier": "demand_signal", "price": "rental_price"}
+
+def sample_logs(path, per_stratum=500, half_life_days=90.0, chunksize=100_000, seed=0):
+    sampler = StratifiedSampler(per_stratum, half_life_days, seed)
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        sampler.add(chunk.rename(columns=LEGACY_COLUMNS))
+    out = sampler.result()
+    sampler.stats.update(rows_out=len(out), strata=int(sampler.pool["_stratum"].nunique()) if len(out) else 0)
+    return out, sampler.stats
@@ -0,0 +1,158 @@
+# compact_forest.py
+# Flat-array export of the RandomForest pipelines + a vectorized predictor.
+#
+# Layout of an exported directory:
+#   feature.npy   int16   split feature per node (0 on leaves)
+#   threshold.npy float32 split threshold, rounded down so float32 inputs
+#                         take exactly the same branch as sklearn
+#   left.npy      int32   global index of left child (self on leaves)
+#   right.npy     int32   global index of right child (self on leaves)
+#   value.npy     float32 leaf output, (nodes,) or (nodes, n_classes)
+#   roots.npy     int32   root node of each tree
+#   meta.json             depth, classes, importances, feature contract
+#   prep.joblib           fitted ColumnTransformer
+import json, os
+import joblib, numpy as np
+
+
+def _flatten(estimators, classifier):
+    feats, thrs, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    for est in estimators:
+        t = est.tree_
+        n = t.node_count
+        leaf = t.children_left < 0
+        idx = np.arange(offset, offset + n, dtype=np.int32)
+
+        thr = t.threshold.astype(np.float32)
+        up = thr.astype(np.float64) > t.threshold
+        thr[up] = np.nextafter(thr[up], np.float32(-np.inf))
+
+        feats.append(np.where(leaf, 0, t.feature).astype(np.int16))
+        thrs.append(np.where(leaf, 0, thr).astype(np.float32))
+        lefts.append(np.where(leaf, idx, t.children_left + offset).astype(np.int32))
+        rights.append(np.where(leaf, idx, t.children_right + offset).astype(np.int32))
+        if classifier:
+            v = t.value[:, 0, :]
+            v = v / np.maximum(v.sum(axis=1, keepdims=True), 1e-12)
+        else:
+            v = t.value[:, 0, 0]
+        values.append(v.astype(np.float32))
+        roots.append(offset)
+        offset += n
+
+    return {
+        "feature": np.concatenate(feats),
+        "threshold": np.concatenate(thrs),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "value": np.concatenate(values),
+        "roots": np.asarray(roots, dtype=np.int32),
+    }
+
+
+class CompactForest:
+    """Array-backed forest; `predict_trees` returns one row per tree."""
+
+    def __init__(self, arrays, max_depth, classes=None, feature_importances=None):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.max_depth = int(max_depth)
+        self.classes_ = None if classes is None else np.asarray(classes, dtype=object)
+        self.feature_importances_ = np.asarray(feature_importances or [], dtype=np.float64)
+
+    @classmethod
+    def from_sklearn(cls, rf):
+        classifier = hasattr(rf, "classes_")
+        return cls(
+            _flatten(rf.estimators_, classifier),
+            max(e.tree_.max_depth for e in rf.estimators_),
+            classes=list(rf.classes_) if classifier else None,
+            feature_importances=rf.feature_importances_.tolist(),
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def leaves(self, X):
+        """Leaf index reached by every (tree, sample) pair, walked level by level."""
+        X = np.asarray(X.toarray() if hasattr(X, "toarray") else X, dtype=np.float32)
+        rows = np.arange(X.shape[0])
+        node = np.repeat(np.asarray(self.roots)[:, None], X.shape[0], axis=1)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def predict_trees(self, X):
+        return self.value[self.leaves(X)]
+
+    def predict_proba(self, X):
+        return self.predict_trees(X).mean(axis=0)
+
+    def predict(self, X):
+        if self.classes_ is not None:
+            return self.classes_[self.predict_proba(X).argmax(axis=1)]
+        return self.predict_trees(X).mean(axis=0)
+
+
+class CompactPipeline:
+    """Drop-in for the saved sklearn Pipeline(prep, rf)."""
+
+    def __init__(self, prep, forest, feature_contract=None):
+        self.named_steps = {"prep": prep, "rf": forest}
+        self.feature_contract = feature_contract
+        self.feature_names_in_ = getattr(prep, "feature_names_in_", None)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        return cls(
+            model.named_steps["prep"],
+            CompactForest.from_sklearn(model.named_steps["rf"]),
+            getattr(model, "feature_contract", None),
+        )
+
+    def predict(self, frame):
+        return self.named_steps["rf"].predict(self.named_steps["prep"].transform(frame))
+
+
+def export_forest(model, path):
+    """Write a fitted Pipeline(prep, rf) as flat arrays under `path`."""
+    os.makedirs(path, exist_ok=True)
+    rf = model.named_steps["rf"]
+    classifier = hasattr(rf, "classes_")
+    for name, arr in _flatten(rf.estimators_, classifier).items():
+        np.save(os.path.join(path, f"{name}.npy"), arr)
+    joblib.dump(model.named_steps["prep"], os.path.join(path, "prep.joblib"))
+    meta = {
+        "max_depth": max(e.tree_.max_depth for e in rf.estimators_),
+        "classes": [str(c) for c in rf.classes_] if classifier else None,
+        "feature_importances": rf.feature_importances_.tolist(),
+        "feature_contract": getattr(model, "feature_contract", None),
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+
+def load_forest(path):
+    """Memory-map an exported forest; pages are shared between workers."""
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in ["feature", "threshold", "left", "right", "value", "roots"]
+    }
+    forest = CompactForest(arrays, meta["max_depth"], meta["classes"], meta["feature_importances"])
+    return CompactPipeline(joblib.load(os.path.join(path, "prep.joblib")), forest, meta["feature_contract"])
+
+
+def load_model(joblib_path, compact_path):
+    """Prefer the compact export; fall back to converting the joblib pipeline."""
+    if os.path.exists(os.path.join(compact_path, "meta.json")):
+        return load_forest(compact_path)
+    return CompactPipeline.from_sklearn(joblib.load(joblib_path))
@@ -1,11 +1,19 @@
 from datetime import datetime
 def get_weather_factor(): return 1.1
 def get_fuel_price(): return 95.0
-def build_features(machine_type, region):
+def get_season(month):
+    if month in [3,4,5]: return "summer"
+    if month in [6,7,8]: return "monsoon"
+    if month in [9,10,11]: return "harvest"
+    return "winter"
+def build_features(machine_type, region, **inputs):
+    month = datetime.now().month
     return {
         "machine_type": machine_type,
-        "region": region,
-        "month": str(datetime.now().month),
-        "fuel_price": get_fuel_price(),
-        "weather_factor": get_weather_factor()
+        "state": region,
+        "season": get_season(month),
+        "month": str(month),
+        "diesel_price": get_fuel_price(),
+        "weather_factor": get_weather_factor(),
+        **inputs
     }
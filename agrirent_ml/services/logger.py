@@ -1,11 +1,24 @@
 import csv, os
 from datetime import datetime
 LOG_FILE = "logs/requests.csv"
+HEADER = ["timestamp","machine_type","state","season","horsepower","age_years","hours_used","diesel_price","demand_signal","rental_price"]
 os.makedirs("logs", exist_ok=True)
+_checked = False
+def _rotate_legacy():
+    # a log started under another header (region/month before the shared feature contract) is moved aside, not appended to
+    with open(LOG_FILE, newline="") as f:
+        header = next(csv.reader(f), None)
+    if header != HEADER:
+        os.replace(LOG_FILE, LOG_FILE.replace(".csv", datetime.now().strftime(".legacy-%Y%m%d%H%M%S.csv")))
 def log_request(features, price, demand):
+    global _checked
+    if not _checked:
+        if os.path.exists(LOG_FILE):
+            _rotate_legacy()
+        _checked = True
     exists = os.path.exists(LOG_FILE)
     with open(LOG_FILE,"a",newline="") as f:
         w = csv.writer(f)
         if not exists:
-            w.writerow(["timestamp","machine_type","region","month","horsepower","age_years","hours_used","fuel_price","demand_multiplier","price"])
-        w.writerow([datetime.now().isoformat(),features["machine_type"],features["region"],features["month"],features["horsepower"],features["age_years"],features["hours_used"],features["fuel_price"],demand,price])
+            w.writerow(HEADER)
+        w.writerow([datetime.now().isoformat(),features.get("machine_type"),features.get("state"),features.get("season"),features.get("horsepower"),features.get("age_years"),features.get("hours_used"),features.get("diesel_price"),demand,price])
@@ -1,18 +1,33 @@
-import joblib, pandas as pd, numpy as np
+import numpy as np
 from services.logger import log_request
 from services.drift import detect_drift
 from services.explain import explain_prediction
+from services.schema import DEMAND_FEATURES, PRICE_FEATURES, check_schema, build_batch, batch_frame
+from services.compact_forest import load_model
 
-price_model = joblib.load("ml/price_model.joblib")
-demand_model = joblib.load("ml/demand_model.joblib")
+def load_models():
+    """Load both models and verify them against the feature contract once."""
+    price = load_model("ml/price_model.joblib", "ml/price_forest")
+    demand = load_model("ml/demand_model.joblib", "ml/demand_forest")
+    fill = check_schema(price, PRICE_FEATURES, "price")
+    check_schema(demand, DEMAND_FEATURES, "demand")
+    return price, demand, fill
+
+price_model, demand_model, numeric_fill = load_models()
+
+def predict_batch(rows):
+    """Score many feature dicts with one demand call and one pass over the forest."""
+    batch = build_batch(rows, numeric_fill)
+    demand = demand_model.predict(batch_frame(batch, DEMAND_FEATURES))
+    X = price_model.named_steps["prep"].transform(batch_frame(batch, PRICE_FEATURES))
+    preds = np.expm1(price_model.named_steps["rf"].predict_trees(X))
+    price = preds.mean(axis=0) * batch["weather_factor"]
+    low, high = np.percentile(preds, [10, 90], axis=0)
+    return price, low, high, demand
 
 def predict_price(features):
-    demand = demand_model.predict(pd.DataFrame([features])[["machine_type","region","month"]])[0]
+    price, low, high, demand = predict_batch([features])
+    price, low, high, demand = float(price[0]), float(low[0]), float(high[0]), demand[0]
     features["demand_multiplier"] = demand
-    X = price_model.named_steps["prep"].transform(pd.DataFrame([features]))
-    trees = price_model.named_steps["rf"].estimators_
-    preds = [np.expm1(t.predict(X)[0]) for t in trees]
-    price = np.mean(preds) * features["weather_factor"]
-    low, high = np.percentile(preds,[10,90])
     log_request(features, price, demand)
     return round(price,2), round(low,2), round(high,2), demand, detect_drift(features), explain_prediction(price_model)
@@ -0,0 +1,227 @@
+# rule_tables.py
+# Rule prices for the /predict/<machine> endpoints as dense lookup tables.
+#
+# Each machine type has one table indexed [season, *axes]. Every cell is
+# computed once at startup from the scalar rule below (the formulas the
+# handlers used to evaluate per request) and stored already rounded, so a
+# request is an index into the current season's slice. The season is
+# re-derived only when the clock passes the next month boundary.
+#
+# Axes:
+#   Int(field, size)        integer input 0..size-1; past the end the rule
+#                           is constant (wear floor) → saturate=True shares
+#                           the last cell, otherwise the rule is evaluated
+#   Choice(field, values)   lower-cased string; anything else is "other"
+import time
+from datetime import datetime
+import numpy as np
+
+SEASONS = ["summer", "monsoon", "harvest", "winter"]
+CONFIDENCE = ["Low", "Medium", "High"]
+HP_MAX = 300
+TANK_MAX = 2000
+
+def get_season(month: int):
+    if month in [3,4,5]:
+        return "summer"
+    if month in [6,7,8]:
+        return "monsoon"
+    if month in [9,10,11]:
+        return "harvest"
+    return "winter"
+
+def confidence(multiplier: float):
+    if multiplier >= 1.25:
+        return "High"
+    if multiplier >= 1.1:
+        return "Medium"
+    return "Low"
+
+# ================= RULES (season, inputs) -> (price, confidence) =================
+
+def tractor(season, horsepower, age_years):
+    base = 450
+    hp_factor = horsepower / 50
+    wear = max(0.7, 1 - age_years * 0.04)
+    demand = 1.25 if season == "harvest" else 1.0
+    return base * hp_factor * wear * demand, confidence(demand)
+
+def harvester(season, crop_type, age_years=0):
+    base = 1800
+    crop = 1.3 if crop_type.lower() in ["paddy","wheat"] and season=="harvest" else 1.0
+    wear = max(0.8, 1 - age_years * 0.03)
+    return base * crop * wear, confidence(crop)
+
+def pump(season, pump_type):
+    base = 120
+    fuel = {"diesel":1.2,"electric":0.9,"solar":0.8}.get(pump_type.lower(),1)
+    demand = 1.3 if season=="summer" else 1.0
+    return base * fuel * demand, confidence(demand)
+
+def trailer(season):
+    base = 300
+    demand = 1.15 if season in ["harvest","summer"] else 1
+    return base * demand, confidence(demand)
+
+def sprayer(season, tank_capacity, age_years=0):
+    base = 200
+    cap = tank_capacity / 400
+    wear = max(0.8, 1 - age_years * 0.03)
+    return base * cap * wear, "Medium"
+
+def weeder(season, horsepower, age_years):
+    base = 250
+    hp = horsepower / 10
+    wear = max(0.75, 1 - age_years * 0.04)
+    return base * hp * wear, "Medium"
+
+# ================= AXES =================
+
+class Int:
+    def __init__(self, field, size, saturate=False, default=None):
+        self.field, self.size, self.saturate, self.default = field, size, saturate, default
+        self.values = list(range(size))
+
+    def cell(self, v):
+        if v < 0:
+            return None
+        if v >= self.size:
+            return self.size - 1 if self.saturate else None
+        return v
+
+    def column(self, values, n):
+        """(cell index, in-table mask, values) for a request column."""
+        v = np.asarray(values, dtype=np.float64)
+        if v.shape != (n,):
+            raise ValueError(f"{self.field}: expected {n} values")
+        if not np.all(np.isfinite(v) & (v == np.floor(v))):
+            raise ValueError(f"{self.field}: values must be integers")
+        v = v.astype(np.int64)
+        idx = np.minimum(v, self.size - 1) if self.saturate else v
+        ok = (v >= 0) & (idx < self.size)
+        return np.where(ok, idx, 0), ok, v
+
+class Choice:
+    def __init__(self, field, values):
+        self.field, self.default = field, None
+        self.values = list(values) + [""]           # last cell: any other value
+
+    def cell(self, v):
+        v = v.lower()
+        return self.values.index(v) if v in self.values[:-1] else len(self.values) - 1
+
+    def column(self, values, n):
+        v = np.char.lower(np.asarray(values, dtype=str))
+        if v.shape != (n,):
+            raise ValueError(f"{self.field}: expected {n} values")
+        idx = np.full(n, len(self.values) - 1)
+        for i, name in enumerate(self.values[:-1]):
+            idx[v == name] = i
+        return idx, np.ones(n, dtype=bool), v
+
+# ================= TABLES =================
+
+class RuleTable:
+    def __init__(self, rule, unit, axes):
+        self.rule, self.unit, self.axes = rule, unit, axes
+        shape = (len(SEASONS), *(len(a.values) for a in axes))
+        self.price = np.empty(shape)
+        self.conf = np.empty(shape, dtype=np.int8)
+        for s, season in enumerate(SEASONS):
+            for cell in np.ndindex(shape[1:]):
+                price, conf = rule(season, **{a.field: a.values[i] for a, i in zip(axes, cell)})
+                self.price[(s, *cell)] = round(price, 2)
+                self.conf[(s, *cell)] = CONFIDENCE.index(conf)
+        # the same cells as nested lists of (price, confidence): single
+        # requests index Python objects, not NumPy scalars
+        self.cells = np.frompyfunc(lambda p, c: (p, CONFIDENCE[c]), 2, 1)(self.price, self.conf).tolist()
+
+    def quote(self, s, inputs):
+        node = self.cells[s]
+        for a in self.axes:
+            i = a.cell(inputs[a.field])
+            if i is None:
+                price, conf = self.rule(SEASONS[s], **inputs)
+                return round(price, 2), conf
+            node = node[i]
+        return node
+
+    def quote_columns(self, s, columns, n):
+        idx, ok, raw = [], np.ones(n, dtype=bool), {}
+        for a in self.axes:
+            values = columns.get(a.field)
+            if values is None:
+                if a.default is None:
+                    raise ValueError(f"missing column {a.field}")
+                values = [a.default] * n
+            i, good, raw[a.field] = a.column(values, n)
+            idx.append(i)
+            ok &= good
+        price = np.broadcast_to(self.price[s][tuple(idx)], (n,)).copy()
+        conf = np.asarray(CONFIDENCE, dtype=object)[np.broadcast_to(self.conf[s][tuple(idx)], (n,))]
+        for i in np.flatnonzero(~ok):
+            p, conf[i] = self.rule(SEASONS[s], **{f: v[i].item() for f, v in raw.items()})
+            price[i] = round(p, 2)
+        return price, conf
+
+class RuleTables:
+    def __init__(self):
+        self.tables = {
+            "tractor": RuleTable(tractor, "per_hour", [Int("horsepower", HP_MAX + 1), Int("age_years", 9, saturate=True)]),
+            "harvester": RuleTable(harvester, "per_acre", [Choice("crop_type", ["paddy", "wheat"]), Int("age_years", 8, saturate=True, default=0)]),
+            "pump": RuleTable(pump, "per_hour", [Choice("pump_type", ["diesel", "electric", "solar"])]),
+            "trailer": RuleTable(trailer, "per_hour", []),
+            "sprayer": RuleTable(sprayer, "per_hour", [Int("tank_capacity", TANK_MAX + 1), Int("age_years", 8, saturate=True, default=0)]),
+            "weeder": RuleTable(weeder, "per_hour", [Int("horsepower", HP_MAX + 1), Int("age_years", 8, saturate=True)]),
+        }
+        self._season, self._until = 0, 0.0
+
+    def season(self):
+        """Index into SEASONS for now; recomputed once per month."""
+        if time.time() >= self._until:
+            now = datetime.now()
+            self._season = SEASONS.index(get_season(now.month))
+            nxt = datetime(now.year + now.month // 12, now.month % 12 + 1, 1)
+            self._until = nxt.timestamp()
+        return self._season
+
+    def quote(self, machine, **inputs):
+        t = self.tables[machine]
+        price, conf = t.quote(self.season(), inputs)
+        return {"final_price": price, "pricing_unit": t.unit, "confidence": conf}
+
+    def quote_bulk(self, body):
+        """
+        Columnar payload: {"machine_type": str | [str], "<field>": [values] | value, ...}
+        with the fields each rule reads (a scalar applies to every row; a
+        body with no list column is one row). Returns per-row lists in
+        input order.
+        """
+        types = body.get("machine_type")
+        n = max((len(v) for v in body.values() if isinstance(v, list)), default=1)
+        if isinstance(types, str):
+            groups = [(types.lower(), None)]                  # one type: no per-row split
+        else:
+            types = np.char.lower(np.asarray(types or [], dtype=str))
+            if types.shape != (n,):
+                raise ValueError(f"machine_type: expected a string or {n} values")
+            groups = [(str(m), np.flatnonzero(types == m)) for m in np.unique(types)]
+
+        price, conf, unit = np.empty(n), np.empty(n, dtype=object), np.empty(n, dtype=object)
+        s = self.season()
+        for machine, rows in groups:
+            t = self.tables.get(machine)
+            if t is None:
+                raise ValueError(f"unknown machine_type {machine!r}")
+            cols = {}
+            for a in t.axes:
+                if a.field in body:
+                    v = body[a.field] if isinstance(body[a.field], list) else [body[a.field]] * n
+                    if len(v) != n:
+                        raise ValueError(f"{a.field}: expected {n} values")
+                    cols[a.field] = v if rows is None else np.asarray(v)[rows]
+            m = n if rows is None else len(rows)
+            at = slice(None) if rows is None else rows
+            price[at], conf[at] = t.quote_columns(s, cols, m)
+            unit[at] = t.unit
+        return {"final_price": price.tolist(), "pricing_unit": unit.tolist(), "confidence": conf.tolist()}
@@ -0,0 +1,87 @@
+# schema.py
+# Feature contract shared by train_*_model.py and services/predict.py.
+import numpy as np
+import pandas as pd
+
+DEMAND_FEATURES = ["machine_type", "state", "season"]
+
+PRICE_CATEGORICAL = [
+    "machine_type",
+    "season",
+    "price_type",
+    "pump_type",
+    "trailer_type",
+    "weeder_type",
+    "state"
+]
+
+PRICE_NUMERIC = [
+    "horsepower",
+    "diesel_price",
+    "electricity_tariff",
+    "rainfall_mm",
+    "temperature_c",
+    "water_scarcity_index",
+    "road_quality_index"
+]
+
+PRICE_FEATURES = PRICE_CATEGORICAL + PRICE_NUMERIC
+
+# Serving-only inputs that ride along in the same batch
+EXTRA_NUMERIC = ["weather_factor"]
+
+CATEGORICAL = list(dict.fromkeys(DEMAND_FEATURES + PRICE_CATEGORICAL))
+NUMERIC = PRICE_NUMERIC + EXTRA_NUMERIC
+
+# training casts categoricals with astype(str), so a missing value is "nan"
+MISSING_CATEGORY = "nan"
+
+BATCH_DTYPE = np.dtype(
+    [(c, object) for c in CATEGORICAL] + [(c, np.float64) for c in NUMERIC]
+)
+
+
+def feature_contract(features, numeric_fill=None):
+    """Contract attached to a fitted pipeline before it is saved."""
+    return {
+        "features": list(features),
+        "numeric_fill": {k: float(v) for k, v in (numeric_fill or {}).items()},
+    }
+
+
+def check_schema(model, expected, name):
+    """Fail fast when a saved model was trained on a different feature set."""
+    contract = getattr(model, "feature_contract", None)
+    found = contract["features"] if contract else getattr(model, "feature_names_in_", None)
+    if found is None:
+        raise ValueError(f"{name} model has no stored feature names")
+    found = [str(c) for c in found]
+    if found != list(expected):
+        raise ValueError(f"{name} model expects {found}, serving contract is {list(expected)}")
+    return contract["numeric_fill"] if contract else {}
+
+
+def build_batch(rows, numeric_fill=None):
+    """
+    Validate a list of feature dicts once and pack them into a single
+    structured array ordered by the contract. Missing or non-finite
+    numerics take the training fill value (0.0 if unknown).
+    """
+    numeric_fill = numeric_fill or {}
+    batch = np.empty(len(rows), dtype=BATCH_DTYPE)
+
+    for c in CATEGORICAL:
+        batch[c] = [MISSING_CATEGORY if r.get(c) is None else str(r[c]) for r in rows]
+
+    for c in NUMERIC:
+        default = 1.0 if c == "weather_factor" else numeric_fill.get(c, 0.0)
+        col = pd.to_numeric(pd.Series([r.get(c) for r in rows], dtype=object), errors="coerce")
+        col = col.to_numpy(dtype=np.float64, na_value=np.nan)
+        batch[c] = np.where(np.isfinite(col), col, default)
+
+    return batch
+
+
+def batch_frame(batch, columns):
+    """Column view of a batch in the order a model was trained on."""
+    return pd.DataFrame({c: batch[c] for c in columns}, columns=columns)
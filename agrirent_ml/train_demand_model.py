@@ -8,6 +8,8 @@ from sklearn.preprocessing import OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.ensemble import RandomForestClassifier
+from services.compact_forest import export_forest
+from services.schema import DEMAND_FEATURES, feature_contract
 
 # Setup
 os.makedirs("ml", exist_ok=True)
@@ -16,11 +18,7 @@ os.makedirs("ml", exist_ok=True)
 df = pd.read_csv("retrain/combined_data.csv", low_memory=False)
 
 # Features & Target
-X = df[[
-    "machine_type",
-    "state",
-    "season"
-]].astype(str)
+X = df[DEMAND_FEATURES].astype(str)
 
 y = df["demand_signal"].astype(str)
 
@@ -49,7 +47,9 @@ Xtr, Xte, ytr, yte = train_test_split(
 model.fit(Xtr, ytr)
 
 
-# Save
+# Save with its feature contract
+model.feature_contract = feature_contract(DEMAND_FEATURES)
 joblib.dump(model, "ml/demand_model.joblib")
+export_forest(model, "ml/demand_forest")
 
 print("✅ Demand model trained successfully")
@@ -10,6 +10,8 @@ from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.ensemble import RandomForestRegressor
+from services.compact_forest import export_forest
+from services.schema import PRICE_CATEGORICAL, PRICE_NUMERIC, feature_contract
 
 # Setup
 os.makedirs("ml", exist_ok=True)
@@ -18,31 +20,15 @@ os.makedirs("ml", exist_ok=True)
 df = pd.read_csv("retrain/combined_data.csv", low_memory=False)
 
 
-# Feature groups
-CATEGORICAL = [
-    "machine_type",
-    "season",
-    "price_type",
-    "pump_type",
-    "trailer_type",
-    "weeder_type",
-    "state"
-]
-
-NUMERIC = [
-    "horsepower",
-    "diesel_price",
-    "electricity_tariff",
-    "rainfall_mm",
-    "temperature_c",
-    "water_scarcity_index",
-    "road_quality_index"
-]
+# Feature groups (shared with services/predict.py)
+CATEGORICAL = PRICE_CATEGORICAL
+NUMERIC = PRICE_NUMERIC
 
 
 # Data cleanup
 df[CATEGORICAL] = df[CATEGORICAL].astype(str)
-df[NUMERIC] = df[NUMERIC].fillna(df[NUMERIC].median())
+numeric_fill = df[NUMERIC].median()
+df[NUMERIC] = df[NUMERIC].fillna(numeric_fill)
 
 # Split
 X = df[CATEGORICAL + NUMERIC]
@@ -73,8 +59,10 @@ Xtr, Xte, ytr, yte = train_test_split(
 
 model.fit(Xtr, ytr)
 
-# Save model
+# Save model with its feature contract
+model.feature_contract = feature_contract(CATEGORICAL + NUMERIC, numeric_fill.to_dict())
 joblib.dump(model, "ml/price_model.joblib")
+export_forest(model, "ml/price_forest")
 
 
 # Save training stats (for drift detection)
@@ -0,0 +1,218 @@
+# analytics_engine.py
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from market_stats import _ts
+from logging_config import get_logger
+
+logger = get_logger("analytics")
+
+DEMAND_WINDOW_DAYS = 7
+
+
+def _month_key(ts: float) -> str:
+    d = datetime.fromtimestamp(ts)
+    return f"{d.month}-{d.year}"          # same key format as the Node dashboards
+
+
+def _day_key(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+
+def _counter():
+    return defaultdict(float)
+
+
+class AnalyticsEngine:
+    """
+    Materialized owner / renter dashboard aggregates.
+
+    Every rental event replaces that rental's previous contribution, so
+    updates (status changes, extensions, cancellations) are applied in
+    O(1) without re-reading the owner's history:
+
+      owner   monthly/daily earnings, monthly rentals, per-machine earnings,
+              booked hours per month (utilization)
+      renter  monthly rentals, monthly spending, rentals per machine type
+      type    bookings per machine type per day (feeds demand_stats)
+
+    Views are only complete once the whole history has been applied:
+    `seeded` is set by the Mongo feed after its initial scan (or by a
+    /market_events backfill marked seeded). Until then the API answers
+    503 and the Node backend computes the dashboards itself.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seeded = False
+        self._machines: dict[str, dict] = {}
+        self._applied: dict[str, list[tuple]] = {}
+
+        self.owner_monthly_earnings = defaultdict(_counter)
+        self.owner_daily_earnings = defaultdict(_counter)
+        self.owner_monthly_rentals = defaultdict(_counter)
+        self.owner_machine_earnings = defaultdict(_counter)
+        self.owner_monthly_hours = defaultdict(_counter)
+        self.renter_monthly_rentals = defaultdict(_counter)
+        self.renter_monthly_spending = defaultdict(_counter)
+        self.renter_type_count = defaultdict(_counter)
+        self.type_daily_bookings = defaultdict(_counter)
+        self.type_machine_count = _counter()
+
+    def mark_seeded(self) -> None:
+        if not self.seeded:
+            logger.info("Analytics store seeded")
+        self.seeded = True
+
+    # ---------------- machines ----------------
+    def upsert_machine(self, doc: dict) -> None:
+        machine_id = str(doc.get("_id"))
+        info = {
+            "owner": str(doc.get("ownerId")),
+            "name": doc.get("name") or "",
+            "type": doc.get("type") or "Other",
+        }
+        with self._lock:
+            old = self._machines.get(machine_id)
+            if old is not None:
+                self.type_machine_count[old["type"]] -= 1
+            self._machines[machine_id] = info
+            self.type_machine_count[info["type"]] += 1
+
+    def delete_machine(self, machine_id) -> None:
+        with self._lock:
+            old = self._machines.pop(str(machine_id), None)
+            if old is not None:
+                self.type_machine_count[old["type"]] -= 1
+
+    # ---------------- rentals ----------------
+    def _contributions(self, doc: dict) -> list[tuple]:
+        """(table, key, sub_key, amount) rows this rental adds to the views."""
+        status = doc.get("status", "pending")
+        machine_id = str(doc.get("machineId"))
+        owner = str(doc.get("ownerId"))
+        renter = str(doc.get("renterId"))
+        price = float(doc.get("totalPrice") or 0.0)
+        created = _ts(doc.get("createdAt"))
+        start = _ts(doc.get("startTime") or doc.get("createdAt"))
+        end = _ts(doc.get("endTime")) if doc.get("endTime") else start
+        mtype = self._machines.get(machine_id, {}).get("type", "Other")
+
+        rows = [
+            ("renter_monthly_rentals", renter, _month_key(start), 1.0),
+            ("renter_monthly_spending", renter, _month_key(start), price),
+            ("renter_type_count", renter, mtype, 1.0),
+        ]
+        if status != "cancelled":
+            rows.append(("type_daily_bookings", mtype, _day_key(created), 1.0))
+            rows.append(("owner_monthly_hours", owner, _month_key(start), max(0.0, end - start) / 3600.0))
+        if status == "completed":
+            rows += [
+                ("owner_monthly_earnings", owner, _month_key(created), price),
+                ("owner_daily_earnings", owner, _day_key(created), price),
+                ("owner_monthly_rentals", owner, _month_key(created), 1.0),
+                ("owner_machine_earnings", owner, machine_id, price),
+            ]
+        return rows
+
+    def _apply(self, rows: list[tuple], sign: float) -> None:
+        for table, key, sub, amount in rows:
+            getattr(self, table)[key][sub] += sign * amount
+
+    def upsert_rental(self, doc: dict) -> None:
+        rental_id = str(doc.get("_id"))
+        with self._lock:
+            rows = self._contributions(doc)
+            self._apply(self._applied.get(rental_id, []), -1.0)
+            self._apply(rows, 1.0)
+            self._applied[rental_id] = rows
+
+    def delete_rental(self, rental_id) -> None:
+        with self._lock:
+            self._apply(self._applied.pop(str(rental_id), []), -1.0)
+
+    def apply_event(self, collection: str, event: dict) -> None:
+        op = event.get("operationType", "update")
+        doc_id = (event.get("documentKey") or {}).get("_id")
+        doc = event.get("fullDocument")
+
+        if collection == "machines":
+            if op == "delete":
+                self.delete_machine(doc_id)
+            elif doc:
+                self.upsert_machine(doc)
+        elif collection == "rentals":
+            if op == "delete":
+                self.delete_rental(doc_id)
+            elif doc:
+                self.upsert_rental(doc)
+
+    # ---------------- views ----------------
+    @staticmethod
+    def _nonzero(d: dict) -> dict:
+        return {k: round(v, 2) for k, v in d.items() if abs(v) > 1e-9}
+
+    @staticmethod
+    def _counts(d: dict) -> dict:
+        return {k: int(round(v)) for k, v in d.items() if round(v) != 0}
+
+    def owner_analytics(self, owner_id: str) -> dict:
+        with self._lock:
+            earnings = self.owner_machine_earnings.get(owner_id, {})
+            top = sorted(
+                ({"name": self._machines.get(m, {}).get("name", ""), "earnings": round(v, 2)}
+                 for m, v in earnings.items() if v > 0),
+                key=lambda r: r["earnings"], reverse=True,
+            )[:5]
+            owned = sum(1 for m in self._machines.values() if m["owner"] == owner_id)
+            hours = self._nonzero(self.owner_monthly_hours.get(owner_id, {}))
+            return {
+                "monthlyEarnings": self._nonzero(self.owner_monthly_earnings.get(owner_id, {})),
+                "monthlyRentals": self._counts(self.owner_monthly_rentals.get(owner_id, {})),
+                "dailyEarnings": self._nonzero(self.owner_daily_earnings.get(owner_id, {})),
+                "utilization": {
+                    k: round(h / (max(owned, 1) * 30 * 24), 4) for k, h in hours.items()
+                },
+                "topMachines": top,
+            }
+
+    def owner_earnings(self, owner_id: str) -> dict:
+        with self._lock:
+            monthly = self.owner_monthly_earnings.get(owner_id, {})
+            return {
+                "success": True,
+                "totalEarnings": round(sum(monthly.values()), 2),
+                "completedRentalCount": int(round(sum(self.owner_monthly_rentals.get(owner_id, {}).values()))),
+            }
+
+    def renter_analytics(self, renter_id: str) -> dict:
+        with self._lock:
+            types = self._counts(self.renter_type_count.get(renter_id, {}))
+            return {
+                "monthlyRentals": self._counts(self.renter_monthly_rentals.get(renter_id, {})),
+                "monthlySpending": self._nonzero(self.renter_monthly_spending.get(renter_id, {})),
+                "mostRentedTypes": [{"type": t, "count": c} for t, c in types.items()],
+            }
+
+    def demand_fields(self, machine_type: str) -> dict:
+        """
+        {"bookings_per_machine_7d": recent bookings per listed machine of
+        this type}, or {} if the type is unknown or the store is not seeded.
+        A rate, not the per-market count the models know as bookings_7d:
+        demand_stats scales it by stock_on_hand.
+        """
+        if not self.seeded:
+            return {}
+        today = datetime.now()
+        days = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(DEMAND_WINDOW_DAYS)]
+        with self._lock:
+            machines = self.type_machine_count.get(machine_type, 0)
+            if machines <= 0:
+                return {}
+            per_day = self.type_daily_bookings.get(machine_type, {})
+            bookings = sum(per_day.get(d, 0.0) for d in days)
+        return {"bookings_per_machine_7d": bookings / machines}
+
+
+analytics = AnalyticsEngine()
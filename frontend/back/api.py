@@ -1,15 +1,34 @@
 # api.py
-from fastapi import FastAPI
+import asyncio
+import os
+import time
+
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 import requests
 from datetime import datetime
 
 from logging_config import get_logger
 from pincode import get_location_from_pincode
-from weather import get_weather
-from predict import predict_price
+from weather_store import weather_store
+from predict import predict_price, predict_prices, predict_grid, scoring_model
+from coalesce import SingleFlight, MicroBatcher
+from market_stats import market_stats, start_mongo_feed
+from analytics_engine import analytics
+from booking_index import booking_index
+from demand_stream import demand_stream
+from comparables import comparables
+from model_registry import registry
+from forecast import load_forecaster
+from model_utils import parse_date
+from binary_transport import make_router
+from records import MACHINE_TYPE_LEN
+import deadline
+from deadline import AdmissionControl, admission
 
 logger = get_logger("api")
 
@@ -23,22 +42,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# deadline headers + bounded admission (503 when full) for the scoring routes
+app.add_middleware(AdmissionControl, paths=("/predict", "/smart_predict", "/price_curve"))
+
+# msgpack batch / streaming interface (see binary_transport.py)
+app.include_router(make_router(predict_prices))
+
 # ============================================================
 #  DIESEL PRICE API (Real-Time)
 # ============================================================
+DIESEL_TTL_S = float(os.getenv("DIESEL_TTL_S", "3600"))
+DIESEL_TIMEOUT_S = 5.0
+MODEL_RESERVE_S = 0.5       # budget kept back for the ensemble call
+_diesel = {"price": 95.0, "fetched_at": 0.0}
+
+
 def get_diesel_price() -> float:
+    """
+    Cached for DIESEL_TTL_S. A refresh only starts when the request's
+    deadline leaves room for it; otherwise the last known price is used.
+    """
+    if time.time() - _diesel["fetched_at"] < DIESEL_TTL_S:
+        return _diesel["price"]
+
+    timeout = min(DIESEL_TIMEOUT_S, deadline.remaining() - MODEL_RESERVE_S)
+    if timeout < 0.25:
+        logger.info("Diesel refresh skipped: request budget too tight")
+        return _diesel["price"]
+
     try:
         r = requests.get(
             "https://dailyfuelpriceindia.com/api/todayDieselPrice",
-            timeout=5,
+            timeout=timeout,
         )
         if r.status_code == 200:
             data = r.json()
-            return float(data.get("todayDieselPrice", 95))
+            _diesel["price"] = float(data.get("todayDieselPrice", 95))
+            _diesel["fetched_at"] = time.time()
     except Exception as e:
         logger.warning(f"Diesel API failed: {e}")
 
-    return 95.0
+    return _diesel["price"]
 
 
 @app.get("/get_diesel")
@@ -47,23 +91,48 @@ def api_diesel():
     return {"diesel_price": get_diesel_price()}
 
 
+# ============================================================
+#  FAST PATH (distilled student instead of the full ensemble)
+# ============================================================
+# Requested with `fast: true`, or chosen automatically when the caller's
+# remaining budget (X-Request-Timeout-Ms) is below ML_FAST_BELOW_MS.
+# Bundles without a student always use the ensemble.
+FAST_BELOW_S = float(os.getenv("ML_FAST_BELOW_MS", "150")) / 1000.0
+
+
+def use_fast(requested: bool) -> bool:
+    return requested or not deadline.has_budget(FAST_BELOW_S)
+
+
 # ============================================================
 #  ML BASE PREDICT (used by AddMachine.jsx)
 # ============================================================
 class PredictRequest(BaseModel):
-    machine_type: str
+    machine_type: str = Field(max_length=MACHINE_TYPE_LEN)
     horsepower: float
     age_years: float | None = 0
     hours_used: float | None = 0
     pincode: str
     maintenance_cost: float | None = 0
     fuel_price: float | None = 95
+    fast: bool = False
 
 
 class PredictResponse(BaseModel):
     predicted_rental_price: float
     location: dict
     weather: dict
+    market_trend_score: float = 1.0
+    model: str = "ensemble"
+    comparable_price: float | None = None   # median rentPerHour of the nearest live listings
+    comparables: int = 0
+
+
+@app.on_event("startup")
+def start_market_feed():
+    start_mongo_feed(consumers=[market_stats, analytics, booking_index, demand_stream, comparables])
+    weather_store.start_refresher()
+    demand_stream.start()
 
 
 @app.get("/health")
@@ -71,31 +140,72 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/weather/stats")
+def weather_stats():
+    return weather_store.stats()
+
+
+@app.get("/demand/stats")
+def demand_stream_stats():
+    return demand_stream.stats()
+
+
+@app.get("/comparables/stats")
+def comparables_stats():
+    return comparables.stats()
+
+
+@app.get("/admission/stats")
+def admission_stats():
+    return admission.stats()
+
+
+# ============================================================
+#  MODEL ROLLOUT (primary + shadow candidate, no restart needed)
+# ============================================================
+class CandidateRequest(BaseModel):
+    path: str
+    shadow_fraction: float = 0.1
+
+
+@app.get("/models")
+def models_status():
+    return {**registry.config(), "bundles": registry.bundles(),
+            "shadow": {**registry.shadow_log.summary(), "dropped": registry.shadow_dropped}}
+
+
+@app.post("/models/candidate")
+def models_candidate(body: CandidateRequest):
+    try:
+        return registry.set_candidate(body.path, body.shadow_fraction)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/models/promote")
+def models_promote():
+    try:
+        return registry.promote()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/models/rollback")
+def models_rollback():
+    try:
+        return registry.rollback()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.post("/predict", response_model=PredictResponse)
 def predict_endpoint(body: PredictRequest):
 
     # ---- LOCATION ----
     loc = get_location_from_pincode(body.pincode)
 
-    # ---- WEATHER ----
-    weather_raw = get_weather(loc["lat"], loc["lng"]) or {}
-    main = weather_raw.get("main", {})
-    wind = weather_raw.get("wind", {})
-
-    rain = 0.0
-    if isinstance(weather_raw.get("rain"), dict):
-        rain = list(weather_raw["rain"].values())[0]
-
-    desc = (weather_raw.get("weather") or [{}])[0].get("description", "")
-
-    weather = {
-        "temp": main.get("temp"),
-        "humidity": main.get("humidity"),
-        "pressure": main.get("pressure"),
-        "wind_speed": wind.get("speed"),
-        "rain": rain,
-        "description": desc,
-    }
+    # ---- WEATHER ---- (local store; climatology when no recent observation)
+    weather = weather_store.lookup(loc["lat"], loc["lng"], body.pincode)
 
     # ---- ML PAYLOAD ----
     payload = {
@@ -114,7 +224,12 @@ def predict_endpoint(body: PredictRequest):
         "created_at": datetime.utcnow().strftime("%Y-%m-%d"),
     }
 
-    price = predict_price(payload)
+    deadline.check()
+    fast = use_fast(body.fast)
+    price = predict_price(payload, fast)
+    market = market_stats.lookup(body.pincode, body.machine_type)
+    comps = comparables.nearest(body.machine_type, body.horsepower, body.age_years, body.hours_used,
+                                body.pincode, loc.get("lat"), loc.get("lng"))
 
     return PredictResponse(
         predicted_rental_price=price,
@@ -125,9 +240,93 @@ def predict_endpoint(body: PredictRequest):
             "lng": loc.get("lng"),
         },
         weather=weather,
+        # no listing in this exact pincode: trend of the nearest comparables instead of 1.0
+        market_trend_score=market.get("market_trend_score", comps.get("comparable_trend", 1.0)),
+        model=scoring_model(fast),
+        comparable_price=comps.get("comparable_price"),
+        comparables=comps.get("comparables", 0),
     )
 
 
+# ============================================================
+#  WEEKLY PRICE FORECAST (precomputed curves from train.py)
+# ============================================================
+@app.get("/forecast")
+def forecast(machine_type: str, pincode: str = "", weeks: int = 12, start: str | None = None):
+    when = parse_date(start) if start else None
+    if start and when is None:
+        raise HTTPException(status_code=422, detail=f"start is not a date: {start!r}")
+    forecaster = load_forecaster(registry.config()["primary"])
+    if forecaster is None:
+        raise HTTPException(status_code=503, detail="Forecast not built; run train.py")
+    return forecaster.forecast(machine_type, pincode, weeks, when)
+
+
+# ============================================================
+#  MARKET EVENTS (machine / rental changes from the backend)
+# ============================================================
+class MarketEvent(BaseModel):
+    collection: str
+    operationType: str = "update"
+    documentKey: dict = {}
+    fullDocument: dict | None = None
+
+
+@app.post("/market_events")
+def market_events(events: list[MarketEvent], seeded: bool = False):
+    """
+    Alternative to the Mongo change-stream feed: push change events here.
+    Pass ?seeded=true with the last batch of a full backfill so the
+    dashboard analytics start answering.
+    """
+    for e in events:
+        event = e.model_dump()
+        market_stats.apply_event(e.collection, event)
+        analytics.apply_event(e.collection, event)
+        booking_index.apply_event(e.collection, event)
+        demand_stream.apply_event(e.collection, event)
+        comparables.apply_event(e.collection, event)
+    if seeded:
+        analytics.mark_seeded()
+    return {"applied": len(events)}
+
+
+@app.get("/availability/{machine_id}")
+def availability(machine_id: str, start: str, end: str):
+    """Overlap check + booked share of [start, end) from the interval index."""
+    return {
+        "available": booking_index.is_available(machine_id, start, end),
+        "utilization": round(booking_index.machine_utilization(machine_id, start, end), 4),
+    }
+
+
+# ============================================================
+#  DASHBOARD ANALYTICS (precomputed, used by the Node backend)
+# ============================================================
+def _require_seeded():
+    # an empty store would answer zeros; 503 sends the backend to Mongo instead
+    if not analytics.seeded:
+        raise HTTPException(status_code=503, detail="Analytics store not seeded yet")
+
+
+@app.get("/analytics/owner/{owner_id}")
+def owner_analytics(owner_id: str):
+    _require_seeded()
+    return analytics.owner_analytics(owner_id)
+
+
+@app.get("/analytics/owner/{owner_id}/earnings")
+def owner_earnings(owner_id: str):
+    _require_seeded()
+    return analytics.owner_earnings(owner_id)
+
+
+@app.get("/analytics/renter/{renter_id}")
+def renter_analytics(renter_id: str):
+    _require_seeded()
+    return analytics.renter_analytics(renter_id)
+
+
 # ============================================================
 #  SMART PREDICT (Used by PricePredictor.jsx)
 # ============================================================
@@ -141,22 +340,47 @@ class SmartPredictRequest(BaseModel):
     weather_temp: float = 0
     weather_humidity: float = 0
     weather_rain: float = 0
+    fast: bool = False
 
 
-@app.post("/smart_predict")
-def smart_predict(body: SmartPredictRequest):
+# Concurrent identical requests share one computation; distinct ones that
+# arrive within SMART_PREDICT_MAX_DELAY_MS are scored in one ensemble call.
+# Fast-path requests skip the batching delay and go straight to the student.
+SMART_MAX_DELAY_MS = float(os.getenv("SMART_PREDICT_MAX_DELAY_MS", "10"))
+SMART_MAX_BATCH = int(os.getenv("SMART_PREDICT_MAX_BATCH", "64"))
 
-    loc = get_location_from_pincode(body.pincode)
-    diesel_price = get_diesel_price()
+_flights = SingleFlight()
+_ensemble = MicroBatcher(predict_prices, SMART_MAX_DELAY_MS / 1000.0, SMART_MAX_BATCH)
 
-    hours_used = float(body.duration_days) * 8.0
 
-    ml_payload = {
-        "machine_type": body.machine_type,
+def _smart_key(body: SmartPredictRequest, fast: bool) -> tuple:
+    return (
+        body.machine_type.strip(),
+        body.pincode.strip(),
+        body.season.strip().lower(),
+        body.duration_days,
+        body.weather_temp,
+        body.weather_humidity,
+        body.weather_rain,
+        fast,
+    )
+
+
+async def _enrich(pincode: str):
+    """Location + diesel price, shared by concurrent requests for the same pincode."""
+    return await asyncio.gather(
+        _flights.do(("loc", pincode), lambda: run_in_threadpool(get_location_from_pincode, pincode)),
+        _flights.do(("diesel",), lambda: run_in_threadpool(get_diesel_price)),
+    )
+
+
+def _smart_payload(body, pincode: str, diesel_price: float, hours_used: float) -> dict:
+    return {
+        "machine_type": body.machine_type.strip(),
         "horsepower": 50.0,
         "age_years": 3.0,
         "hours_used": hours_used,
-        "pincode": body.pincode,
+        "pincode": pincode,
         "maintenance_cost": 0.0,
         "fuel_price": diesel_price,
         "temp": body.weather_temp,
@@ -167,7 +391,30 @@ def smart_predict(body: SmartPredictRequest):
         "created_at": datetime.utcnow().strftime("%Y-%m-%d"),
     }
 
-    base_price = predict_price(ml_payload)
+
+async def _smart_base(body: SmartPredictRequest, fast: bool):
+    pincode = body.pincode.strip()
+    loc, diesel_price = await _enrich(pincode)
+
+    hours_used = float(body.duration_days) * 8.0
+    ml_payload = _smart_payload(body, pincode, diesel_price, hours_used)
+
+    if fast:
+        base_price = await run_in_threadpool(predict_price, ml_payload, True)
+        return loc, diesel_price, base_price, scoring_model(True)
+    base_price = await _ensemble.submit(ml_payload)
+    return loc, diesel_price, base_price, "ensemble"
+
+
+@app.post("/smart_predict")
+async def smart_predict(body: SmartPredictRequest):
+    # per caller, not inside the shared flight: the leader's budget must not
+    # fail or pick the model for followers that have time left
+    deadline.check()
+    fast = use_fast(body.fast)
+    loc, diesel_price, base_price, model = await _flights.do(
+        _smart_key(body, fast), lambda: _smart_base(body, fast)
+    )
     final_price = round(base_price * body.demand_index, 2)
 
     return {
@@ -177,4 +424,70 @@ def smart_predict(body: SmartPredictRequest):
         "demand_index": body.demand_index,
         "diesel_price": diesel_price,
         "location": loc,
+        "model": model,
+    }
+
+
+@app.get("/smart_predict/stats")
+def smart_predict_stats():
+    return {
+        "coalesced_requests": _flights.shared,
+        "ensemble_batches": _ensemble.batches,
+        "ensemble_items": _ensemble.items,
+        "max_delay_ms": SMART_MAX_DELAY_MS,
+        "max_batch": SMART_MAX_BATCH,
+    }
+
+
+# ============================================================
+#  PRICE CURVE (whole duration × age grid in one ensemble pass)
+# ============================================================
+MAX_CURVE_POINTS = 5000
+
+
+class PriceCurveRequest(BaseModel):
+    machine_type: str = Field(max_length=MACHINE_TYPE_LEN)
+    pincode: str
+    demand_index: float = 1.0
+    durations: list[int] = list(range(1, 61))     # rental length in days
+    ages: list[float] = [3.0]                     # machine age in years
+    hours_per_day: float = 8.0
+    weather_temp: float = 0
+    weather_humidity: float = 0
+    weather_rain: float = 0
+    fast: bool = False
+
+
+@app.post("/price_curve")
+async def price_curve(body: PriceCurveRequest):
+    """
+    Prices for every (age, duration) pair with the smart_predict payload:
+    one enrichment and one feature template, so a slider over durations
+    needs no further round trips. prices[i][j] is ages[i] × durations[j].
+    """
+    if not body.durations or not body.ages:
+        raise HTTPException(status_code=400, detail="durations and ages must not be empty")
+    if len(body.durations) * len(body.ages) > MAX_CURVE_POINTS:
+        raise HTTPException(status_code=400, detail=f"grid larger than {MAX_CURVE_POINTS} points")
+
+    pincode = body.pincode.strip()
+    loc, diesel_price = await _enrich(pincode)
+    payload = _smart_payload(body, pincode, diesel_price, hours_used=0.0)
+
+    ages = np.repeat(np.asarray(body.ages, dtype=float), len(body.durations))
+    hours = np.tile(np.asarray(body.durations, dtype=float) * body.hours_per_day, len(body.ages))
+    deadline.check()
+    fast = use_fast(body.fast)
+    base = await run_in_threadpool(predict_grid, payload, {"age_years": ages, "hours_used": hours}, fast)
+    prices = np.round(np.asarray(base) * body.demand_index, 2).reshape(len(body.ages), len(body.durations))
+
+    return {
+        "success": True,
+        "durations": body.durations,
+        "ages": body.ages,
+        "prices": prices.tolist(),
+        "demand_index": body.demand_index,
+        "diesel_price": diesel_price,
+        "location": loc,
+        "model": scoring_model(fast),
     }
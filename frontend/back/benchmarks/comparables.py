@@ -0,0 +1,79 @@
+# benchmarks/comparables.py
+# Comparables index (comparables.py): update cost, query latency and how
+# close the approximate k nearest are to an exact brute-force search.
+# Run from frontend/back/:  python benchmarks/comparables.py [--listings 100000]
+#
+# Listings are synthetic (3 machine types, random specs, pincodes spread
+# over India with made-up coordinates), so pgeocode is not needed.
+
+import argparse, os, sys, time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comparables import ComparablesIndex, K, _vector  # noqa: E402
+
+TYPES = ["Tractor", "Harvester", "Pump"]
+
+
+def synthetic_listings(n: int, pincodes: int, rng):
+    pcs = np.array([str(600000 + i) for i in range(pincodes)])
+    coords = pd.DataFrame({"lat": rng.uniform(8, 32, pincodes), "lng": rng.uniform(70, 88, pincodes)}, index=pcs)
+    hp, age, hours = rng.uniform(20, 120, n), rng.uniform(0, 15, n), rng.uniform(0, 8000, n)
+    listings = pd.DataFrame({
+        "type": rng.choice(TYPES, n), "horsepower": hp, "age": age, "hours": hours,
+        "pincode": rng.choice(pcs, n), "price": 300 + hp * 8 - age * 10 + rng.normal(0, 40, n),
+    })
+    return listings, coords
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Comparables index: updates, query latency, accuracy")
+    ap.add_argument("--listings", type=int, default=100_000)
+    ap.add_argument("--pincodes", type=int, default=3000)
+    ap.add_argument("--queries", type=int, default=500)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    df, coords = synthetic_listings(args.listings, args.pincodes, rng)
+    index = ComparablesIndex(coords_fn=lambda ps: coords.reindex(ps))
+    rows = list(df.itertuples(index=False))
+
+    t0 = time.perf_counter()
+    for i, r in enumerate(rows):
+        index.upsert(f"m{i}", r.type, r.horsepower, r.age, r.hours, r.pincode, r.price)
+    add_us = (time.perf_counter() - t0) / len(rows) * 1e6
+
+    # exact reference: every listing of the type, same scaled vectors
+    loc = coords.loc[df["pincode"]].to_numpy()
+    V = np.stack([_vector(r.horsepower, r.age, r.hours, la, ln) for r, (la, ln) in zip(rows, loc)])
+    types = df["type"].to_numpy()
+    prices = df["price"].to_numpy()
+
+    lat_us, price_err, dist_ratio = [], [], []
+    for _ in range(args.queries):
+        t, p = rng.choice(TYPES), rng.choice(coords.index)
+        h, a, hr = rng.uniform(20, 120), rng.uniform(0, 15), rng.uniform(0, 8000)
+        t0 = time.perf_counter()
+        got = index.nearest(t, h, a, hr, p)
+        lat_us.append((time.perf_counter() - t0) * 1e6)
+
+        m = np.flatnonzero(types == t)
+        d = ((V[m] - _vector(h, a, hr, *coords.loc[p])) ** 2).sum(axis=1)
+        order = np.argsort(d)[:K]
+        exact_median = np.median(prices[m[order]])
+        price_err.append(abs(got["comparable_price"] - exact_median) / exact_median)
+        dist_ratio.append(np.sqrt(d[order[-1]]) / got["comparable_distance"])
+
+    t0 = time.perf_counter()
+    for i in range(0, len(rows), 2):
+        index.remove(f"m{i}")
+    remove_us = (time.perf_counter() - t0) / (len(rows) // 2) * 1e6
+
+    print(f"listings {args.listings}, {index.stats()['cells']} cells after removing half, k={K}")
+    print(f"add / update      {add_us:8.1f} us")
+    print(f"remove            {remove_us:8.1f} us")
+    print(f"query p50 / p99   {np.percentile(lat_us, 50):8.1f} / {np.percentile(lat_us, 99):.1f} us")
+    print(f"median price vs exact k-NN: mean rel. error {np.mean(price_err):.2%}, p95 {np.percentile(price_err, 95):.2%}")
+    print(f"k-th distance exact / approximate: mean {np.mean(dist_ratio):.3f} (1.0 = exact)")
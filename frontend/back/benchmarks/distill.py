@@ -0,0 +1,93 @@
+# benchmarks/distill.py
+# Accuracy and CPU of the distilled student (distill.py) against the
+# ensemble it is fit on. Run from frontend/back/:  python benchmarks/distill.py
+#
+# The teacher here is three sklearn HistGradientBoosting models with the
+# ensemble's tree counts (300 / 200 / 300) on synthetic rows, standing in
+# for xgb / lgbm / cat; train.py runs the same distill() on the real
+# ensemble and prints the same numbers. Reported: MAE vs the teacher and vs
+# the truth, and CPU per row for model-only and full request-path scoring
+# (feature pipeline included), single row and batched.
+
+import argparse, os, sys, time
+
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.feature_memory import synthetic  # noqa: E402
+from distill import distill  # noqa: E402
+from feature_pipeline import FeaturePipeline  # noqa: E402
+from ml_client import sample_rows  # noqa: E402
+from predict import _raw_row  # noqa: E402
+
+
+def cpu_us(fn, n: int, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.process_time()
+        fn()
+        best = min(best, time.process_time() - t0)
+    return best / n * 1e6
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Distilled student vs ensemble: accuracy and CPU")
+    ap.add_argument("--rows", type=int, default=60_000)
+    ap.add_argument("--requests", type=int, default=300, help="single-row calls on the request path")
+    args = ap.parse_args()
+
+    df = synthetic(args.rows)
+    y = df.pop("rental_price")
+    pipeline = FeaturePipeline()
+    X_fe = pipeline.fit_encoders(pipeline.fit_features(df), y)
+    num_features = list(X_fe.select_dtypes(include=["number"]).columns)
+    pipeline.fit_columns(X_fe, num_features)
+    X = X_fe[num_features].to_numpy(np.float32)
+    n_train = int(len(X) * 0.8)
+    X_train, X_val = X[:n_train], X[n_train:]
+    y_train, y_val = y.to_numpy()[:n_train], y.to_numpy()[n_train:]
+    pipeline.fit_scaler(X_train)
+
+    models = [HistGradientBoostingRegressor(max_iter=it, learning_rate=0.05, random_state=42,
+                                            early_stopping=False).fit(X_train, y_train)
+              for it in (300, 200, 300)]
+
+    def ensemble(M):
+        return sum(m.predict(M) for m in models) / 3.0
+
+    def teacher(idx, split):
+        return ensemble((X_train if split == "train" else X_val)[idx])
+
+    student = distill(teacher, X_train, X_val, y_val, teacher(np.arange(len(X_val)), "val"), num_features)
+    m = student.metrics
+
+    print(f"MAE vs ensemble   {m['mae_vs_ensemble']:.3f}")
+    print(f"MAE student       {m['mae_student']:.3f}   (ensemble {m['mae_ensemble']:.3f}, "
+          f"{100 * (m['mae_student'] / m['mae_ensemble'] - 1):+.1f}%)")
+
+    # request path: raw rows → features → model
+    rows = [_raw_row(r) for r in sample_rows(256)]
+    cols = {k: [r[k] for r in rows] for k in rows[0]}
+    singles = [{k: [v] for k, v in r.items()} for r in rows]
+
+    def full_single():
+        for i in range(args.requests):
+            ensemble(pipeline.transform(singles[i % len(singles)], 1).num)
+
+    def fast_single():
+        for i in range(args.requests):
+            student.predict(pipeline.transform_numeric(singles[i % len(singles)], 1))
+
+    table = {
+        "model only, single": (m["cpu_us_per_row_single"]["ensemble"], m["cpu_us_per_row_single"]["student"]),
+        "model only, batch": (m["cpu_us_per_row_batch"]["ensemble"], m["cpu_us_per_row_batch"]["student"]),
+        "request path, single": (cpu_us(full_single, args.requests), cpu_us(fast_single, args.requests)),
+        "request path, batch=256": (
+            cpu_us(lambda: ensemble(pipeline.transform(cols, len(rows)).num), len(rows)),
+            cpu_us(lambda: student.predict(pipeline.transform_numeric(cols, len(rows))), len(rows)),
+        ),
+    }
+    print(f"\n{'CPU us/row':<26}{'ensemble':>10}{'student':>10}{'ratio':>8}")
+    for name, (e, s) in table.items():
+        print(f"{name:<26}{e:>10.1f}{s:>10.1f}{e / s:>7.1f}x")
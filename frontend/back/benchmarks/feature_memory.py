@@ -0,0 +1,113 @@
+# benchmarks/feature_memory.py
+# Memory of the training feature pipeline: object/float64 layout vs the
+# categorical/float32 dtype policy (model_utils), on a synthetic dataset.
+# Run from frontend/back/:  python benchmarks/feature_memory.py --rows 10000000
+#
+# The policy side is measured on the real frames train.py holds. The
+# legacy side is computed exactly from the same data (8-byte numerics,
+# one Python str per row and object column, plus the duplicate frames the
+# old STEP 7 made), so the 10M-row run does not need ~15 GB of RAM.
+
+import argparse, os, resource, sys, time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_utils import build_features, apply_dtype_policy, FEATURE_DTYPE  # noqa: E402
+
+NUMERIC = ["hours_used", "hours_per_day", "bookings_7d", "stock_on_hand", "old_rental_price",
+           "last_year_price", "market_trend_score", "horsepower", "age_years",
+           "maintenance_cost", "fuel_price", "temp", "humidity", "pressure", "wind_speed", "rain"]
+LEGACY_NUMERIC = {"pincode"}        # read_csv gave the old pipeline an int64 pincode
+TYPES = ["Tractor", "Harvester", "Rotavator", "Seeder", "Sprayer", "Baler", "Tiller", "Cultivator"]
+
+
+def synthetic(n: int, seed: int = 0) -> pd.DataFrame:
+    """Frame as train.load_data returns it (categoricals + float32)."""
+    rng = np.random.default_rng(seed)
+    pins = pd.Index(np.unique(rng.integers(110001, 855117, 20_000)).astype(str))
+    days = pd.Index(pd.date_range("2022-01-01", "2024-12-31").strftime("%Y-%m-%d"))
+    df = pd.DataFrame({
+        "machine_type": pd.Categorical.from_codes(rng.integers(0, len(TYPES), n), TYPES),
+        "pincode": pd.Categorical.from_codes(rng.integers(0, len(pins), n), pins),
+        "created_at": pd.Categorical.from_codes(rng.integers(0, len(days), n), days),
+    })
+    for col in NUMERIC:
+        df[col] = rng.gamma(2.0, 50.0, n).astype(FEATURE_DTYPE)
+    df["rental_price"] = rng.gamma(4.0, 250.0, n).astype(FEATURE_DTYPE)
+    return apply_dtype_policy(df)
+
+
+def legacy_bytes(df: pd.DataFrame) -> int:
+    """memory_usage(deep=True) the frame would have with object strings and 8-byte numerics."""
+    total = df.index.memory_usage()
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype) and col not in LEGACY_NUMERIC:
+            counts = np.bincount(s.cat.codes.to_numpy(), minlength=len(s.cat.categories))
+            per_value = np.array([sys.getsizeof(str(c)) for c in s.cat.categories])
+            total += 8 * len(s) + int(counts @ per_value)
+        else:
+            total += 8 * len(s)
+    return total
+
+
+def mb(n_bytes) -> str:
+    return f"{n_bytes / 2**20:>10,.0f}"
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    df = synthetic(args.rows)
+    gen_s = time.perf_counter() - t0
+    base_rss = rss_mb()
+
+    y = df["rental_price"]
+    X_raw = df.drop(columns=["rental_price"])
+    freq_map = X_raw["machine_type"].value_counts().to_dict()
+
+    t0 = time.perf_counter()
+    X_fe = build_features(X_raw, freq_map=freq_map)
+    build_s = time.perf_counter() - t0
+
+    # STEP 7 as train.split_data does it
+    t0 = time.perf_counter()
+    order = np.random.default_rng(42).permutation(len(X_fe))
+    X_fe = X_fe.take(order)
+    num_features = list(X_fe.select_dtypes(include=["number"]).columns)
+    X_num = X_fe[num_features].to_numpy(dtype=FEATURE_DTYPE)
+    split_s = time.perf_counter() - t0
+    peak_rss = rss_mb()
+
+    raw_new = X_raw.memory_usage(deep=True).sum()
+    fe_new = X_fe.memory_usage(deep=True).sum()
+    raw_old = legacy_bytes(X_raw)
+    fe_old = legacy_bytes(X_fe)
+    num_old = 8 * len(X_fe) * (len(num_features) + len(LEGACY_NUMERIC))
+
+    rows = [
+        ("raw frame (load_data)", raw_old, raw_new),
+        ("feature frame X_fe", fe_old, fe_new),
+        ("numeric frame X_num", num_old, 0),
+        ("X_train + X_val", num_old, X_num.nbytes),
+        ("CatBoost X_cat_train + X_cat_val", fe_old, 0),
+        ("CatBoost fillna('Unknown') copies", fe_old, 0),
+    ]
+    print(f"rows={args.rows:,}  features={len(X_fe.columns)} ({len(num_features)} numeric)")
+    print(f"{'held during training':<36}{'legacy MB':>10}{'policy MB':>10}")
+    for name, old, new in rows:
+        print(f"{name:<36}{mb(old)}{mb(new)}")
+    old_total = sum(r[1] for r in rows)
+    new_total = sum(r[2] for r in rows)
+    print(f"{'total':<36}{mb(old_total)}{mb(new_total)}   ({old_total / new_total:.1f}x smaller)")
+    print(f"\nsynthetic {gen_s:.1f}s | build_features {build_s:.1f}s | split {split_s:.1f}s | "
+          f"peak RSS {peak_rss:,.0f} MB (+{peak_rss - base_rss:,.0f} MB over the raw frame)")
@@ -0,0 +1,148 @@
+# benchmarks/load_shed.py
+# Open-loop load test for deadline propagation + admission control
+# (deadline.py). Offers more requests per second than the service can
+# score and reports what clients see: successes and their latency, fast
+# 503s, client-side timeouts, and work the server finished for clients
+# that had already given up.
+#
+# Run from frontend/back/:
+#   python benchmarks/load_shed.py                      # in-process stub, with vs without shedding
+#   python benchmarks/load_shed.py --rate 400 --seconds 10
+#   python benchmarks/load_shed.py --url http://127.0.0.1:5001/smart_predict --rate 50
+#
+# The in-process stub scores on `--capacity` model slots taking
+# `--service-ms` each, like the ensemble behind its threadpool.
+import argparse, asyncio, logging, os, socket, sys, threading, time
+
+import httpx
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import deadline  # noqa: E402
+from deadline import AdmissionControl  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+SMART_BODY = {
+    "machine_type": "Tractor", "pincode": "641001", "duration_days": 2, "season": "kharif",
+    "crop_type": "paddy", "demand_index": 1.0,
+}
+
+
+def stub_app(capacity: int, service_ms: float, shed: bool, max_queue: int) -> tuple[FastAPI, dict]:
+    app = FastAPI()
+    model_slots = threading.Semaphore(capacity)
+    late = {"completed_after_deadline": 0}
+
+    def score():
+        with model_slots:
+            time.sleep(service_ms / 1000.0)
+        if deadline.remaining() < 0:
+            late["completed_after_deadline"] += 1
+
+    @app.post("/smart_predict")
+    def smart_predict(body: dict):
+        if shed:
+            deadline.check()
+        score()
+        return {"price": 1000.0}
+
+    if shed:
+        app.add_middleware(AdmissionControl, paths=("/smart_predict",),
+                           max_concurrent=capacity, max_queue=max_queue)
+    else:
+        # like the old service: nothing rejected or checked; the deadline
+        # context is only there to count work finished after it passed
+        app.add_middleware(AdmissionControl, paths=("/smart_predict",),
+                           max_concurrent=10**6, max_queue=10**6)
+    return app, late
+
+
+def serve(app) -> tuple[str, uvicorn.Server]:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/smart_predict", server
+
+
+async def offer_load(url: str, rate: float, seconds: float, budget_ms: float) -> dict:
+    ok, shed, timeouts, errors = [], 0, 0, 0
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+
+    async with httpx.AsyncClient(limits=limits) as client:
+        async def one():
+            nonlocal shed, timeouts, errors
+            t0 = time.perf_counter()
+            # absolute deadline: time spent before the server reads the
+            # request (client backlog, accept queue) counts against it too
+            headers = {"X-Request-Deadline": f"{time.time() * 1000 + budget_ms:.0f}"}
+            try:
+                res = await asyncio.wait_for(client.post(url, json=SMART_BODY, headers=headers, timeout=None),
+                                             timeout=budget_ms / 1000.0)
+            except asyncio.TimeoutError:
+                timeouts += 1
+                return
+            except httpx.HTTPError:
+                errors += 1
+                return
+            if res.status_code == 200:
+                ok.append((time.perf_counter() - t0) * 1000)
+            elif res.status_code == 503:
+                shed += 1
+            else:
+                errors += 1
+
+        tasks = []
+        start = time.perf_counter()
+        for i in range(int(rate * seconds)):
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one()))
+        await asyncio.gather(*tasks)
+
+    lat = np.asarray(ok) if ok else np.zeros(1)
+    return {"offered": len(tasks), "ok": len(ok), "shed_503": shed, "client_timeouts": timeouts,
+            "errors": errors, "p50_ms": float(np.percentile(lat, 50)), "p99_ms": float(np.percentile(lat, 99))}
+
+
+def report(name: str, r: dict) -> None:
+    print(f"{name:<22}{r['offered']:>8}{r['ok']:>8}{r['shed_503']:>8}{r['client_timeouts']:>10}"
+          f"{r['p50_ms']:>10.0f}{r['p99_ms']:>10.0f}{r.get('late', '-'):>8}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Load-test deadline propagation and admission control")
+    ap.add_argument("--url", help="hit a running service instead of the in-process stub")
+    ap.add_argument("--rate", type=float, default=120, help="offered requests per second")
+    ap.add_argument("--seconds", type=float, default=5)
+    ap.add_argument("--budget-ms", type=float, default=1000, help="client timeout, sent as X-Request-Deadline")
+    ap.add_argument("--capacity", type=int, default=4, help="stub: concurrent model slots")
+    ap.add_argument("--service-ms", type=float, default=50, help="stub: time per prediction")
+    ap.add_argument("--max-queue", type=int, default=16, help="stub: admission queue bound")
+    args = ap.parse_args()
+
+    header = f"{'':<22}{'offered':>8}{'ok':>8}{'503':>8}{'timeouts':>10}{'p50 ms':>10}{'p99 ms':>10}{'late':>8}"
+    if args.url:
+        print(header)
+        report("service", asyncio.run(offer_load(args.url, args.rate, args.seconds, args.budget_ms)))
+        sys.exit(0)
+
+    capacity_rps = args.capacity * 1000.0 / args.service_ms
+    print(f"stub capacity ≈ {capacity_rps:.0f} req/s, offered {args.rate:.0f} req/s, budget {args.budget_ms:.0f} ms")
+    print(header)
+    for name, shed in [("no admission control", False), ("admission control", True)]:
+        app, late = stub_app(args.capacity, args.service_ms, shed, args.max_queue)
+        url, server = serve(app)
+        result = asyncio.run(offer_load(url, args.rate, args.seconds, args.budget_ms))
+        time.sleep(args.budget_ms / 1000.0 + 1)          # let abandoned work drain
+        result["late"] = late["completed_after_deadline"]
+        report(name, result)
+        server.should_exit = True
+        time.sleep(0.3)
@@ -0,0 +1,121 @@
+# benchmarks/request_alloc.py
+# Allocations and GC on the prediction request path: per-row dicts
+# (payload → raw row → per-column lists, FeaturePipeline.transform_records)
+# vs the fixed-schema record buffer (records.py → FeaturePipeline.transform).
+# Run from frontend/back/:  python benchmarks/request_alloc.py
+#
+# Both paths run the same enrichment (predict._record) and the same
+# pipeline, fitted here on synthetic rows; the models are a stub dot
+# product, so only the Python request path is measured. Reported: time
+# per row (best of 3), bytes allocated at peak per call, and collector
+# runs / pause time over the whole run.
+
+import argparse, gc, os, sys, time, tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.feature_memory import synthetic  # noqa: E402
+from feature_pipeline import FeaturePipeline  # noqa: E402
+from ml_client import sample_rows  # noqa: E402
+from predict import _record, _raw_row  # noqa: E402
+from records import batch_buffer  # noqa: E402
+
+
+def fitted_pipeline(n: int = 20_000) -> FeaturePipeline:
+    df = synthetic(n)
+    y = df.pop("rental_price")
+    pipeline = FeaturePipeline()
+    X_fe = pipeline.fit_encoders(pipeline.fit_features(df), y)
+    num_features = list(X_fe.select_dtypes(include=["number"]).columns)
+    pipeline.fit_columns(X_fe, num_features)
+    pipeline.fit_scaler(X_fe[num_features].to_numpy(np.float32))
+    return pipeline
+
+
+def make_paths(pipeline: FeaturePipeline):
+    weights = np.random.default_rng(0).random(len(pipeline.num_features)).astype(np.float32)
+
+    def model(batch):
+        return batch.scaled @ weights
+
+    def dicts(rows):
+        memo = {}
+        raw = [_raw_row(r, memo) for r in rows]
+        return model(pipeline.transform_records(raw)).tolist()
+
+    def records(rows):
+        memo = {}
+        buf = batch_buffer(len(rows))
+        for i, r in enumerate(rows):
+            buf.set(i, _record(r, memo))
+        return model(pipeline.transform(buf.columns(), len(buf))).tolist()
+
+    return {"dict rows": dicts, "record buffer": records}
+
+
+class GCTimer:
+    def __init__(self):
+        self.runs = [0, 0, 0]
+        self.pause_s = 0.0
+        self._t0 = 0.0
+
+    def __call__(self, phase, info):
+        if phase == "start":
+            self._t0 = time.perf_counter()
+        else:
+            self.pause_s += time.perf_counter() - self._t0
+            self.runs[info["generation"]] += 1
+
+
+def measure(fn, batches: list[list[dict]], repeat: int = 3) -> dict:
+    fn(batches[0])                                  # warm caches / lazy loads
+    rows = sum(len(b) for b in batches)
+
+    tracemalloc.start()
+    fn(batches[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best, timer = float("inf"), None
+    for _ in range(repeat):
+        t = GCTimer()
+        gc.collect()
+        gc.callbacks.append(t)
+        t0 = time.perf_counter()
+        for b in batches:
+            fn(b)
+        elapsed = time.perf_counter() - t0
+        gc.callbacks.remove(t)
+        if elapsed < best:
+            best, timer = elapsed, t
+
+    return {
+        "us_per_row": best / rows * 1e6,
+        "peak_kb_per_call": peak / 1024,
+        "gc_runs": sum(timer.runs),
+        "gc_full": timer.runs[2],
+        "gc_pause_ms": timer.pause_s * 1000,
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Request-path allocations: dict rows vs record buffer")
+    ap.add_argument("--requests", type=int, default=5000, help="single-row calls (like /predict)")
+    ap.add_argument("--batch", type=int, default=256, help="rows per batched call (micro-batcher)")
+    ap.add_argument("--batches", type=int, default=200)
+    args = ap.parse_args()
+
+    paths = make_paths(fitted_pipeline())
+    rows = sample_rows(args.batch)
+    workloads = {
+        "single-row": [[rows[i % len(rows)]] for i in range(args.requests)],
+        f"batch={args.batch}": [rows] * args.batches,
+    }
+
+    print(f"{'':<28}{'us/row':>9}{'peak KB':>10}{'GC runs':>9}{'gen2':>6}{'pause ms':>10}")
+    for wname, batches in workloads.items():
+        for pname, fn in paths.items():
+            r = measure(fn, batches)
+            print(f"{wname + ' ' + pname:<28}{r['us_per_row']:>9.1f}{r['peak_kb_per_call']:>10.1f}"
+                  f"{r['gc_runs']:>9}{r['gc_full']:>6}{r['gc_pause_ms']:>10.2f}")
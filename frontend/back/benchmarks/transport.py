@@ -0,0 +1,103 @@
+# benchmarks/transport.py
+# Per-prediction transport overhead: JSON /predict-style calls vs the
+# msgpack batch / stream endpoints (binary_transport.py).
+# Run from frontend/back/:  python benchmarks/transport.py
+#
+# Scoring is stubbed out on both sides so only connection handling,
+# parsing / validation and serialization are measured.
+
+import os, socket, sys, threading, time
+
+import requests
+import uvicorn
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from binary_transport import make_router  # noqa: E402
+from ml_client import MLClient, sample_rows  # noqa: E402
+
+
+def stub_scores(rows):
+    return [1000.0] * len(rows)
+
+
+class PredictRequest(BaseModel):          # same contract as api.PredictRequest
+    machine_type: str
+    horsepower: float
+    age_years: float | None = 0
+    hours_used: float | None = 0
+    pincode: str
+    maintenance_cost: float | None = 0
+    fuel_price: float | None = 95
+
+
+app = FastAPI()
+app.include_router(make_router(stub_scores))
+
+
+@app.post("/predict")
+def predict(body: PredictRequest):
+    return {"predicted_rental_price": stub_scores([body.model_dump()])[0]}
+
+
+def serve() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return port
+
+
+def timed(fn, predictions: int) -> float:
+    fn()                                           # warm-up
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) / predictions * 1e6
+
+
+if __name__ == "__main__":
+    port = serve()
+    url = f"http://127.0.0.1:{port}/predict"
+    n_single, batch, n_batches = 300, 256, 40
+    rows = sample_rows(batch * n_batches)
+    json_rows = [{k: r[k] for k in PredictRequest.model_fields} for r in rows[:n_single]]
+
+    def json_new_connection():
+        for r in json_rows:
+            requests.post(url, json=r, headers={"Connection": "close"}).json()
+
+    session = requests.Session()
+
+    def json_keepalive():
+        for r in json_rows:
+            session.post(url, json=r).json()
+
+    client = MLClient("127.0.0.1", port)
+
+    def msgpack_single():
+        for r in rows[:n_single]:
+            client.predict_batch([r])
+
+    def msgpack_batches():
+        for i in range(n_batches):
+            client.predict_batch(rows[i * batch:(i + 1) * batch])
+
+    def msgpack_stream():
+        chunks = [rows[i * batch:(i + 1) * batch] for i in range(n_batches)]
+        assert sum(r["n"] for r in client.predict_stream(chunks)) == len(rows)
+
+    results = [
+        ("JSON, new connection per call", timed(json_new_connection, n_single)),
+        ("JSON, keep-alive", timed(json_keepalive, n_single)),
+        ("msgpack /predict/batch, 1 row", timed(msgpack_single, n_single)),
+        (f"msgpack /predict/batch, {batch} rows", timed(msgpack_batches, len(rows))),
+        (f"msgpack /predict/stream, {n_batches}x{batch} rows", timed(msgpack_stream, len(rows))),
+    ]
+    base = results[0][1]
+    print(f"{'transport':<40}{'µs / prediction':>16}{'vs JSON':>10}")
+    for name, us in results:
+        print(f"{name:<40}{us:>16,.1f}{base / us:>9.1f}x")
@@ -0,0 +1,98 @@
+# binary_transport.py
+# msgpack-over-HTTP batch interface for high-volume callers (bulk pricing
+# from the Node backend, reprice jobs on other hosts). Rows carry the same
+# fields as predict.predict_prices input; weather fields are taken as given
+# (no per-row location / weather lookups on this path).
+#
+#   POST /predict/batch   one msgpack batch in, one msgpack reply out
+#   POST /predict/stream  a msgpack *stream* of batches in (e.g. a chunked
+#                         upload), one reply per batch streamed back
+#
+# A batch is either a list of row maps, or {"id": ..., "rows": [...]}, or
+# columnar {"id": ..., "columns": {"machine_type": [...], ...}}.
+# A reply is {"id": ..., "n": N, "prices": [...], "ms": scoring_time}.
+import time
+from typing import Callable
+
+import msgpack
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from starlette.requests import ClientDisconnect
+
+from logging_config import get_logger
+
+logger = get_logger("binary_transport")
+
+MSGPACK = "application/msgpack"
+MAX_BATCH_ROWS = 50_000
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator may still be reading the request.
+    Starlette's default (ASGI < 2.4) runs a disconnect listener on receive()
+    alongside the body, which would swallow the remaining request chunks;
+    here request.stream() is the only reader and raises ClientDisconnect.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+def unpack_batch(batch) -> tuple[object, list[dict]]:
+    """Normalize the three accepted batch shapes to (id, rows)."""
+    if isinstance(batch, list):
+        return None, batch
+    if not isinstance(batch, dict):
+        raise ValueError("batch must be a list of rows or a map")
+    if "columns" in batch:
+        cols = batch["columns"]
+        names = list(cols)
+        rows = [dict(zip(names, values)) for values in zip(*(cols[c] for c in names))]
+    else:
+        rows = batch.get("rows", [])
+    return batch.get("id"), rows
+
+
+def make_router(score_fn: Callable[[list[dict]], list[float]]) -> APIRouter:
+    router = APIRouter()
+
+    def score(batch) -> bytes:
+        batch_id, rows = unpack_batch(batch)
+        if len(rows) > MAX_BATCH_ROWS:
+            raise ValueError(f"batch of {len(rows)} rows exceeds {MAX_BATCH_ROWS}")
+        t0 = time.perf_counter()
+        prices = score_fn(rows) if rows else []
+        ms = (time.perf_counter() - t0) * 1000
+        return msgpack.packb(
+            {"id": batch_id, "n": len(prices), "prices": [float(p) for p in prices], "ms": ms}
+        )
+
+    @router.post("/predict/batch")
+    async def predict_batch(request: Request):
+        try:
+            batch = msgpack.unpackb(await request.body())
+            payload = await run_in_threadpool(score, batch)
+        except (ValueError, TypeError, msgpack.UnpackException) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return Response(payload, media_type=MSGPACK)
+
+    @router.post("/predict/stream")
+    async def predict_stream(request: Request):
+        async def replies():
+            unpacker = msgpack.Unpacker()
+            try:
+                async for chunk in request.stream():
+                    unpacker.feed(chunk)
+                    for batch in unpacker:
+                        try:
+                            yield await run_in_threadpool(score, batch)
+                        except (ValueError, TypeError) as e:
+                            yield msgpack.packb({"id": None, "error": str(e)})
+            except ClientDisconnect:
+                logger.info("/predict/stream client disconnected")
+
+        return DuplexStreamingResponse(replies(), media_type=MSGPACK)
+
+    return router
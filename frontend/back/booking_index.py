@@ -0,0 +1,293 @@
+# booking_index.py
+import bisect
+import threading
+import time
+
+from market_stats import _ts
+from logging_config import get_logger
+
+logger = get_logger("booking_index")
+
+UTILIZATION_WINDOW_S = 7 * 24 * 3600
+BOOKED_STATES = {"pending", "active", "completed"}
+
+
+class SortedFloats:
+    """
+    Sorted multiset of floats as a list of sorted blocks of at most
+    2·LOAD values (the sortedcontainers layout), with a Fenwick tree of
+    per-block counts and sums:
+
+      add / remove   bisect the block maxima, insert into one block,
+                     update the tree                             -> O(log n + LOAD)
+      rank(x)        #values < x (<= x with right=True)          -> O(log n)
+      below(x)       (#values < x, their sum)                    -> O(log n + LOAD)
+
+    The tree is rebuilt from the block sums when blocks split or empty
+    and every LOAD writes, so float error from its incremental updates
+    cannot build up (a split also re-sums both halves).
+    """
+
+    LOAD = 256
+
+    def __init__(self):
+        self._blocks: list[list[float]] = []
+        self._maxes: list[float] = []
+        self._sums: list[float] = []
+        self._tree_n: list[int] = [0]            # Fenwick over blocks, 1-based
+        self._tree_s: list[float] = [0.0]
+        self._writes = 0
+
+    def __len__(self):
+        return sum(len(b) for b in self._blocks)
+
+    # ---------------- Fenwick tree over blocks ----------------
+    def _rebuild(self) -> None:
+        m = len(self._blocks)
+        tn, ts = [0] * (m + 1), [0.0] * (m + 1)
+        for i in range(1, m + 1):
+            tn[i] += len(self._blocks[i - 1])
+            ts[i] += self._sums[i - 1]
+            j = i + (i & -i)
+            if j <= m:
+                tn[j] += tn[i]
+                ts[j] += ts[i]
+        self._tree_n, self._tree_s = tn, ts
+        self._writes = 0
+
+    def _update(self, block: int, dn: int, ds: float) -> None:
+        self._writes += 1
+        if self._writes >= self.LOAD:
+            self._rebuild()
+            return
+        tn, ts = self._tree_n, self._tree_s
+        i = block + 1
+        while i < len(tn):
+            tn[i] += dn
+            ts[i] += ds
+            i += i & -i
+
+    def _before(self, block: int) -> tuple[int, float]:
+        """(count, sum) of the blocks before `block`."""
+        n, s = 0, 0.0
+        tn, ts = self._tree_n, self._tree_s
+        while block > 0:
+            n += tn[block]
+            s += ts[block]
+            block -= block & -block
+        return n, s
+
+    # ---------------- writes ----------------
+    def add(self, x: float) -> None:
+        if not self._blocks:
+            self._blocks.append([x])
+            self._maxes.append(x)
+            self._sums.append(x)
+            self._rebuild()
+            return
+        i = min(bisect.bisect_left(self._maxes, x), len(self._blocks) - 1)
+        block = self._blocks[i]
+        bisect.insort(block, x)
+        self._maxes[i] = block[-1]
+        if len(block) > 2 * self.LOAD:
+            half = block[self.LOAD:]
+            del block[self.LOAD:]
+            self._blocks.insert(i + 1, half)
+            self._maxes[i] = block[-1]
+            self._maxes.insert(i + 1, half[-1])
+            self._sums[i] = sum(block)
+            self._sums.insert(i + 1, sum(half))
+            self._rebuild()
+        else:
+            self._sums[i] += x
+            self._update(i, 1, x)
+
+    def remove(self, x: float) -> None:
+        i = bisect.bisect_left(self._maxes, x)
+        block = self._blocks[i]
+        del block[bisect.bisect_left(block, x)]
+        if block:
+            self._maxes[i] = block[-1]
+            self._sums[i] -= x
+            self._update(i, -1, -x)
+        else:
+            del self._blocks[i], self._maxes[i], self._sums[i]
+            self._rebuild()
+
+    # ---------------- queries ----------------
+    def rank(self, x: float, right: bool = False) -> int:
+        find = bisect.bisect_right if right else bisect.bisect_left
+        i = find(self._maxes, x)
+        n = self._before(i)[0]
+        return n if i == len(self._blocks) else n + find(self._blocks[i], x)
+
+    def below(self, x: float) -> tuple[int, float]:
+        i = bisect.bisect_left(self._maxes, x)
+        n, s = self._before(i)
+        if i == len(self._blocks):
+            return n, s
+        block = self._blocks[i]
+        j = bisect.bisect_left(block, x)
+        return n + j, s + sum(block[:j])
+
+
+class IntervalIndex:
+    """
+    Set of [start, end) intervals kept as two SortedFloats of endpoints.
+
+      overlapping(a, b)  #intervals with start < b and end > a  -> 2 ranks
+      booked(a, b)       total covered time inside [a, b)        -> 4 partial sums
+
+    booked() uses F(x) = Σ (min(max(x, s), e) - s), i.e. covered time
+    before x, which only needs counts and sums of the starts and ends
+    below x.
+    """
+
+    def __init__(self):
+        self._by_id: dict[str, tuple[float, float]] = {}
+        self._starts = SortedFloats()
+        self._ends = SortedFloats()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def add(self, interval_id: str, start: float, end: float) -> None:
+        self.remove(interval_id)
+        if end <= start:
+            return
+        self._by_id[interval_id] = (start, end)
+        self._starts.add(start)
+        self._ends.add(end)
+
+    def remove(self, interval_id: str) -> None:
+        old = self._by_id.pop(interval_id, None)
+        if old is None:
+            return
+        self._starts.remove(old[0])
+        self._ends.remove(old[1])
+
+    def overlapping(self, a: float, b: float) -> int:
+        return self._starts.rank(b) - self._ends.rank(a, right=True)
+
+    def _covered_before(self, x: float) -> float:
+        ns, ss = self._starts.below(x)
+        ne, se = self._ends.below(x)
+        return (ns * x - ss) - (ne * x - se)
+
+    def booked(self, a: float, b: float) -> float:
+        return float(self._covered_before(b) - self._covered_before(a))
+
+
+class BookingIndex:
+    """
+    Booked rental intervals per machine and per (pincode prefix, machine_type),
+    fed by the same machine/rental events as market_stats.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._machines: dict[str, tuple[str, str]] = {}
+        self._region_machines: dict[tuple[str, str], int] = {}
+        self._by_machine: dict[str, IntervalIndex] = {}
+        self._by_region: dict[tuple[str, str], IntervalIndex] = {}
+        self._rentals: dict[str, tuple[str, tuple[str, str]]] = {}
+
+    @staticmethod
+    def _region(pincode, machine_type) -> tuple[str, str]:
+        return (str(pincode or "").strip()[:3], str(machine_type or "").strip())
+
+    # ---------------- machines ----------------
+    def upsert_machine(self, doc: dict) -> None:
+        machine_id = str(doc.get("_id"))
+        region = self._region(doc.get("pincode"), doc.get("type"))
+        with self._lock:
+            old = self._machines.get(machine_id)
+            if old == region:
+                return
+            if old is not None:
+                self._region_machines[old] -= 1
+            self._machines[machine_id] = region
+            self._region_machines[region] = self._region_machines.get(region, 0) + 1
+
+    def delete_machine(self, machine_id) -> None:
+        with self._lock:
+            old = self._machines.pop(str(machine_id), None)
+            if old is not None:
+                self._region_machines[old] -= 1
+
+    # ---------------- rentals ----------------
+    def upsert_rental(self, doc: dict) -> None:
+        rental_id = str(doc.get("_id"))
+        machine_id = str(doc.get("machineId"))
+        with self._lock:
+            self._remove_rental(rental_id)
+            if doc.get("status", "pending") not in BOOKED_STATES:
+                return
+            region = self._machines.get(machine_id)
+            if region is None or not doc.get("startTime") or not doc.get("endTime"):
+                return
+            start, end = _ts(doc["startTime"]), _ts(doc["endTime"])
+            self._by_machine.setdefault(machine_id, IntervalIndex()).add(rental_id, start, end)
+            self._by_region.setdefault(region, IntervalIndex()).add(rental_id, start, end)
+            self._rentals[rental_id] = (machine_id, region)
+
+    def delete_rental(self, rental_id) -> None:
+        with self._lock:
+            self._remove_rental(str(rental_id))
+
+    def _remove_rental(self, rental_id: str) -> None:
+        old = self._rentals.pop(rental_id, None)
+        if old is None:
+            return
+        machine_id, region = old
+        self._by_machine[machine_id].remove(rental_id)
+        self._by_region[region].remove(rental_id)
+
+    def apply_event(self, collection: str, event: dict) -> None:
+        op = event.get("operationType", "update")
+        doc_id = (event.get("documentKey") or {}).get("_id")
+        doc = event.get("fullDocument")
+
+        if collection == "machines":
+            if op == "delete":
+                self.delete_machine(doc_id)
+            elif doc:
+                self.upsert_machine(doc)
+        elif collection == "rentals":
+            if op == "delete":
+                self.delete_rental(doc_id)
+            elif doc:
+                self.upsert_rental(doc)
+
+    # ---------------- queries ----------------
+    def is_available(self, machine_id, start, end) -> bool:
+        with self._lock:
+            idx = self._by_machine.get(str(machine_id))
+            return idx is None or idx.overlapping(_ts(start), _ts(end)) == 0
+
+    def machine_utilization(self, machine_id, start, end) -> float:
+        a, b = _ts(start), _ts(end)
+        with self._lock:
+            idx = self._by_machine.get(str(machine_id))
+            return 0.0 if idx is None or b <= a else idx.booked(a, b) / (b - a)
+
+    def utilization(self, pincode, machine_type, now: float | None = None) -> float | None:
+        """
+        Share of machine-time booked in [now - 7d, now + 7d) for the
+        (pincode prefix, machine_type) region, or None with no listings.
+        Not a model input: the training data has no rental intervals to
+        compute the same quantity from.
+        """
+        now = time.time() if now is None else now
+        a, b = now - UTILIZATION_WINDOW_S, now + UTILIZATION_WINDOW_S
+        region = self._region(pincode, machine_type)
+        with self._lock:
+            machines = self._region_machines.get(region, 0)
+            if machines <= 0:
+                return None
+            idx = self._by_region.get(region)
+            booked = idx.booked(a, b) if idx is not None else 0.0
+        return min(1.0, booked / (machines * (b - a)))
+
+
+booking_index = BookingIndex()
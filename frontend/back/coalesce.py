@@ -0,0 +1,99 @@
+# coalesce.py
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from fastapi.concurrency import run_in_threadpool
+
+from logging_config import get_logger
+
+logger = get_logger("coalesce")
+
+
+class SingleFlight:
+    """
+    Concurrent callers with the same key share one in-flight computation.
+    The result is not cached: once it resolves, the next call recomputes.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        while (fut := self._inflight.get(key)) is not None:
+            self.shared += 1
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled() or asyncio.current_task().cancelling():
+                    raise           # this caller was cancelled
+                # the leader was cancelled, not us: retry (one follower becomes leader)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await fn()
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            # cancelled leader (client gone, deadline, admission): release the followers
+            if not fut.done():
+                fut.cancel()
+            del self._inflight[key]
+
+
+class MicroBatcher:
+    """
+    Collects items submitted within `max_delay_s` (or until `max_batch`
+    items) and evaluates them with one call to the blocking `batch_fn`,
+    which runs in the threadpool and must return one result per item.
+    """
+
+    def __init__(self, batch_fn: Callable[[list], list], max_delay_s: float = 0.01, max_batch: int = 64):
+        self.batch_fn = batch_fn
+        self.max_delay_s = max_delay_s
+        self.max_batch = max_batch
+        self._pending: list[tuple[Any, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((item, fut))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay_s, self._flush)
+
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await run_in_threadpool(self.batch_fn, [item for item, _ in batch])
+        except Exception as e:
+            logger.warning(f"Batch of {len(batch)} failed: {e}")
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), res in zip(batch, results):
+            if not fut.done():
+                fut.set_result(res)
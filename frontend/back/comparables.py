@@ -0,0 +1,237 @@
+# comparables.py
+# Nearest comparable listings: the k live listings of the same machine
+# type closest in (horsepower, age, hours used, location), and the median
+# of their rentPerHour. Grounds a prediction in current market prices even
+# when no listing shares the exact pincode (MarketStats then has nothing).
+#
+# Listings are stored per machine type in blocks keyed by a GRID_DEG
+# lat/lng cell. A block is a growable float32 matrix of scaled vectors, so
+# add / update / delete are O(1) (delete swaps the last row in). A query
+# scans its own cell, then rings of neighbouring cells, until it holds
+# MIN_CANDIDATES listings, and ranks those exactly: approximate, since a
+# closer listing further out than the last ring scanned can be missed.
+# Listings whose pincode has no coordinates only match queries without one.
+# Fed by the same machine change events as MarketStats.
+import math
+import os
+import threading
+
+import numpy as np
+
+from market_stats import _key
+from pincode import get_coords_bulk
+from logging_config import get_logger
+
+logger = get_logger("comparables")
+
+K = int(os.getenv("COMPARABLES_K", "10"))
+GRID_DEG = 0.5                 # ≈ 55 km cells
+MIN_CANDIDATES = 200           # listings ranked exactly per query
+MAX_RING = 6                   # ≈ 330 km: further away is not a comparable
+UNLOCATED_CANDIDATES = 2000    # cap for queries without coordinates (no cells to prefer)
+KM_PER_DEG = 111.2
+
+# one unit of distance ≈ 25 hp ≈ 3 years ≈ 1000 hours ≈ 50 km
+SCALE = np.array([25.0, 3.0, 1000.0, 50.0, 50.0], dtype=np.float32)
+DIMS = len(SCALE)
+LOCATION = slice(3, 5)
+
+
+def _vector(horsepower, age_years, hours_used, lat, lng) -> np.ndarray:
+    """Scaled (hp, age, hours, km north, km east); location 0 when unknown."""
+    v = np.zeros(DIMS, dtype=np.float32)
+    v[0], v[1], v[2] = float(horsepower or 0), float(age_years or 0), float(hours_used or 0)
+    if lat is not None:
+        v[3] = lat * KM_PER_DEG
+        v[4] = lng * KM_PER_DEG * math.cos(math.radians(lat))
+    return v / SCALE
+
+
+def _cell(lat, lng):
+    if lat is None:
+        return None
+    return (math.floor(lat / GRID_DEG), math.floor(lng / GRID_DEG))
+
+
+class _Block:
+    """Listings of one (machine type, cell): rows 0..n-1 are live."""
+
+    __slots__ = ("vectors", "prices", "last", "ids", "n")
+
+    def __init__(self, capacity: int = 16):
+        self.vectors = np.empty((capacity, DIMS), dtype=np.float32)
+        self.prices = np.empty(capacity, dtype=np.float64)
+        self.last = np.empty(capacity, dtype=np.float64)
+        self.ids: list[str] = []
+        self.n = 0
+
+    def add(self, listing_id: str, vector, price: float, last: float) -> int:
+        if self.n == len(self.prices):
+            grow = len(self.prices)
+            self.vectors = np.concatenate([self.vectors, np.empty((grow, DIMS), dtype=np.float32)])
+            self.prices = np.concatenate([self.prices, np.empty(grow)])
+            self.last = np.concatenate([self.last, np.empty(grow)])
+        row = self.n
+        self.vectors[row], self.prices[row], self.last[row] = vector, price, last
+        self.ids.append(listing_id)
+        self.n += 1
+        return row
+
+    def remove(self, row: int) -> str | None:
+        """Swap-remove; returns the id now at `row` (moved from the end), if any."""
+        end = self.n - 1
+        moved = None
+        if row != end:
+            self.vectors[row], self.prices[row], self.last[row] = self.vectors[end], self.prices[end], self.last[end]
+            moved = self.ids[row] = self.ids[end]
+        self.ids.pop()
+        self.n = end
+        return moved
+
+
+class ComparablesIndex:
+    def __init__(self, coords_fn=get_coords_bulk):
+        self._lock = threading.Lock()
+        self._coords_fn = coords_fn
+        self._coords_cache: dict[str, tuple[float, float] | None] = {}
+        self._types: dict[str, dict] = {}                       # type → cell → _Block
+        self._where: dict[str, tuple[str, tuple | None, int]] = {}
+
+    def __len__(self):
+        return len(self._where)
+
+    def _coords(self, pincode: str):
+        if pincode not in self._coords_cache:
+            found = self._coords_fn([pincode])
+            lat, lng = (found.iloc[0]["lat"], found.iloc[0]["lng"]) if len(found) else (math.nan, math.nan)
+            self._coords_cache[pincode] = None if math.isnan(lat) else (float(lat), float(lng))
+        return self._coords_cache[pincode]
+
+    # ---------------- updates ----------------
+    def upsert(self, listing_id, machine_type, horsepower, age_years, hours_used, pincode,
+               price, last_year_price=None, lat=None, lng=None) -> None:
+        if not price:
+            self.remove(listing_id)
+            return
+        pincode, mtype = _key(pincode, machine_type)
+        if lat is None and pincode:
+            lat, lng = self._coords(pincode) or (None, None)
+        vector = _vector(horsepower, age_years, hours_used, lat, lng)
+        cell = _cell(lat, lng)
+        price = float(price)
+        last = float(last_year_price) if last_year_price not in (None, "") else price
+
+        with self._lock:
+            self._remove_locked(str(listing_id))
+            block = self._types.setdefault(mtype, {}).setdefault(cell, _Block())
+            row = block.add(str(listing_id), vector, price, last)
+            self._where[str(listing_id)] = (mtype, cell, row)
+
+    def remove(self, listing_id) -> None:
+        with self._lock:
+            self._remove_locked(str(listing_id))
+
+    def _remove_locked(self, listing_id: str) -> None:
+        where = self._where.pop(listing_id, None)
+        if where is None:
+            return
+        mtype, cell, row = where
+        cells = self._types[mtype]
+        moved = cells[cell].remove(row)
+        if moved is not None:
+            self._where[moved] = (mtype, cell, row)
+        if cells[cell].n == 0:
+            del cells[cell]
+
+    def apply_event(self, collection: str, event: dict) -> None:
+        """Mongo change-stream style event (same feed as MarketStats)."""
+        if collection != "machines":
+            return
+        if event.get("operationType", "update") == "delete":
+            self.remove((event.get("documentKey") or {}).get("_id"))
+            return
+        doc = event.get("fullDocument")
+        if doc:
+            meta = doc.get("meta") or {}
+            self.upsert(
+                doc.get("_id"), doc.get("type") or doc.get("machine_type"),
+                doc.get("horsepower"), doc.get("ageYears"), doc.get("hoursUsed"), doc.get("pincode"),
+                doc.get("rentPerHour"), doc.get("last_year_price", meta.get("last_year_price")),
+            )
+
+    # ---------------- queries ----------------
+    def _candidates(self, cells: dict, cell) -> list[_Block]:
+        """Blocks in rings around `cell` until MIN_CANDIDATES listings."""
+        found, count = [], 0
+        if cell is None:
+            for block in cells.values():
+                found.append(block)
+                count += block.n
+                if count >= UNLOCATED_CANDIDATES:
+                    break
+            return found
+        ci, cj = cell
+        for r in range(MAX_RING + 1):
+            for di in range(-r, r + 1):
+                step = 1 if abs(di) == r else 2 * r       # ring r only: full top/bottom rows, ends otherwise
+                for dj in range(-r, r + 1, step):
+                    block = cells.get((ci + di, cj + dj))
+                    if block is not None:
+                        found.append(block)
+                        count += block.n
+            if count >= MIN_CANDIDATES:
+                break
+        return found
+
+    def nearest(self, machine_type, horsepower, age_years, hours_used, pincode=None,
+                lat=None, lng=None, k: int = K) -> dict:
+        """
+        {} when there are no listings of this type nearby, else
+
+          comparable_price       median rentPerHour of the k nearest listings
+          comparables            how many were found (≤ k)
+          comparable_distance    scaled distance to the furthest of them
+          comparable_trend       1 ± 0.2 from their rent vs last-year price
+                                 (same rule as MarketStats.market_trend_score)
+        """
+        pincode, mtype = _key(pincode, machine_type)
+        if lat is None and pincode:
+            lat, lng = self._coords(pincode) or (None, None)
+        q = _vector(horsepower, age_years, hours_used, lat, lng)
+
+        with self._lock:
+            cells = self._types.get(mtype)
+            blocks = self._candidates(cells, _cell(lat, lng)) if cells else []
+            if not blocks:
+                return {}
+            vectors = np.concatenate([b.vectors[:b.n] for b in blocks])
+            prices = np.concatenate([b.prices[:b.n] for b in blocks])
+            last = np.concatenate([b.last[:b.n] for b in blocks])
+
+        diff = vectors - q
+        if lat is None:
+            diff[:, LOCATION] = 0.0
+        d = np.einsum("ij,ij->i", diff, diff)
+        if len(d) > k:
+            top = np.argpartition(d, k - 1)[:k]
+            d, prices, last = d[top], prices[top], last[top]
+
+        avg_last = float(last.mean())
+        growth = (float(prices.mean()) - avg_last) / (avg_last or 1)
+        return {
+            "comparable_price": float(np.median(prices)),
+            "comparables": int(len(prices)),
+            "comparable_distance": float(math.sqrt(d.max())),
+            "comparable_trend": float(1 + max(-0.20, min(0.20, growth * 0.25))),
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "listings": len(self._where),
+                "types": len(self._types),
+                "cells": sum(len(c) for c in self._types.values()),
+            }
+
+
+comparables = ComparablesIndex()
@@ -0,0 +1,174 @@
+# deadline.py
+# Request deadlines and load shedding for the prediction endpoints.
+#
+# Callers send their remaining budget as `X-Request-Timeout-Ms` (relative,
+# so clocks need not agree) or an absolute `X-Request-Deadline` (epoch ms).
+# The deadline is kept in a contextvar for the request, so enrichment code
+# (diesel price, ...) can ask `remaining()` and fall back to cached values
+# instead of starting a call that cannot finish in time.
+#
+# AdmissionControl bounds the work in flight: at most `max_concurrent`
+# requests run, at most `max_queue` wait for a slot, and everything else is
+# rejected at once with 503 + Retry-After. A queued request whose deadline
+# passes before it gets a slot is shed too, so nothing runs for a client
+# that has already given up.
+import asyncio
+import contextvars
+import json
+import os
+import time
+
+from logging_config import get_logger
+
+logger = get_logger("deadline")
+
+DEFAULT_BUDGET_MS = float(os.getenv("ML_DEFAULT_BUDGET_MS", "10000"))
+MAX_CONCURRENT = int(os.getenv("ML_MAX_CONCURRENT", "32"))
+MAX_QUEUE = int(os.getenv("ML_MAX_QUEUE", "64"))
+RETRY_AFTER_S = 1
+
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def remaining() -> float:
+    """Seconds left in the current request's budget (inf outside a request)."""
+    deadline = _deadline.get()
+    return float("inf") if deadline is None else deadline - time.monotonic()
+
+
+def has_budget(seconds: float) -> bool:
+    return remaining() >= seconds
+
+
+def check() -> None:
+    """Raise DeadlineExceeded if the caller's budget is already spent."""
+    if remaining() <= 0:
+        raise DeadlineExceeded()
+
+
+def parse_deadline(headers: dict) -> float:
+    """Absolute time.monotonic() deadline from request headers."""
+    now = time.monotonic()
+    try:
+        if b"x-request-timeout-ms" in headers:
+            return now + float(headers[b"x-request-timeout-ms"]) / 1000.0
+        if b"x-request-deadline" in headers:
+            return now + float(headers[b"x-request-deadline"]) / 1000.0 - time.time()
+    except ValueError:
+        pass
+    return now + DEFAULT_BUDGET_MS / 1000.0
+
+
+class AdmissionControl:
+    """
+    ASGI middleware: deadline context + bounded admission for `paths`
+    (prefix match). Other routes pass straight through.
+    """
+
+    def __init__(self, app, paths=(), max_concurrent: int = MAX_CONCURRENT, max_queue: int = MAX_QUEUE):
+        self.app = app
+        self.paths = tuple(paths)
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._slots: asyncio.Semaphore | None = None
+        self.running = 0
+        self.queued = 0
+        self.counts = {"admitted": 0, "completed": 0, "shed_queue_full": 0,
+                       "shed_expired": 0, "shed_deadline_in_queue": 0, "deadline_exceeded": 0}
+        self.wait_ms_total = 0.0
+        admission.register(self)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        deadline = parse_deadline(dict(scope["headers"]))
+        token = _deadline.set(deadline)
+        try:
+            await self._admit(scope, receive, send, deadline)
+        finally:
+            _deadline.reset(token)
+
+    async def _admit(self, scope, receive, send, deadline: float):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+
+        if deadline <= time.monotonic():
+            await self._reject(send, "shed_expired", "deadline already passed")
+            return
+        if self._slots.locked() and self.queued >= self.max_queue:
+            await self._reject(send, "shed_queue_full", "server busy")
+            return
+
+        t0 = time.monotonic()
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=deadline - t0)
+        except asyncio.TimeoutError:
+            await self._reject(send, "shed_deadline_in_queue", "deadline passed while queued")
+            return
+        finally:
+            self.queued -= 1
+
+        self.wait_ms_total += (time.monotonic() - t0) * 1000
+        self.counts["admitted"] += 1
+        self.running += 1
+        try:
+            await self.app(scope, receive, send)
+        except DeadlineExceeded:
+            await self._reject(send, "deadline_exceeded", "deadline passed during processing")
+        finally:
+            self.running -= 1
+            self.counts["completed"] += 1
+            self._slots.release()
+
+    async def _reject(self, send, reason: str, detail: str):
+        self.counts[reason] += 1
+        body = json.dumps({"detail": detail, "reason": reason}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(RETRY_AFTER_S).encode()),
+                (b"x-shed-reason", reason.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def stats(self) -> dict:
+        shed = sum(v for k, v in self.counts.items() if k.startswith("shed_"))
+        offered = self.counts["admitted"] + shed
+        return {
+            **self.counts,
+            "shed_total": shed,
+            "shed_ratio": round(shed / offered, 4) if offered else 0.0,
+            "running": self.running,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "avg_queue_wait_ms": round(self.wait_ms_total / self.counts["admitted"], 2)
+            if self.counts["admitted"] else 0.0,
+        }
+
+
+class _Admission:
+    """Handle on the middleware instance Starlette builds lazily (for /admission/stats)."""
+
+    def __init__(self):
+        self.control: AdmissionControl | None = None
+
+    def register(self, control: AdmissionControl) -> None:
+        self.control = control
+
+    def stats(self) -> dict:
+        return self.control.stats() if self.control is not None else {}
+
+
+admission = _Admission()
@@ -1,36 +1,60 @@
 import os
 import pickle
 
+from analytics_engine import analytics
+from demand_stream import FIELDS, lookup as stream_lookup
+
 MODELS_DIR = "models"
-DEMAND_FILE = os.path.join(MODELS_DIR, "demand_stats.pkl")
+DEMAND_FILE = "demand_stats.pkl"
 
 
-def load_demand_stats():
-    if not os.path.exists(DEMAND_FILE):
+def load_demand_stats(models_dir: str = MODELS_DIR):
+    path = os.path.join(models_dir, DEMAND_FILE)
+    if not os.path.exists(path):
         return {"by_type": {}, "global": {}}
-    with open(DEMAND_FILE, "rb") as f:
+    with open(path, "rb") as f:
         return pickle.load(f)
 
 
-def estimate_demand_fields(machine_type: str):
-    stats = load_demand_stats()
-    by_type = stats.get("by_type", {})
-    global_stats = stats.get("global", {})
-
-    type_stats = by_type.get(machine_type, {}) or {}
-
-    def _get(field: str, default: float = 0.0) -> float:
+def _resolve(type_stats: dict, global_stats: dict) -> dict:
+    """Per-field type median, else global median, else 0."""
+    fields = {}
+    for field in FIELDS:
         v = type_stats.get(field)
         if v is None:
-            v = global_stats.get(field, default)
-        if v is None:
-            v = default
-        return float(v)
-
-    return {
-        "old_rental_price": _get("old_rental_price", 0.0),
-        "last_year_price": _get("last_year_price", 0.0),
-        "bookings_7d": _get("bookings_7d", 0.0),
-        "stock_on_hand": _get("stock_on_hand", 0.0),
-        "market_trend_score": _get("market_trend_score", 0.0),
-    }
+            v = global_stats.get(field)
+        fields[field] = 0.0 if v is None else float(v)
+    return fields
+
+
+_FALLBACKS: dict[str, tuple] = {}      # path → (mtime, {type: fields}, global fields)
+
+
+def _fallbacks(models_dir: str) -> tuple[dict, dict]:
+    """Training-time fallback fields per machine type, unpickled once per file version."""
+    path = os.path.join(models_dir, DEMAND_FILE)
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    cached = _FALLBACKS.get(path)
+    if cached is None or cached[0] != mtime:
+        stats = load_demand_stats(models_dir)
+        global_stats = stats.get("global", {}) or {}
+        by_type = {t: _resolve(s or {}, global_stats) for t, s in (stats.get("by_type", {}) or {}).items()}
+        cached = _FALLBACKS[path] = (mtime, by_type, _resolve({}, global_stats))
+    return cached[1], cached[2]
+
+
+def estimate_demand_fields(machine_type: str, pincode: str | None = None, models_dir: str = MODELS_DIR):
+    """Demand fields for one request, from the bundle in `models_dir` plus live stats."""
+    by_type, global_fields = _fallbacks(models_dir)
+    fields = dict(by_type.get(machine_type, global_fields))
+
+    # decayed medians from the demand stream (memory-mapped snapshot) beat
+    # the frozen training medians; per (type, pincode prefix) when known
+    fields.update(stream_lookup(machine_type, pincode, models_dir))
+
+    # live per-type booking rate from the analytics store, scaled to the
+    # per-market count (bookings_7d alongside stock_on_hand) the models learned
+    rate = analytics.demand_fields(machine_type).get("bookings_per_machine_7d")
+    if rate is not None:
+        fields["bookings_7d"] = rate * fields["stock_on_hand"]
+    return fields
@@ -0,0 +1,494 @@
+# demand_stream.py
+# Streaming replacement for the per-type medians in demand_stats.pkl.
+#
+# Every (machine_type, pincode prefix) key keeps, per demand field, an
+# exponentially decayed mean and a merging t-digest of at most CENTROIDS
+# centroids, so memory per key is fixed no matter how many events arrive.
+# Keys are also aggregated per type ("*" prefix) and globally ("*", "*"),
+# which is where lookups fall back when a key has too little recent weight.
+#
+# Inputs:
+#   machines    listing price → old_rental_price, last_year_price
+#   rentals     realized hourly price (totalPrice / hours) → old_rental_price
+#
+# Live market fields seen at request time are not fed back: MarketStats
+# counts (and its trend rule) are on a different scale from the training
+# columns the seed holds, and the digests must stay on the trained one.
+# bookings_7d, stock_on_hand and market_trend_score keep their seeded
+# training distribution.
+#
+# train.py seeds <models_dir>/demand_stream.npy from the training frame of
+# each bundle; the serving process applies events on a background thread
+# (resuming from the serving primary's seed) and snapshots to
+# data/demand_stream.npy. Both are plain structured .npy files that
+# demand_stats.estimate_demand_fields memory-maps (no unpickling); the newer
+# of the live snapshot and the scored bundle's seed is read.
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from logging_config import get_logger
+from market_stats import _key, _ts
+
+logger = get_logger("demand_stream")
+
+MODELS_DIR = "models"
+SEED_FILE = "demand_stream.npy"                 # inside each bundle dir
+LIVE_FILE = os.getenv("DEMAND_STREAM_FILE", os.path.join("data", "demand_stream.npy"))
+
+FIELDS = ["old_rental_price", "last_year_price", "bookings_7d", "stock_on_hand", "market_trend_score"]
+HALF_LIFE_S = float(os.getenv("DEMAND_HALF_LIFE_DAYS", "14")) * 86400
+DECAY = math.log(2) / HALF_LIFE_S
+CENTROIDS = 32                 # per key and field
+DELTA = 2 * (CENTROIDS - 1)    # bucketed k1 scale yields at most DELTA/2 + 1 centroids
+BUFFER = 16                    # raw values held before a merge
+MIN_WEIGHT = 5.0               # decayed observations needed before a key is trusted
+SNAPSHOT_S = float(os.getenv("DEMAND_SNAPSHOT_S", "60"))
+MAX_PENDING = 100_000
+ANY = "*"
+
+F, C = len(FIELDS), CENTROIDS
+SNAPSHOT_DTYPE = np.dtype([
+    ("machine_type", "U48"),
+    ("prefix", "U8"),
+    ("t", "f8"),                        # time the weights below are decayed to
+    ("median", "f4", (F,)),
+    ("mean", "f4", (F,)),
+    ("weight", "f4", (F,)),
+    ("means", "f4", (F, C)),            # t-digest centroids (to resume the stream)
+    ("weights", "f4", (F, C)),
+])
+
+
+def _prefix(pincode) -> str:
+    return str(pincode or "").strip()[:3]
+
+
+def _levels(machine_type, pincode) -> list[tuple[str, str]]:
+    """Keys an observation updates / a lookup tries, most specific first."""
+    mtype = str(machine_type or "").strip() or "Unknown"
+    prefix = _prefix(pincode)
+    levels = [(mtype, prefix)] if prefix else []
+    return levels + [(mtype, ANY), (ANY, ANY)]
+
+
+# ------------------------------------------------------------
+# T-DIGEST (merging, k1 scale, vectorized compress)
+# ------------------------------------------------------------
+def _k_bucket(mid_q: np.ndarray) -> np.ndarray:
+    mid_q = np.clip(mid_q, 0.0, 1.0)
+    return np.floor(DELTA / (2 * np.pi) * (np.arcsin(2 * mid_q - 1) + np.pi / 2)).astype(np.int32)
+
+
+def compress(means: np.ndarray, weights: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Merge centroids (any order, zero weights dropped) into ≤ CENTROIDS."""
+    keep = weights > 0
+    means, weights = means[keep], weights[keep]
+    if len(means) == 0:
+        return means, weights
+    order = np.argsort(means, kind="stable")
+    m, w = means[order].astype(np.float64), weights[order].astype(np.float64)
+    cum = np.cumsum(w)
+    k = _k_bucket((cum - w / 2) / cum[-1])
+    starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+    W = np.add.reduceat(w, starts)
+    return np.add.reduceat(m * w, starts) / W, W
+
+
+def quantiles(means: np.ndarray, weights: np.ndarray, q: float) -> np.ndarray:
+    """
+    q-quantile of every digest in (..., C) arrays of compressed centroids
+    (sorted by mean, zero-weight slots last); NaN for empty digests.
+    """
+    cum = np.cumsum(weights, axis=-1)
+    total = cum[..., -1:]
+    mid = cum - weights / 2
+    valid = (weights > 0).sum(axis=-1, keepdims=True)
+    hi = np.minimum((mid < q * total).sum(axis=-1, keepdims=True), valid - 1).clip(0)
+    lo = (hi - 1).clip(0)
+    m_lo, m_hi = np.take_along_axis(means, lo, -1), np.take_along_axis(means, hi, -1)
+    x_lo, x_hi = np.take_along_axis(mid, lo, -1), np.take_along_axis(mid, hi, -1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.where(x_hi > x_lo, (q * total - x_lo) / (x_hi - x_lo), 1.0).clip(0, 1)
+        out = np.where(valid > 0, m_lo + frac * (m_hi - m_lo), np.nan)
+    return out[..., 0]
+
+
+# ------------------------------------------------------------
+# SNAPSHOT FILES
+# ------------------------------------------------------------
+def write_snapshot(records: np.ndarray, path: str) -> None:
+    """Atomic replace, so readers never map a half-written file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, records, allow_pickle=False)
+    os.replace(tmp, path)
+
+
+def _newest(paths) -> str | None:
+    existing = [p for p in paths if os.path.exists(p)]
+    return max(existing, key=os.path.getmtime) if existing else None
+
+
+def seed_path(models_dir: str = MODELS_DIR) -> str:
+    return os.path.join(models_dir, SEED_FILE)
+
+
+_SNAPSHOTS: dict[str, tuple] = {}      # path → (mtime, records, index)
+
+
+def load_snapshot(paths=(LIVE_FILE, seed_path())):
+    """Memory-mapped records + key → row index of the newest snapshot (None if none)."""
+    path = _newest(paths)
+    if path is None:
+        return None
+    mtime = os.path.getmtime(path)
+    cached = _SNAPSHOTS.get(path)
+    if cached is None or cached[0] != mtime:
+        records = np.load(path, mmap_mode="r", allow_pickle=False)
+        if records.dtype != SNAPSHOT_DTYPE:
+            logger.warning(f"Ignoring {path}: snapshot layout {records.dtype} is not the current one")
+            return None
+        index = {k: i for i, k in enumerate(zip(records["machine_type"].tolist(), records["prefix"].tolist()))}
+        cached = _SNAPSHOTS[path] = (mtime, records, index)
+    return cached[1], cached[2]
+
+
+def lookup(machine_type, pincode=None, models_dir: str = MODELS_DIR) -> dict:
+    """
+    Decayed median per demand field from the newest of the live snapshot
+    and the `models_dir` bundle's seed, taken from the most specific key
+    with at least MIN_WEIGHT recent observations of that field. Fields no
+    key can answer are left out.
+    """
+    snap = load_snapshot((LIVE_FILE, seed_path(models_dir)))
+    if snap is None:
+        return {}
+    records, index = snap
+    rows = [index[k] for k in _levels(machine_type, pincode) if k in index]
+    out = {}
+    for row in rows:
+        rec = records[row]
+        weight, median = rec["weight"], rec["median"]
+        for j, field in enumerate(FIELDS):
+            if field not in out and weight[j] >= MIN_WEIGHT and np.isfinite(median[j]):
+                out[field] = float(median[j])
+        if len(out) == F:
+            break
+    return out
+
+
+# ------------------------------------------------------------
+# SEED FROM THE TRAINING FRAME (train.py, vectorized)
+# ------------------------------------------------------------
+def _grouped_digests(group: np.ndarray, v_order: np.ndarray, values: np.ndarray, n_groups: int):
+    """
+    (n_groups, C) centroid means/weights for every group at once.
+    `v_order` sorts `values` (NaNs last); a stable sort by group keeps that
+    order inside each group.
+    """
+    means = np.zeros((n_groups, C), np.float32)
+    wts = np.zeros((n_groups, C), np.float32)
+    order = v_order[np.isfinite(values[v_order]) & (group[v_order] >= 0)]
+    if len(order) == 0:
+        return means, wts
+    if n_groups > 1:
+        order = order[np.argsort(group[order], kind="stable")]
+    g, v = group[order], values[order]
+
+    size = np.bincount(g, minlength=n_groups)
+    first = np.cumsum(size) - size
+    rank = np.arange(len(g)) - first[g]
+    k = _k_bucket((rank + 0.5) / size[g])
+
+    starts = np.flatnonzero(np.r_[True, (g[1:] != g[:-1]) | (k[1:] != k[:-1])])
+    W = np.diff(np.r_[starts, len(g)]).astype(np.float64)
+    M = np.add.reduceat(v, starts) / W
+    cg = g[starts]
+    slot = np.arange(len(starts)) - np.searchsorted(cg, cg)      # rank within group
+    means[cg, slot] = M
+    wts[cg, slot] = W
+    return means, wts
+
+
+def seed_from_frame(df: pd.DataFrame, models_dir: str = MODELS_DIR, now: float | None = None) -> np.ndarray:
+    """
+    Build the starting snapshot (<models_dir>/demand_stream.npy) from
+    training rows, stamped `now`: the
+    training distribution counts in full at first and fades as live events
+    arrive. (Weighting rows by their own age would throw most of a
+    multi-year training set away.)
+    """
+    now = time.time() if now is None else now
+    n = len(df)
+    # names cleaned per distinct value, not per row
+    raw_codes, raw_types = pd.factorize(df["machine_type"])
+    type_of_raw, types = pd.factorize(pd.Index(raw_types.astype(str)).str.strip().str.replace(r"^$", "Unknown", regex=True))
+    types = np.asarray(types, dtype=object)
+    t_codes = np.where(raw_codes >= 0, type_of_raw[raw_codes.clip(0)], -1)
+
+    # likewise prefixes per distinct pincode; -1 = no usable prefix
+    prefixes = np.array([], dtype=object)
+    p_codes = np.full(n, -1)
+    if "pincode" in df:
+        pin_codes, pincodes = pd.factorize(df["pincode"])
+        prefix_of_pin, prefixes = pd.factorize(pd.Index(pincodes.astype(str)).str.strip().str[:3])
+        prefixes = np.asarray(prefixes, dtype=object)
+        prefix_of_pin = np.where(prefixes[prefix_of_pin] == "", -1, prefix_of_pin)
+        p_codes = np.where(pin_codes >= 0, prefix_of_pin[pin_codes.clip(0)], -1)
+
+    P = max(len(prefixes), 1)
+    has_prefix = (p_codes >= 0) & (t_codes >= 0)
+    pairs, inverse = np.unique(t_codes[has_prefix] * P + p_codes[has_prefix], return_inverse=True)
+    pair_codes = np.full(n, -1)
+    pair_codes[has_prefix] = inverse
+
+    levels = [                                  # (group per row, machine_type per group, prefix per group)
+        (pair_codes, types[pairs // P], prefixes[pairs % P] if len(prefixes) else np.array([], object)),
+        (t_codes, types, np.full(len(types), ANY, object)),
+        (np.zeros(n, np.int64), np.array([ANY], object), np.array([ANY], object)),
+    ]
+
+    parts = [np.zeros(len(level_types), SNAPSHOT_DTYPE) for _, level_types, _ in levels]
+    for rec, (_, level_types, level_prefixes) in zip(parts, levels):
+        rec["machine_type"], rec["prefix"], rec["t"] = level_types, level_prefixes, now
+    for j, field in enumerate(FIELDS):
+        if field not in df:
+            continue
+        values = pd.to_numeric(df[field], errors="coerce").to_numpy(np.float64)
+        v_order = np.argsort(values, kind="stable")
+        for rec, (codes, _, _) in zip(parts, levels):
+            rec["means"][:, j], rec["weights"][:, j] = _grouped_digests(codes, v_order, values, len(rec))
+
+    records = np.concatenate(parts)
+    _summarize(records)
+    path = seed_path(models_dir)
+    write_snapshot(records, path)
+    logger.info(f"Demand stream seed: {len(records)} keys from {n:,} rows → {path}")
+    return records
+
+
+def _summarize(records: np.ndarray) -> None:
+    """Fill median / mean / weight from the centroids (in place)."""
+    means, weights = records["means"].astype(np.float64), records["weights"].astype(np.float64)
+    total = weights.sum(axis=2)
+    records["weight"] = total
+    with np.errstate(invalid="ignore", divide="ignore"):
+        records["mean"] = (means * weights).sum(axis=2) / total
+    records["median"] = quantiles(means, weights, 0.5)
+
+
+# ------------------------------------------------------------
+# STREAMING UPDATER (serving)
+# ------------------------------------------------------------
+class DemandStream:
+    """
+    Applies machine / rental change events and prediction observations to
+    the per-key digests. apply_event and observe only enqueue (O(1), never
+    block a request); a background thread merges them and writes a
+    snapshot every SNAPSHOT_S seconds.
+    """
+
+    def __init__(self, live_path: str = LIVE_FILE, models_dir: str | None = None):
+        self.live_path = live_path
+        self.models_dir = models_dir         # None: follow the serving primary bundle
+        self._lock = threading.Lock()
+        self._pending: deque = deque(maxlen=MAX_PENDING)
+        self._machines: dict[str, tuple[str, str]] = {}      # machine id → (type, pincode), to place rentals
+        self._index: dict[tuple[str, str], int] = {}
+        self._alloc(0)
+        self._source = (None, 0.0)           # seed the state was resumed against, its mtime
+        self._thread = None
+        self.counts = {"events": 0, "observations": 0, "dropped": 0, "snapshots": 0}
+
+    # ---------------- storage ----------------
+    def _alloc(self, capacity: int) -> None:
+        self.t = np.zeros(capacity)
+        self.means = np.zeros((capacity, F, C), np.float32)
+        self.weights = np.zeros((capacity, F, C), np.float32)
+        self.buf_v = np.zeros((capacity, F, BUFFER), np.float32)
+        self.buf_w = np.zeros((capacity, F, BUFFER), np.float32)
+        self.nbuf = np.zeros((capacity, F), np.int16)
+        self.keys: list[tuple[str, str]] = []
+
+    def _grow(self) -> None:
+        old = (self.t, self.means, self.weights, self.buf_v, self.buf_w, self.nbuf)
+        keys = self.keys
+        self._alloc(max(64, 2 * len(self.t)))
+        for new, prev in zip((self.t, self.means, self.weights, self.buf_v, self.buf_w, self.nbuf), old):
+            new[:len(prev)] = prev
+        self.keys = keys
+
+    def _row(self, key: tuple[str, str], now: float) -> int:
+        row = self._index.get(key)
+        if row is None:
+            if len(self.keys) == len(self.t):
+                self._grow()
+            row = len(self.keys)
+            self.keys.append(key)
+            self._index[key] = row
+            self.t[row] = now
+        return row
+
+    def _seed_path(self) -> str:
+        models_dir = self.models_dir
+        if models_dir is None:
+            from model_registry import registry      # lazy: train.py imports this module without serving
+            models_dir = registry.config()["primary"]
+        return seed_path(models_dir)
+
+    def load(self) -> bool:
+        """Resume from the newest of the live / seed snapshots."""
+        seed = self._seed_path()
+        path = _newest([self.live_path, seed])
+        if path is None:
+            return False
+        records = np.load(path, allow_pickle=False)
+        if records.dtype != SNAPSHOT_DTYPE:
+            return False
+        self._alloc(max(64, len(records)))
+        self.keys = list(zip(records["machine_type"].tolist(), records["prefix"].tolist()))
+        self._index = {k: i for i, k in enumerate(self.keys)}
+        n = len(records)
+        self.t[:n] = records["t"]
+        self.means[:n] = records["means"]
+        self.weights[:n] = records["weights"]
+        self._source = (seed, os.path.getmtime(seed) if os.path.exists(seed) else 0.0)
+        logger.info(f"Demand stream resumed from {path}: {n} keys")
+        return True
+
+    # ---------------- inputs (request / feed threads) ----------------
+    def observe(self, machine_type, pincode, fields: dict, ts: float | None = None) -> None:
+        values = [(FIELDS.index(k), float(v)) for k, v in fields.items() if k in FIELDS and v is not None]
+        if values:
+            self._enqueue((machine_type, pincode, values, time.time() if ts is None else ts))
+
+    def apply_event(self, collection: str, event: dict) -> None:
+        """Mongo change-stream style event (same feed as MarketStats)."""
+        doc = event.get("fullDocument")
+        if event.get("operationType") == "delete" or not doc:
+            return
+        if collection == "machines":
+            meta = doc.get("meta") or {}
+            pincode, mtype = _key(doc.get("pincode"), doc.get("type") or doc.get("machine_type"))
+            self._machines[str(doc.get("_id"))] = (mtype, pincode)
+            rent = doc.get("rentPerHour")
+            self.observe(mtype, pincode, {
+                "old_rental_price": meta.get("old_rental_price", rent),
+                "last_year_price": doc.get("last_year_price", meta.get("last_year_price")),
+            }, _ts(doc.get("updatedAt") or doc.get("createdAt")))
+        elif collection == "rentals":
+            machine = self._machines.get(str(doc.get("machineId")))
+            price = doc.get("totalPrice")
+            if machine is None or not price or not doc.get("startTime") or not doc.get("endTime"):
+                return
+            hours = (_ts(doc["endTime"]) - _ts(doc["startTime"])) / 3600
+            if hours > 0:
+                self.observe(*machine, {"old_rental_price": float(price) / hours}, _ts(doc.get("createdAt")))
+
+    def _enqueue(self, item) -> None:
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.counts["dropped"] += 1
+            self._pending.append(item)
+            self.counts["events"] += 1
+
+    # ---------------- merging (updater thread) ----------------
+    def _decay_to(self, row: int, ts: float) -> float:
+        """Bring the row's weights to time ts; returns the weight of an observation at ts."""
+        dt = ts - self.t[row]
+        if dt <= 0:
+            return math.exp(DECAY * dt)           # late event: counts for less
+        f = math.exp(-DECAY * dt)
+        self.weights[row] *= f
+        self.buf_w[row] *= f
+        self.t[row] = ts
+        return 1.0
+
+    def _flush(self, row: int, j: int) -> None:
+        n = self.nbuf[row, j]
+        if n == 0:
+            return
+        m, w = compress(np.concatenate([self.means[row, j], self.buf_v[row, j, :n]]),
+                        np.concatenate([self.weights[row, j], self.buf_w[row, j, :n]]))
+        k = len(m)
+        self.means[row, j, :k], self.weights[row, j, :k] = m, w
+        self.means[row, j, k:] = 0
+        self.weights[row, j, k:] = 0
+        self.nbuf[row, j] = 0
+
+    def _apply(self, machine_type, pincode, values, ts: float) -> None:
+        for key in _levels(machine_type, pincode):
+            row = self._row(key, ts)
+            w = self._decay_to(row, ts)
+            for j, v in values:
+                if not math.isfinite(v):
+                    continue
+                b = self.nbuf[row, j]
+                self.buf_v[row, j, b], self.buf_w[row, j, b] = v, w
+                self.nbuf[row, j] = b + 1
+                if b + 1 == BUFFER:
+                    self._flush(row, j)
+        self.counts["observations"] += 1
+
+    def drain(self) -> int:
+        with self._lock:
+            items, self._pending = self._pending, deque(maxlen=MAX_PENDING)
+        for item in items:
+            self._apply(*item)
+        return len(items)
+
+    def snapshot(self, path: str | None = None) -> np.ndarray:
+        """Merge all buffers, decay every key to now and write the snapshot."""
+        now = time.time()
+        n = len(self.keys)
+        for row in range(n):
+            self._decay_to(row, now)
+            for j in np.flatnonzero(self.nbuf[row]):
+                self._flush(row, j)
+        records = np.zeros(n, SNAPSHOT_DTYPE)
+        if n:
+            records["machine_type"], records["prefix"] = map(list, zip(*self.keys))
+        records["t"] = self.t[:n]
+        records["means"] = self.means[:n]
+        records["weights"] = self.weights[:n]
+        _summarize(records)
+        write_snapshot(records, path or self.live_path)
+        self.counts["snapshots"] += 1
+        return records
+
+    def _run(self) -> None:
+        self.load()
+        while True:
+            time.sleep(SNAPSHOT_S)
+            try:
+                # a retrain / promotion brought a newer seed: it already covers the history, start over from it
+                seed = self._seed_path()
+                if os.path.exists(seed) and (seed != self._source[0] or os.path.getmtime(seed) > self._source[1]):
+                    self.load()
+                if self.drain():
+                    self.snapshot()
+            except Exception as e:
+                logger.warning(f"Demand stream update failed: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="demand-stream", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+            pending = len(self._pending)
+        return {**counts, "pending": pending, "keys": len(self.keys),
+                "bytes_per_key": int(self.means[0].nbytes * 2 + self.buf_v[0].nbytes * 2) if len(self.t) else 0}
+
+
+demand_stream = DemandStream()
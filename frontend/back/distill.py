@@ -0,0 +1,150 @@
+# distill.py
+# Distilled fast path: an additive lookup-table model (a GAM with one
+# binned table per numeric feature) fit on the ensemble's own predictions.
+#
+# Scoring is one comparison against ≤ BINS-1 cut points and one table
+# lookup per feature, on the numeric feature matrix only (no CatBoost
+# frame, no scaling), instead of 800 trees across three libraries. It is
+# meant for previews / latency-bound requests (`fast=true`); train.py
+# reports how far it is from the ensemble.
+import os
+import pickle
+import time
+
+import numpy as np
+
+from model_utils import FEATURE_DTYPE
+from logging_config import get_logger
+
+logger = get_logger("distill")
+
+STUDENT_FILE = "student.pkl"
+BINS = 32                  # bins per feature (quantile cut points)
+PASSES = 10                # backfitting sweeps
+RIDGE = 5.0                # pseudo-rows pulling sparse bins toward 0
+DISTILL_ROWS = int(os.getenv("DISTILL_ROWS", "200000"))
+CHUNK = 4096               # rows per broadcast comparison when scoring
+
+
+class AdditiveStudent:
+    """
+    price ≈ intercept + Σ_j table_j[bin_j(x_j)], tables fit by backfitting
+    on teacher (ensemble) outputs.
+    """
+
+    def __init__(self, features: list[str], bins: int = BINS):
+        self.features = list(features)
+        self.bins = bins
+        self.edges = np.zeros((len(features), 0), dtype=FEATURE_DTYPE)   # (F, B-1), +inf padded
+        self.tables = np.zeros(0)                                         # flat, per-feature blocks
+        self.offsets = np.zeros(len(features), dtype=np.intp)
+        self.intercept = 0.0
+        self.metrics: dict = {}
+
+    # ---------------- fit ----------------
+    def _cut_points(self, X: np.ndarray) -> np.ndarray:
+        q = np.linspace(0, 1, self.bins + 1)[1:-1]
+        cuts = [np.unique(np.quantile(X[:, j], q)).astype(FEATURE_DTYPE) for j in range(X.shape[1])]
+        width = max(1, max(len(c) for c in cuts))
+        edges = np.full((X.shape[1], width), np.inf, dtype=FEATURE_DTYPE)
+        for j, c in enumerate(cuts):
+            edges[j, :len(c)] = c
+        return edges
+
+    def fit(self, X: np.ndarray, teacher: np.ndarray, passes: int = PASSES) -> "AdditiveStudent":
+        X = np.asarray(X, dtype=FEATURE_DTYPE)
+        target = np.asarray(teacher, dtype=np.float64)
+        self.edges = self._cut_points(X)
+        codes = self._codes(X)
+        size = self.edges.shape[1] + 1
+        self.offsets = np.arange(X.shape[1], dtype=np.intp) * size
+        tables = np.zeros((X.shape[1], size))
+
+        self.intercept = float(target.mean())
+        resid = target - self.intercept
+        for _ in range(passes):
+            for j in range(X.shape[1]):
+                c = codes[:, j]
+                resid += tables[j][c]
+                count = np.bincount(c, minlength=size)
+                tables[j] = np.bincount(c, resid, minlength=size) / (count + RIDGE)
+                resid -= tables[j][c]
+        self.tables = tables.reshape(-1)
+        return self
+
+    # ---------------- score ----------------
+    def _codes(self, X: np.ndarray) -> np.ndarray:
+        """Bin index per cell: number of cut points ≤ x (searchsorted side='right')."""
+        out = np.empty(X.shape, dtype=np.intp)
+        for s in range(0, len(X), CHUNK):
+            block = X[s:s + CHUNK]
+            out[s:s + CHUNK] = (block[:, :, None] >= self.edges[None]).sum(axis=2)
+        return out
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=FEATURE_DTYPE)
+        return self.intercept + self.tables[self._codes(X) + self.offsets].sum(axis=1)
+
+    def save(self, models_dir: str) -> None:
+        with open(os.path.join(models_dir, STUDENT_FILE), "wb") as f:
+            pickle.dump(self, f)
+
+
+def load_student(models_dir: str) -> AdditiveStudent | None:
+    path = os.path.join(models_dir, STUDENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+# ------------------------------------------------------------
+# DISTILLATION (train.py)
+# ------------------------------------------------------------
+def _cpu_us_per_row(fn, n: int, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.process_time()
+        fn()
+        best = min(best, time.process_time() - t0)
+    return best / n * 1e6
+
+
+def distill(teacher_fn, X_train: np.ndarray, X_val: np.ndarray, y_val, teacher_val: np.ndarray,
+            features: list[str]) -> AdditiveStudent:
+    """
+    Fit the student on teacher_fn(rows) for up to DISTILL_ROWS training
+    rows and record on the validation split: MAE vs the ensemble, MAE vs
+    the truth for both, and CPU per prediction (batch and single row).
+    teacher_fn(idx, split) scores rows `idx` of "train" / "val".
+    """
+    rng = np.random.default_rng(42)
+    idx = np.sort(rng.choice(len(X_train), size=min(DISTILL_ROWS, len(X_train)), replace=False))
+    student = AdditiveStudent(features).fit(X_train[idx], teacher_fn(idx, "train"))
+
+    y_val = np.asarray(y_val, dtype=np.float64)
+    p_student = student.predict(X_val)
+    n = min(2000, len(X_val))
+    one = np.arange(min(200, len(X_val)))
+    student.metrics = {
+        "mae_vs_ensemble": float(np.mean(np.abs(p_student - teacher_val))),
+        "mae_student": float(np.mean(np.abs(p_student - y_val))),
+        "mae_ensemble": float(np.mean(np.abs(teacher_val - y_val))),
+        "cpu_us_per_row_batch": {
+            "ensemble": _cpu_us_per_row(lambda: teacher_fn(np.arange(n), "val"), n),
+            "student": _cpu_us_per_row(lambda: student.predict(X_val[:n]), n),
+        },
+        "cpu_us_per_row_single": {
+            "ensemble": _cpu_us_per_row(lambda: [teacher_fn(np.array([i]), "val") for i in one], len(one), 1),
+            "student": _cpu_us_per_row(lambda: [student.predict(X_val[i:i + 1]) for i in one], len(one), 1),
+        },
+        "rows": int(len(idx)),
+    }
+    m = student.metrics
+    logger.info(
+        f"Student: MAE vs ensemble {m['mae_vs_ensemble']:.3f} | MAE {m['mae_student']:.3f} "
+        f"(ensemble {m['mae_ensemble']:.3f}) | CPU/row single "
+        f"{m['cpu_us_per_row_single']['ensemble']:.0f} → {m['cpu_us_per_row_single']['student']:.0f} us, "
+        f"batch {m['cpu_us_per_row_batch']['ensemble']:.1f} → {m['cpu_us_per_row_batch']['student']:.1f} us"
+    )
+    return student
@@ -4,6 +4,8 @@ from sklearn.model_selection import KFold
 import pickle
 import os
 
+from model_utils import FEATURE_DTYPE
+
 MODELS_DIR = "models"
 os.makedirs(MODELS_DIR, exist_ok=True)
 
@@ -14,45 +16,61 @@ def _safe_splits(n_samples: int, desired: int = 5) -> int:
     return min(desired, n_samples)
 
 
+def _codes(series: pd.Series):
+    """(categories, int codes); works on object and categorical columns alike."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.categories, series.cat.codes.to_numpy()
+    codes, cats = pd.factorize(series)
+    return cats, codes
+
+
+def _group_median(codes: np.ndarray, y: np.ndarray, n_cats: int) -> np.ndarray:
+    med = pd.Series(y).groupby(codes).median()
+    med = med[med.index >= 0]
+    out = np.full(n_cats, np.nan)
+    out[med.index.to_numpy()] = med.to_numpy()
+    return out
+
+
 def target_encode(series: pd.Series, target: pd.Series, n_splits: int = 5):
-    df = pd.DataFrame({"cat": series, "y": target})
-    n_samples = len(df)
+    cats, codes = _codes(series)
+    y = np.asarray(target, dtype=float)
+    n_samples = len(codes)
     n_splits = _safe_splits(n_samples, n_splits)
 
-    global_median = float(target.median())
+    global_median = float(np.median(y)) if n_samples else float("nan")
+    full = _group_median(codes, y, len(cats))
+    final_dict = {c: float(m) for c, m in zip(cats, full) if m == m}
 
     if n_splits <= 1:
-        enc_series = pd.Series(global_median, index=series.index)
-        final_dict = df.groupby("cat")["y"].median().to_dict()
-        return enc_series.values, final_dict, global_median
+        return np.full(n_samples, global_median, dtype=FEATURE_DTYPE), final_dict, global_median
 
     kf = KFold(n_splits=n_splits, shuffle=True, random_state=42)
 
-    encoded = pd.Series(np.zeros(n_samples), index=series.index)
+    encoded = np.full(n_samples, np.nan)
 
-    for tr_idx, val_idx in kf.split(df):
-        train_fold = df.iloc[tr_idx]
-        val_fold = df.iloc[val_idx]
-        means = train_fold.groupby("cat")["y"].median()
-        encoded.iloc[val_idx] = val_fold["cat"].map(means)
+    for tr_idx, val_idx in kf.split(codes):
+        means = np.append(_group_median(codes[tr_idx], y[tr_idx], len(cats)), np.nan)
+        encoded[val_idx] = means[codes[val_idx]]          # code -1 → NaN
 
-    encoded = encoded.fillna(global_median)
-    final_dict = df.groupby("cat")["y"].median().to_dict()
+    encoded = np.where(np.isnan(encoded), global_median, encoded)
 
-    return encoded.values, final_dict, global_median
+    return encoded.astype(FEATURE_DTYPE), final_dict, global_median
 
 
 def hybrid_encode(series: pd.Series, target: pd.Series):
-    freq = series.value_counts().to_dict()
-    freq_encoded = series.map(freq).fillna(0)
+    cats, codes = _codes(series)
+    counts = np.bincount(codes[codes >= 0], minlength=len(cats))
+    freq = {c: int(n) for c, n in zip(cats, counts) if n}
+    freq_encoded = np.where(codes >= 0, counts[np.maximum(codes, 0)], 0)
 
     target_encoded, te_dict, global_median = target_encode(series, target)
     hybrid = 0.5 * freq_encoded + 0.5 * target_encoded
 
-    return hybrid.values, freq, te_dict, global_median
+    return hybrid.astype(FEATURE_DTYPE), freq, te_dict, global_median
 
 
-def save_encoder(name: str, payload: dict):
-    path = os.path.join(MODELS_DIR, name)
+def save_encoder(name: str, payload: dict, models_dir: str = MODELS_DIR):
+    path = os.path.join(models_dir, name)
     with open(path, "wb") as f:
         pickle.dump(payload, f)
@@ -0,0 +1,321 @@
+# feature_pipeline.py
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from model_utils import (
+    build_features, add_derived_features, calendar_fields, NUMERIC_COLS, SEASON_BY_MONTH, FEATURE_DTYPE,
+)
+from encoding_utils import target_encode, hybrid_encode
+from logging_config import get_logger
+
+logger = get_logger("feature_pipeline")
+
+PIPELINE_FILE = "feature_pipeline.pkl"
+ENCODED_COLS = ["machine_type_xgb", "machine_type_lgb"]
+COMPUTED_COLS = set(NUMERIC_COLS) | set(ENCODED_COLS) | {
+    "usage_ratio", "demand_ratio", "price_trend", "fuel_cost_factor",
+    "heat_stress", "humidity_stress", "rain_risk",
+}
+
+
+def _missing(v) -> bool:
+    return v is None or (isinstance(v, float) and v != v)
+
+
+def _factorize(values):
+    """(codes, distinct values); None / NaN get code -1."""
+    if isinstance(values, np.ndarray) and values.dtype.kind == "U":
+        # fixed-width strings (records.py) are never missing; large batches factorize in C
+        if len(values) >= 64:
+            uniq, codes = np.unique(values, return_inverse=True)
+            return codes.reshape(-1), uniq.tolist()
+        values = values.tolist()
+    index: dict = {}
+    codes = np.fromiter(
+        (-1 if _missing(v) else index.setdefault(v, len(index)) for v in values),
+        dtype=np.intp, count=len(values),
+    )
+    return codes, list(index)
+
+
+def _per_unique(values, fn, fill):
+    """fn over the distinct values only (None / NaN → fill), gathered back to rows."""
+    codes, uniq = _factorize(values)
+    mapped = [fn(v) for v in uniq] + [fill]
+    out = np.empty(len(mapped), dtype=object if isinstance(fill, str) else FEATURE_DTYPE)
+    out[:] = mapped
+    return out[codes]
+
+
+def _to_float(v) -> float:
+    """pd.to_numeric(errors="coerce") for one value, NaN → 0."""
+    try:
+        x = float(v)
+    except (TypeError, ValueError):
+        x = pd.to_numeric(v, errors="coerce")
+    return 0.0 if x != x else x
+
+
+def _numeric(values, n: int) -> np.ndarray:
+    if values is None:                                        # absent column → imputed later
+        return np.full(n, np.nan, dtype=FEATURE_DTYPE)
+    try:
+        return np.asarray(values, dtype=FEATURE_DTYPE)        # numbers / None
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(FEATURE_DTYPE)
+
+
+class FeatureBatch:
+    """Model inputs for one batch: numeric matrix, its scaled copy, CatBoost frame."""
+
+    __slots__ = ("num", "scaled", "cat")
+
+    def __init__(self, num, scaled, cat):
+        self.num = num
+        self.scaled = scaled
+        self.cat = cat
+
+    def __len__(self):
+        return len(self.num)
+
+
+class FeaturePipeline:
+    """
+    Every fitted piece of feature logic for one model bundle: frequency map,
+    target / hybrid encodings, geo index, column order, NaN fills and the
+    XGBoost scaler. Pickled as models/feature_pipeline.pkl.
+
+    Training goes through build_features (DataFrame, out-of-fold encodings);
+    serving goes through transform(), which works on plain column arrays,
+    evaluates string features once per distinct value and writes straight
+    into the float32 matrix in num_features order.
+    """
+
+    def __init__(self, geo_index=None):
+        self.geo_index = geo_index
+        self.freq_map: dict = {}
+        self.te_dict: dict = {}
+        self.te_median = 0.0
+        self.hybrid_freq: dict = {}
+        self.hybrid_te: dict = {}
+        self.hybrid_median = 0.0
+        self.num_features: list[str] = []
+        self.cat_columns: list[str] = []
+        self.cat_features_idx: list[int] = []
+        self.fill = None
+        self.impute: dict = {}         # train.clean_data medians of the raw numerics
+        self.scaler = None
+        self.named_inputs = False      # legacy bundles were fitted on DataFrames
+
+    # ---------------- fit (train.py) ----------------
+    def fit_features(self, X_raw: pd.DataFrame, impute: dict | None = None) -> pd.DataFrame:
+        self.freq_map = X_raw["machine_type"].value_counts().to_dict()
+        self.impute = dict(impute or {})
+        return build_features(X_raw, freq_map=self.freq_map, geo_index=self.geo_index, impute=self.impute)
+
+    def fit_encoders(self, X_fe: pd.DataFrame, y) -> pd.DataFrame:
+        xgb_enc, self.te_dict, self.te_median = target_encode(X_fe["machine_type"], y)
+        hybrid, self.hybrid_freq, self.hybrid_te, self.hybrid_median = hybrid_encode(X_fe["machine_type"], y)
+        X_fe["machine_type_xgb"] = xgb_enc
+        X_fe["machine_type_lgb"] = hybrid
+        return X_fe
+
+    def fit_columns(self, X_fe: pd.DataFrame, num_features: list[str]) -> None:
+        self.num_features = list(num_features)
+        self.cat_columns = list(X_fe.columns)
+        self.cat_features_idx = [
+            i for i, col in enumerate(self.cat_columns)
+            if isinstance(X_fe[col].dtype, pd.CategoricalDtype)
+        ]
+        self.fill = X_fe[self.num_features].median().to_numpy(FEATURE_DTYPE)
+
+    def fit_scaler(self, X_train: np.ndarray) -> np.ndarray:
+        self.scaler = StandardScaler()
+        return self.scaler.fit_transform(X_train)
+
+    def input_columns(self) -> list[str]:
+        passthrough = [c for c in self.num_features if c not in COMPUTED_COLS]
+        return ["machine_type", "pincode", "created_at", *NUMERIC_COLS, *passthrough]
+
+    # ---------------- transform (serving) ----------------
+    def _compute(self, cols: dict, n: int) -> dict:
+        f = {}
+        none = [None] * n
+
+        mt = _per_unique(cols.get("machine_type", none), str, "Unknown")
+        f["machine_type"] = mt
+
+        # pincode → same strings / numbers as add_pincode_features
+        pins = _per_unique(cols.get("pincode", none), lambda v: str(v).strip(), "")
+        f["pincode"] = f["pincode_str"] = pins
+        codes, uniq = _factorize(pins)
+        for col, part in [("pincode_prefix", slice(0, 3)), ("pincode_suffix", slice(3, None)),
+                          ("pincode_int", slice(None))]:
+            f[col] = np.asarray([_to_float(p[part]) for p in uniq], dtype=FEATURE_DTYPE)[codes]
+        if self.geo_index is not None:
+            geo = self.geo_index.transform(uniq)
+            for col in geo.columns:
+                f[col] = geo[col].to_numpy(FEATURE_DTYPE)[codes]
+
+        # created_at → same calendar fields as add_date_features
+        created = cols.get("created_at", none)
+        f["created_at"] = _per_unique(created, str, "nan")
+        codes, uniq = _factorize(created)
+        cal = np.asarray([calendar_fields(v) for v in uniq] + [(0, 0, 0)], dtype=np.intp).reshape(-1, 3)[codes]
+        f["created_year"] = cal[:, 0].astype(FEATURE_DTYPE)
+        f["created_month"] = cal[:, 1].astype(FEATURE_DTYPE)
+        f["created_dayofyear"] = cal[:, 2].astype(FEATURE_DTYPE)
+        f["season"] = SEASON_BY_MONTH[cal[:, 1]]
+
+        # machine_type lookups
+        f["machine_type_freq"] = _per_unique(
+            mt, lambda m: self.freq_map.get(m, 1) if self.freq_map else 1, 1.0)
+        f["machine_type_xgb"] = _per_unique(
+            mt, lambda m: self.te_dict.get(m, self.te_median), self.te_median)
+        f["machine_type_lgb"] = _per_unique(
+            mt, lambda m: 0.5 * self.hybrid_freq.get(m, 0) + 0.5 * self.hybrid_te.get(m, self.hybrid_median),
+            self.hybrid_median)
+
+        # raw numerics: missing / unparsable → training median (as in build_features)
+        impute = getattr(self, "impute", {})          # absent in pre-impute pickles
+        for col in NUMERIC_COLS:
+            if col not in f:
+                values = _numeric(cols.get(col), n)
+                f[col] = np.where(np.isnan(values), FEATURE_DTYPE(impute.get(col, 0.0)), values)
+        for col in self.num_features:
+            if col not in f and col not in COMPUTED_COLS:
+                f[col] = _numeric(cols.get(col), n)
+
+        add_derived_features(f)
+        return f
+
+    def transform(self, cols: dict, n: int) -> FeatureBatch:
+        return self._assemble(self._compute(cols, n), n)
+
+    def transform_grid(self, row: dict, grid: dict, numeric_only: bool = False):
+        """
+        One raw row scored under many values of a few numeric inputs
+        (e.g. hours_used × age_years for /price_curve). The row is enriched
+        and looked up once; that template is broadcast to the grid, the
+        grid columns are overwritten and only derived features recomputed.
+        numeric_only=True returns just the numeric matrix (distilled student).
+        """
+        n = len(next(iter(grid.values())))
+        f = {k: np.broadcast_to(v, (n,)) for k, v in self._compute({k: [v] for k, v in row.items()}, 1).items()}
+        for col, values in grid.items():
+            f[col] = np.asarray(values, dtype=FEATURE_DTYPE)
+        add_derived_features(f)
+        return self._matrix(f, n) if numeric_only else self._assemble(f, n)
+
+    def _matrix(self, f: dict, n: int) -> np.ndarray:
+        """float32 (n, num_features), non-finite cells → training medians."""
+        num = np.zeros((n, len(self.num_features)), dtype=FEATURE_DTYPE)
+        for j, col in enumerate(self.num_features):
+            if col in f:
+                num[:, j] = f[col]
+        bad = ~np.isfinite(num)
+        if bad.any():
+            num = np.where(bad, self.fill, num).astype(FEATURE_DTYPE)
+        return num
+
+    def transform_numeric(self, cols: dict, n: int) -> np.ndarray:
+        """Only the numeric matrix (distilled student input; no CatBoost frame, no scaling)."""
+        return self._matrix(self._compute(cols, n), n)
+
+    def _assemble(self, f: dict, n: int) -> FeatureBatch:
+        num = self._matrix(f, n)
+
+        # columns are fresh per batch: views, no consolidation copy
+        position = {c: j for j, c in enumerate(self.num_features)}
+        cat = pd.DataFrame({
+            c: num[:, position[c]] if c in position else f.get(c, np.zeros(n, dtype=FEATURE_DTYPE))
+            for c in self.cat_columns
+        }, copy=False)
+
+        X = pd.DataFrame(num, columns=self.num_features, copy=False) if self.named_inputs else num
+        return FeatureBatch(X, self._scale(X), cat)
+
+    def _scale(self, X):
+        """
+        StandardScaler.transform without sklearn's per-call validation: the
+        same in-place float32 arithmetic (mean / scale cast to X's dtype).
+        """
+        s = self.scaler
+        if s is None:
+            return None
+        if self.named_inputs or type(s) is not StandardScaler:
+            return s.transform(X)
+        out = np.array(X, dtype=FEATURE_DTYPE)
+        if s.with_mean:
+            out -= s.mean_.astype(FEATURE_DTYPE)
+        if s.with_std:
+            out /= s.scale_.astype(FEATURE_DTYPE)
+        return out
+
+    def transform_records(self, rows: list[dict]) -> FeatureBatch:
+        cols = {k: [r.get(k) for r in rows] for k in self.input_columns()}
+        return self.transform(cols, len(rows))
+
+    # ---------------- parity check (train.py) ----------------
+    def check(self, X_raw: pd.DataFrame, X_fe: pd.DataFrame, n: int = 512, skip=()) -> list[str]:
+        """
+        Compare the array transform against build_features on a sample of
+        training rows; returns (and logs) the columns that disagree.
+        Encoded columns and `skip` are skipped: training uses out-of-fold values.
+        """
+        idx = np.random.default_rng(0).choice(len(X_raw), size=min(n, len(X_raw)), replace=False)
+        raw = X_raw.iloc[idx]
+        cols = {c: raw[c].astype(object).tolist() for c in self.input_columns() if c in raw.columns}
+        got = self.transform(cols, len(idx)).num
+        got = np.asarray(got)
+        want = X_fe.iloc[idx][self.num_features].to_numpy(FEATURE_DTYPE)
+
+        bad = [
+            col for j, col in enumerate(self.num_features)
+            if col not in ENCODED_COLS and col not in skip and not np.allclose(got[:, j], want[:, j], rtol=1e-5, atol=1e-4)
+        ]
+        if bad:
+            logger.warning(f"Serving transform differs from build_features on: {bad}")
+        return bad
+
+    # ---------------- persistence ----------------
+    def save(self, models_dir: str) -> None:
+        with open(os.path.join(models_dir, PIPELINE_FILE), "wb") as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def from_legacy(cls, models_dir: str, geo_index=None) -> "FeaturePipeline":
+        """Rebuild a pipeline from the per-artifact pickles of older bundles."""
+        def _load(name):
+            with open(os.path.join(models_dir, name), "rb") as f:
+                return pickle.load(f)
+
+        p = cls(geo_index)
+        p.num_features = _load("num_features.pkl")
+        p.scaler = _load("scaler.pkl")
+        cat_meta = _load("cat_meta.pkl")
+        p.cat_columns = cat_meta["columns"]
+        p.cat_features_idx = cat_meta["cat_features_idx"]
+        p.fill = np.zeros(len(p.num_features), dtype=FEATURE_DTYPE)
+        p.named_inputs = True
+        for name, attrs in [("xgb_te.pkl", ("te_dict", "te_median")),
+                            ("lgbm_hybrid.pkl", ("hybrid_te", "hybrid_median"))]:
+            if os.path.exists(os.path.join(models_dir, name)):
+                enc = _load(name)
+                setattr(p, attrs[0], enc["te_dict"])
+                setattr(p, attrs[1], enc["global_median"])
+                if name == "lgbm_hybrid.pkl":
+                    p.hybrid_freq = enc.get("freq_dict", {})
+        return p
+
+
+def load_pipeline(models_dir: str, geo_index=None) -> FeaturePipeline:
+    path = os.path.join(models_dir, PIPELINE_FILE)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    return FeaturePipeline.from_legacy(models_dir, geo_index)
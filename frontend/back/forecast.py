@@ -0,0 +1,163 @@
+# forecast.py
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from logging_config import get_logger
+from model_utils import parse_dates
+
+logger = get_logger("forecast")
+
+MODELS_DIR = "models"
+FORECAST_FILE = "forecast.npz"
+
+WEEKS = 52
+MAX_HORIZON = 52
+SHRINK = 20.0            # pseudo-observations pulling sparse cells toward their parent
+MIN_TREND_WEEKS = 8      # history span needed before a trend is fitted
+MAX_WEEKLY_GROWTH = 0.01
+
+
+def _codes(values: pd.Series):
+    s = values.astype("category")
+    # cat codes are int8 for < 128 categories; widen before keys like t * WEEKS + week
+    return s.cat.categories.astype(str), s.cat.codes.to_numpy().astype(np.intp)
+
+
+def _group_median(key: np.ndarray, y: np.ndarray, size: int):
+    """Dense median and count per integer key (NaN where a key has no rows)."""
+    med = np.full(size, np.nan)
+    g = pd.Series(y).groupby(key).median()
+    med[g.index.to_numpy()] = g.to_numpy()
+    return med, np.bincount(key, minlength=size)
+
+
+def _shrink(value, count, parent):
+    """Credibility blend: (n·value + SHRINK·parent) / (n + SHRINK), NaN-safe."""
+    value = np.where(np.isnan(value), parent, value)
+    return (count * value + SHRINK * parent) / (count + SHRINK)
+
+
+def _smooth(index: np.ndarray) -> np.ndarray:
+    """Circular [1, 2, 1] / 4 smoothing along the week axis."""
+    return 0.25 * np.roll(index, 1, axis=-1) + 0.5 * index + 0.25 * np.roll(index, -1, axis=-1)
+
+
+# ------------------------------------------------------------
+# BUILD (train.py) — multiplicative decomposition
+#   price(type, region, week) = level(type, region) · season(type, week)
+#   and a per-type weekly growth factor applied by horizon.
+# ------------------------------------------------------------
+def build_forecast(df: pd.DataFrame, models_dir: str = MODELS_DIR) -> dict:
+    dt = parse_dates(df["created_at"])
+    price = pd.to_numeric(df["rental_price"], errors="coerce").to_numpy(float)
+    ok = dt.notna().to_numpy() & np.isfinite(price) & (price > 0)
+    dt, price = dt[ok], price[ok]
+
+    types, t = _codes(df["machine_type"][ok].astype(str))
+    regions, r = _codes(df["pincode"][ok].astype(str).str.strip().str[:3])
+    T, R = len(types), len(regions)
+    week = np.minimum(dt.dt.isocalendar().week.to_numpy(int), WEEKS) - 1
+    log_p = np.log(price)
+
+    # levels: global → type → (type, region); extra slot R = type level
+    g_level = float(np.median(price)) if len(price) else 0.0
+    t_med, t_n = _group_median(t, price, T)
+    t_level = _shrink(t_med, t_n, g_level)
+    tr_med, tr_n = _group_median(t * R + r, price, T * R)
+    tr_level = _shrink(tr_med.reshape(T, R), tr_n.reshape(T, R), t_level[:, None])
+    level = np.concatenate([tr_level, t_level[:, None]], axis=1)
+
+    # seasonal index per (type, week), shrunk toward the all-type index
+    g_wk, g_wk_n = _group_median(week, price, WEEKS)
+    g_season = _smooth(_shrink(g_wk / (g_level or 1.0), g_wk_n, 1.0))
+    tw_med, tw_n = _group_median(t * WEEKS + week, price, T * WEEKS)
+    tw_ratio = tw_med.reshape(T, WEEKS) / np.where(t_level > 0, t_level, 1.0)[:, None]
+    season = _smooth(_shrink(tw_ratio, tw_n.reshape(T, WEEKS), g_season[None, :]))
+
+    # weekly growth per type: least-squares slope of deseasonalized log price
+    x = (dt - dt.min()).dt.days.to_numpy(float) / 7.0
+    z = log_p - np.log(season[t, week])
+    n = np.bincount(t, minlength=T).astype(float)
+    sx, sz = np.bincount(t, x, T), np.bincount(t, z, T)
+    sxx, sxz = np.bincount(t, x * x, T), np.bincount(t, x * z, T)
+    var = sxx - sx * sx / np.maximum(n, 1)
+    cov = sxz - sx * sz / np.maximum(n, 1)
+    by_type = pd.Series(x).groupby(t)
+    span = (by_type.max() - by_type.min()).reindex(range(T), fill_value=0.0).to_numpy()
+    fitted = (span >= MIN_TREND_WEEKS) & (var > 0)
+    slope = np.where(fitted, cov / np.where(var > 0, var, 1.0), 0.0)
+    growth = np.exp(np.clip(slope, -MAX_WEEKLY_GROWTH, MAX_WEEKLY_GROWTH))
+
+    # medians sit at the middle of the history; roll levels forward to its end
+    x_end = x.max() if len(x) else 0.0
+    level = level * (growth ** (x_end - sx / np.maximum(n, 1)))[:, None]
+
+    # extra type slot T = all machines (unknown machine_type)
+    level = np.concatenate([level, np.full((1, R + 1), g_level)], axis=0)
+    season = np.concatenate([season, g_season[None, :]], axis=0)
+    growth = np.append(growth, 1.0)
+
+    payload = {
+        "curves": (level[:, :, None] * season[:, None, :]).astype(np.float32),   # (T+1, R+1, 52)
+        "growth": growth.astype(np.float32),
+        "types": np.asarray(types, dtype=str),
+        "regions": np.asarray(regions, dtype=str),
+        "built_at": np.asarray(datetime.now().isoformat()),
+    }
+    path = os.path.join(models_dir, FORECAST_FILE)
+    np.savez(path, **payload)
+    logger.info(f"Forecast tensor {payload['curves'].shape} saved → {path}")
+    return payload
+
+
+# ------------------------------------------------------------
+# SERVE (/forecast) — index lookups + one wrapped slice
+# ------------------------------------------------------------
+class Forecaster:
+    def __init__(self, payload):
+        self.curves = payload["curves"]
+        self.growth = payload["growth"]
+        self.built_at = str(payload["built_at"])
+        self._type = {m: i for i, m in enumerate(payload["types"].tolist())}
+        self._region = {p: i for i, p in enumerate(payload["regions"].tolist())}
+
+    def forecast(self, machine_type: str, pincode: str, weeks: int = 12, start=None) -> dict:
+        weeks = max(1, min(int(weeks), MAX_HORIZON))
+        start = pd.Timestamp(start) if start else pd.Timestamp.now()
+        week0 = min(int(start.isocalendar()[1]), WEEKS) - 1
+
+        ti = self._type.get(str(machine_type).strip(), len(self._type))
+        ri = self._region.get(str(pincode or "").strip()[:3], len(self._region))
+
+        curve = self.curves[ti, ri].take(np.arange(week0, week0 + weeks), mode="wrap")
+        prices = curve * self.growth[ti] ** np.arange(1, weeks + 1, dtype=np.float32)
+        monday = start.date() - timedelta(days=start.weekday())
+
+        return {
+            "machine_type": machine_type,
+            "region_known": ri < len(self._region),
+            "type_known": ti < len(self._type),
+            "built_at": self.built_at,
+            "weeks": [
+                {"week_start": (monday + timedelta(weeks=i)).isoformat(), "expected_price": round(float(p), 2)}
+                for i, p in enumerate(prices.tolist())
+            ],
+        }
+
+
+_FORECASTERS: dict[str, tuple[float, Forecaster]] = {}      # path → (mtime, forecaster)
+
+
+def load_forecaster(models_dir: str = MODELS_DIR) -> Forecaster | None:
+    path = os.path.join(models_dir, FORECAST_FILE)
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    cached = _FORECASTERS.get(path)
+    if cached is None or cached[0] != mtime:
+        with np.load(path) as z:
+            cached = _FORECASTERS[path] = (mtime, Forecaster({k: z[k] for k in z.files}))
+    return cached[1]
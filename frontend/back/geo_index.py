@@ -0,0 +1,170 @@
+# geo_index.py
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold
+from sklearn.neighbors import BallTree
+
+from pincode import get_coords_bulk
+
+MODELS_DIR = "models"
+GEO_FILE = "geo_index.pkl"
+
+EARTH_RADIUS_KM = 6371.0
+GEO_RADIUS_KM = 25.0
+GEO_K = 10
+
+GEO_FEATURES = ["geo_supply", "geo_median_price", "geo_knn_km"]
+OUT_OF_FOLD = ["geo_supply", "geo_median_price"]     # counted / priced from the listings themselves
+
+
+class GeoIndex:
+    """
+    BallTree (haversine) over the pincodes seen in training listings.
+
+    For any pincode it answers, in one vectorized call over the unique
+    pincodes of a frame:
+
+      geo_supply        listings within GEO_RADIUS_KM
+      geo_median_price  median rental_price of those listings
+      geo_knn_km        mean distance to the GEO_K nearest listed pincodes
+    """
+
+    def __init__(self, pincodes, prices, radius_km=GEO_RADIUS_KM, k=GEO_K, coords_fn=get_coords_bulk):
+        self.radius_km = float(radius_km)
+        self.k = int(k)
+        self._coords_fn = coords_fn
+        self._coords_cache: dict[str, tuple[float, float]] = {}
+
+        frame = pd.DataFrame({
+            "pincode": pd.Series(pincodes, dtype=str).str.strip().to_numpy(),
+            "price": pd.to_numeric(pd.Series(prices), errors="coerce").to_numpy(float),
+        }).dropna(subset=["price"])
+
+        coords = self._coords(frame["pincode"].unique())
+        frame = frame[frame["pincode"].isin(coords.dropna().index)]
+
+        # listings grouped by pincode; prices sorted inside each group
+        frame = frame.sort_values(["pincode", "price"])
+        grouped = frame.groupby("pincode", sort=True)["price"]
+        self.pincodes = np.asarray(grouped.size().index, dtype=str)
+        self.counts = grouped.size().to_numpy(np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)])
+        self.prices = frame["price"].to_numpy(np.float64)
+
+        points = coords.loc[self.pincodes, ["lat", "lng"]].to_numpy(float)
+        self.tree = BallTree(np.radians(points), metric="haversine") if len(points) else None
+
+        self.fallback = {
+            "geo_supply": 0.0,
+            "geo_median_price": float(np.median(self.prices)) if len(self.prices) else 0.0,
+            "geo_knn_km": self.radius_km * 4,
+        }
+
+    # ---------------------------------------------------------
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_coords_fn"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._coords_fn = get_coords_bulk
+
+    def _coords(self, pincodes) -> pd.DataFrame:
+        missing = [p for p in pincodes if p not in self._coords_cache]
+        if missing:
+            found = self._coords_fn(missing)
+            for p, row in found.iterrows():
+                self._coords_cache[p] = (row["lat"], row["lng"])
+        return pd.DataFrame(
+            [self._coords_cache.get(p, (np.nan, np.nan)) for p in pincodes],
+            index=list(pincodes), columns=["lat", "lng"], dtype=float,
+        )
+
+    # ---------------------------------------------------------
+    def query_coords(self, lat, lng) -> pd.DataFrame:
+        """Geo features for arrays of coordinates (NaN → fallback values)."""
+        pts = np.column_stack([np.asarray(lat, float), np.asarray(lng, float)])
+        out = pd.DataFrame({c: np.full(len(pts), v) for c, v in self.fallback.items()})
+        ok = np.isfinite(pts).all(axis=1)
+        if self.tree is None or not ok.any():
+            return out
+
+        q = np.radians(pts[ok])
+        r = self.radius_km / EARTH_RADIUS_KM
+        neigh = self.tree.query_radius(q, r)
+
+        supply = np.fromiter((self.counts[idx].sum() for idx in neigh), float, len(neigh))
+        median = np.array([
+            np.median(np.concatenate([self.prices[self.offsets[i]:self.offsets[i + 1]] for i in idx]))
+            if len(idx) else self.fallback["geo_median_price"]
+            for idx in neigh
+        ])
+        dist, _ = self.tree.query(q, k=min(self.k, len(self.pincodes)))
+
+        out.loc[ok, "geo_supply"] = supply
+        out.loc[ok, "geo_median_price"] = median
+        out.loc[ok, "geo_knn_km"] = dist.mean(axis=1) * EARTH_RADIUS_KM
+        return out
+
+    def transform(self, pincodes) -> pd.DataFrame:
+        """Geo features aligned to `pincodes`; each unique pincode is queried once."""
+        pins = pd.Series(pincodes, dtype=str).str.strip()
+        uniq = pins.unique()
+        coords = self._coords(uniq)
+        feats = self.query_coords(coords["lat"], coords["lng"])
+        feats.index = uniq
+        return feats.loc[pins.to_numpy()].reset_index(drop=True)
+
+
+def out_of_fold(index: GeoIndex, pincodes, prices, n_splits: int = 5) -> pd.DataFrame:
+    """
+    OUT_OF_FOLD features for the listings `index` was built from, each
+    fold answered by an index over the other folds (same KFold as
+    encoding_utils.target_encode), so no row's geo_median_price includes
+    its own rental_price. geo_supply is scaled back to the full index.
+    """
+    pins = pd.Series(pincodes, dtype=str).str.strip().reset_index(drop=True)
+    prices = np.asarray(prices, dtype=float)
+    out = index.transform(pins)[OUT_OF_FOLD]
+    n_splits = min(n_splits, len(pins))
+    if n_splits <= 1:
+        return out
+
+    kf = KFold(n_splits=n_splits, shuffle=True, random_state=42)
+    for tr_idx, val_idx in kf.split(pins):
+        fold = GeoIndex(pins.iloc[tr_idx], prices[tr_idx], index.radius_km, index.k,
+                        coords_fn=index._coords)          # coordinates already cached
+        feats = fold.transform(pins.iloc[val_idx])
+        out.loc[val_idx, "geo_supply"] = feats["geo_supply"].to_numpy() * len(pins) / len(tr_idx)
+        out.loc[val_idx, "geo_median_price"] = feats["geo_median_price"].to_numpy()
+    return out
+
+
+# ------------------------------------------------------------
+# PERSISTENCE (built in train.py per bundle, loaded once per bundle)
+# ------------------------------------------------------------
+def build_geo_index(df: pd.DataFrame, models_dir: str = MODELS_DIR) -> GeoIndex:
+    """Index over `df`'s listings; pass the training split only."""
+    index = GeoIndex(df["pincode"], df["rental_price"])
+    with open(os.path.join(models_dir, GEO_FILE), "wb") as f:
+        pickle.dump(index, f)
+    return index
+
+
+_GEO_INDEX: dict[str, tuple[float, GeoIndex]] = {}      # path → (mtime, index)
+
+
+def load_geo_index(models_dir: str = MODELS_DIR) -> GeoIndex | None:
+    path = os.path.join(models_dir, GEO_FILE)
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    cached = _GEO_INDEX.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            cached = _GEO_INDEX[path] = (mtime, pickle.load(f))
+    return cached[1]
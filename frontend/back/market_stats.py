@@ -0,0 +1,237 @@
+# market_stats.py
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from logging_config import get_logger
+
+logger = get_logger("market_stats")
+
+BOOKING_WINDOW_S = 7 * 24 * 3600
+ACTIVE_RENTAL_STATES = {"pending", "active", "completed"}
+# lookup fields that share the training columns' definition (counts per
+# pincode and type) and may override them in the model input;
+# market_trend_score is on the Node rule's 1 ± 0.2 scale, response only
+MODEL_FIELDS = ["stock_on_hand", "bookings_7d"]
+
+
+def _key(pincode, machine_type) -> tuple[str, str]:
+    return (str(pincode or "").strip(), str(machine_type or "").strip())
+
+
+def _ts(value) -> float:
+    if value is None:
+        return time.time()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value) / 1000.0 if value > 1e11 else float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return time.time()
+
+
+# ------------------------------------------------------------
+# PER-(PINCODE, TYPE) AGGREGATE
+# ------------------------------------------------------------
+class _Agg:
+    __slots__ = ("machines", "rent_sum", "last_sum", "bookings", "booking_count")
+
+    def __init__(self):
+        self.machines = 0
+        self.rent_sum = 0.0
+        self.last_sum = 0.0
+        self.bookings = deque()        # (created_ts, rental_id), oldest first
+        self.booking_count = 0
+
+
+class MarketStats:
+    """
+    Incrementally maintained market aggregates per (pincode, machine_type).
+
+    Fed by machine and rental change events (Mongo change streams or
+    POST /market_events); every update and lookup is O(1) amortized, so
+    price prediction no longer scans the machines collection.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._aggs: dict[tuple[str, str], _Agg] = {}
+        self._machines: dict[str, tuple[tuple[str, str], float, float]] = {}
+        self._rentals: dict[str, tuple[tuple[str, str], float]] = {}
+
+    # ---------------- machines ----------------
+    def upsert_machine(self, doc: dict) -> None:
+        machine_id = str(doc.get("_id"))
+        key = _key(doc.get("pincode"), doc.get("type") or doc.get("machine_type"))
+        rent = float(doc.get("rentPerHour") or 0.0)
+        meta = doc.get("meta") or {}
+        last = doc.get("last_year_price", meta.get("last_year_price"))
+        last = float(last) if last not in (None, "") else rent
+
+        with self._lock:
+            self._drop_machine(machine_id)
+            agg = self._aggs.setdefault(key, _Agg())
+            agg.machines += 1
+            agg.rent_sum += rent
+            agg.last_sum += last
+            self._machines[machine_id] = (key, rent, last)
+
+    def delete_machine(self, machine_id) -> None:
+        with self._lock:
+            self._drop_machine(str(machine_id))
+
+    def _drop_machine(self, machine_id: str) -> None:
+        old = self._machines.pop(machine_id, None)
+        if old is None:
+            return
+        key, rent, last = old
+        agg = self._aggs[key]
+        agg.machines -= 1
+        agg.rent_sum -= rent
+        agg.last_sum -= last
+
+    # ---------------- rentals ----------------
+    def upsert_rental(self, doc: dict) -> None:
+        rental_id = str(doc.get("_id"))
+        status = doc.get("status", "pending")
+
+        with self._lock:
+            if status not in ACTIVE_RENTAL_STATES:
+                self._drop_rental(rental_id)
+                return
+            if rental_id in self._rentals:
+                return
+            machine = self._machines.get(str(doc.get("machineId")))
+            if machine is None:
+                return
+            key = machine[0]
+            created = _ts(doc.get("createdAt"))
+            if created < time.time() - BOOKING_WINDOW_S:
+                return
+            agg = self._aggs[key]
+            agg.bookings.append((created, rental_id))
+            agg.booking_count += 1
+            self._rentals[rental_id] = (key, created)
+
+    def delete_rental(self, rental_id) -> None:
+        with self._lock:
+            self._drop_rental(str(rental_id))
+
+    def _drop_rental(self, rental_id: str) -> None:
+        old = self._rentals.pop(rental_id, None)
+        if old is not None:
+            self._aggs[old[0]].booking_count -= 1
+
+    def _expire(self, agg: _Agg, now: float) -> None:
+        cutoff = now - BOOKING_WINDOW_S
+        while agg.bookings and agg.bookings[0][0] < cutoff:
+            _, rental_id = agg.bookings.popleft()
+            if self._rentals.pop(rental_id, None) is not None:
+                agg.booking_count -= 1
+
+    # ---------------- change events ----------------
+    def apply_event(self, collection: str, event: dict) -> None:
+        """Apply one Mongo change-stream style event to the aggregates."""
+        op = event.get("operationType", "update")
+        doc_id = (event.get("documentKey") or {}).get("_id")
+        doc = event.get("fullDocument")
+
+        if collection == "machines":
+            if op == "delete":
+                self.delete_machine(doc_id)
+            elif doc:
+                self.upsert_machine(doc)
+        elif collection == "rentals":
+            if op == "delete":
+                self.delete_rental(doc_id)
+            elif doc:
+                self.upsert_rental(doc)
+
+    # ---------------- lookups ----------------
+    def lookup(self, pincode, machine_type) -> dict:
+        """
+        Market fields for predict_price, or {} when the market is empty:
+
+          stock_on_hand       listed machines of this type in the pincode
+          bookings_7d         rentals created in the last 7 days
+          market_trend_score  1 ± 0.2, same rule the Node backend used
+                              (reported to clients, not a model input:
+                              see MODEL_FIELDS)
+        """
+        with self._lock:
+            agg = self._aggs.get(_key(pincode, machine_type))
+            if agg is None or agg.machines <= 0:
+                return {}
+            self._expire(agg, time.time())
+            avg_current = agg.rent_sum / agg.machines
+            avg_last = agg.last_sum / agg.machines
+            bookings = agg.booking_count
+            stock = agg.machines
+
+        growth = (avg_current - avg_last) / (avg_last or 1)
+        trend = 1 + max(-0.20, min(0.20, growth * 0.25))
+        return {
+            "stock_on_hand": float(stock),
+            "bookings_7d": float(bookings),
+            "market_trend_score": float(trend),
+        }
+
+
+market_stats = MarketStats()
+
+
+# ------------------------------------------------------------
+# MONGO CHANGE STREAM FEED (optional, needs pymongo + replica set)
+# ------------------------------------------------------------
+def _seed_and_watch(uri: str, consumers: list) -> None:
+    from pymongo import MongoClient
+
+    db = MongoClient(uri).get_default_database()
+    with db.watch(
+        [{"$match": {"ns.coll": {"$in": ["machines", "rentals"]}}}],
+        full_document="updateLookup",
+    ) as stream:
+        # seed after opening the stream so nothing is missed in between
+        for coll in ["machines", "rentals"]:
+            for doc in db[coll].find({}):
+                for c in consumers:
+                    c.apply_event(coll, {"operationType": "insert", "fullDocument": doc})
+        for c in consumers:
+            if hasattr(c, "mark_seeded"):
+                c.mark_seeded()
+        logger.info("Market stats seeded; following change stream")
+
+        for event in stream:
+            for c in consumers:
+                c.apply_event(event["ns"]["coll"], event)
+
+
+def start_mongo_feed(uri: str | None = None, consumers: list | None = None):
+    """
+    Feed machine/rental change events into every consumer exposing
+    apply_event(collection, event) (MarketStats, AnalyticsEngine, ...).
+    """
+    uri = uri or os.getenv("MONGO_URL")
+    consumers = consumers or [market_stats]
+    if not uri:
+        logger.info("MONGO_URL not set; market stats fed by /market_events only")
+        return None
+
+    def run():
+        while True:
+            try:
+                _seed_and_watch(uri, consumers)
+            except ImportError:
+                logger.warning("pymongo not installed; Mongo market feed disabled")
+                return
+            except Exception as e:
+                logger.warning(f"Market feed error, retrying in 30s: {e}")
+                time.sleep(30)
+
+    t = threading.Thread(target=run, name="market-stats-feed", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,116 @@
+# ml_client.py
+# Pure-Python client for the msgpack batch interface (binary_transport.py).
+# Keeps one HTTP/1.1 connection open across calls.
+#
+#   from ml_client import MLClient
+#   client = MLClient("127.0.0.1", 5001)
+#   client.predict_batch([{"machine_type": "Tractor", "pincode": "641001", ...}])
+#   for reply in client.predict_stream(batches): ...
+#
+#   python ml_client.py --host 127.0.0.1 --port 5001 --rows 1000
+import argparse
+import http.client
+import time
+
+import msgpack
+
+MSGPACK = "application/msgpack"
+
+
+class MLClient:
+    def __init__(self, host: str = "127.0.0.1", port: int = 5001, timeout: float = 30.0):
+        self.host, self.port, self.timeout = host, port, timeout
+        self._conn = None
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def _post(self, path: str, make_body, headers: dict) -> http.client.HTTPResponse:
+        # make_body() is called per attempt so a generator body can be replayed
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("POST", path, body=make_body(), headers=headers)
+                return conn.getresponse()
+            except (ConnectionError, http.client.HTTPException):
+                # server closed the idle keep-alive connection; reconnect once
+                self.close()
+                if attempt:
+                    raise
+
+    def predict_batch(self, rows: list[dict], batch_id=None) -> list[float]:
+        body = msgpack.packb({"id": batch_id, "rows": rows})
+        res = self._post("/predict/batch", lambda: body, {"Content-Type": MSGPACK})
+        data = res.read()
+        if res.status != 200:
+            raise RuntimeError(f"ML service returned {res.status}: {data[:200]!r}")
+        return msgpack.unpackb(data)["prices"]
+
+    def predict_stream(self, batches):
+        """
+        Upload batches as one chunked msgpack stream and yield one reply
+        ({"id", "n", "prices", "ms"}) per batch as the service scores them.
+        """
+        batches = list(batches)
+        # no Content-Length: http.client sends the generator chunk-encoded
+        res = self._post(
+            "/predict/stream",
+            lambda: (msgpack.packb({"id": i, "rows": rows}) for i, rows in enumerate(batches)),
+            {"Content-Type": MSGPACK},
+        )
+        if res.status != 200:
+            raise RuntimeError(f"ML service returned {res.status}: {res.read()[:200]!r}")
+        unpacker = msgpack.Unpacker()
+        while True:
+            chunk = res.read1(65536)
+            if not chunk:
+                break
+            unpacker.feed(chunk)
+            yield from unpacker
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def sample_rows(n: int) -> list[dict]:
+    types = ["Tractor", "Harvester", "Rotavator", "Seeder"]
+    return [
+        {
+            "machine_type": types[i % len(types)],
+            "horsepower": 35.0 + i % 40,
+            "age_years": float(i % 12),
+            "hours_used": float(100 + i % 900),
+            "pincode": str(641001 + i % 50),
+            "maintenance_cost": 1000.0,
+            "fuel_price": 95.0,
+            "temp": 30.0, "humidity": 60.0, "pressure": 1005.0, "wind_speed": 3.0, "rain": 0.0,
+        }
+        for i in range(n)
+    ]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Smoke-test the msgpack batch endpoints")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5001)
+    ap.add_argument("--rows", type=int, default=1000)
+    ap.add_argument("--batch", type=int, default=250)
+    args = ap.parse_args()
+
+    client = MLClient(args.host, args.port)
+    rows = sample_rows(args.rows)
+
+    t0 = time.perf_counter()
+    prices = client.predict_batch(rows)
+    print(f"/predict/batch: {len(prices)} prices in {(time.perf_counter() - t0) * 1000:.1f} ms "
+          f"(first {prices[:3]})")
+
+    t0 = time.perf_counter()
+    chunks = [rows[i:i + args.batch] for i in range(0, len(rows), args.batch)]
+    n = sum(reply["n"] for reply in client.predict_stream(chunks))
+    print(f"/predict/stream: {n} prices in {len(chunks)} batches, {(time.perf_counter() - t0) * 1000:.1f} ms")
+    client.close()
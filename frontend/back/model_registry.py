@@ -0,0 +1,306 @@
+# model_registry.py
+import json
+import os
+import pickle
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from distill import load_student
+from feature_pipeline import FeatureBatch, load_pipeline
+from geo_index import load_geo_index
+from logging_config import get_logger
+
+logger = get_logger("model_registry")
+
+MODELS_DIR = "models"
+SERVING_FILE = os.path.join(MODELS_DIR, "serving.json")
+SHADOW_DIR = os.path.join("logs", "shadow")
+SHADOW_FLUSH_EVERY = 1000
+SHADOW_MAX_PENDING = 64        # shadow batches queued beyond this are dropped
+
+SHADOW_COLUMNS = ["ts", "rows", "primary_price", "candidate_price",
+                  "delta", "primary_ms", "candidate_ms"]
+
+
+def _stamp(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+# ------------------------------------------------------------
+# ONE ENSEMBLE BUNDLE (feature pipeline + xgb + lgbm + cat)
+# ------------------------------------------------------------
+class ModelBundle:
+    FILES = ["xgb.pkl", "lgbm.pkl", "cat.pkl"]
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stamp = _stamp(os.path.join(path, "cat_meta.pkl"))
+        art = {}
+        for name in self.FILES:
+            with open(os.path.join(path, name), "rb") as f:
+                art[name] = pickle.load(f)
+        self.xgb = art["xgb.pkl"]
+        self.lgbm = art["lgbm.pkl"]
+        self.cat = art["cat.pkl"]
+        self.pipeline = load_pipeline(path, load_geo_index(path))
+        # distilled fast path (distill.py); bundles trained before it have none
+        self.student = load_student(path)
+
+    def score(self, batch: FeatureBatch) -> np.ndarray:
+        p_xgb = self.xgb.predict(batch.scaled)
+        p_lgb = self.lgbm.predict(batch.num)
+        p_cat = self.cat.predict(batch.cat)
+        return (p_xgb + p_lgb + p_cat) / 3.0
+
+    def score_records(self, rows: list[dict]) -> np.ndarray:
+        return self.score(self.pipeline.transform_records(rows))
+
+    def score_columns(self, cols: dict, n: int) -> np.ndarray:
+        return self.score(self.pipeline.transform(cols, n))
+
+    def uses_student(self, fast: bool) -> bool:
+        return fast and self.student is not None
+
+    def score_batch(self, records, fast: bool = False) -> np.ndarray:
+        """
+        records.PredictionRecords: the structured buffer's columns, no per-row
+        dicts. fast=True scores with the distilled student when the bundle
+        has one (numeric matrix only), else falls back to the ensemble.
+        """
+        if self.uses_student(fast):
+            return self.student.predict(self.pipeline.transform_numeric(records.columns(), len(records)))
+        return self.score(self.pipeline.transform(records.columns(), len(records)))
+
+    def score_grid(self, row: dict, grid: dict, fast: bool = False) -> np.ndarray:
+        if self.uses_student(fast):
+            return self.student.predict(self.pipeline.transform_grid(row, grid, numeric_only=True))
+        return self.score(self.pipeline.transform_grid(row, grid))
+
+    def describe(self) -> dict:
+        return {"path": self.path, "student": self.student.metrics if self.student is not None else None}
+
+
+# ------------------------------------------------------------
+# SHADOW LOG (columnar, one .npz per flush)
+# ------------------------------------------------------------
+class ShadowLog:
+    def __init__(self, directory: str = SHADOW_DIR, flush_every: int = SHADOW_FLUSH_EVERY):
+        self.directory = directory
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._cols = {c: [] for c in SHADOW_COLUMNS}
+
+    def append(self, **record) -> None:
+        with self._lock:
+            for c in SHADOW_COLUMNS:
+                self._cols[c].append(record[c])
+            if len(self._cols["ts"]) >= self.flush_every:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._cols["ts"]:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"shadow_{os.getpid()}_{time.time_ns()}.npz")
+        np.savez(
+            path,
+            ts=np.asarray(self._cols["ts"], dtype=np.float64),
+            **{c: np.asarray(self._cols[c], dtype=np.float32) for c in SHADOW_COLUMNS if c != "ts"},
+        )
+        self._cols = {c: [] for c in SHADOW_COLUMNS}
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def summary(self) -> dict:
+        """Aggregate every flushed file plus the in-memory tail."""
+        self.flush()
+        parts = []
+        if os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                if name.endswith(".npz"):
+                    with np.load(os.path.join(self.directory, name)) as z:
+                        parts.append({c: z[c] for c in SHADOW_COLUMNS})
+        if not parts:
+            return {"records": 0}
+        cols = {c: np.concatenate([p[c] for p in parts]) for c in SHADOW_COLUMNS}
+        rel = np.abs(cols["delta"]) / np.maximum(np.abs(cols["primary_price"]), 1e-6)
+        return {
+            "records": int(len(cols["ts"])),
+            "mean_abs_delta": float(np.mean(np.abs(cols["delta"]))),
+            "p95_abs_delta": float(np.percentile(np.abs(cols["delta"]), 95)),
+            "mean_rel_delta": float(np.mean(rel)),
+            "primary_p50_ms": float(np.percentile(cols["primary_ms"], 50)),
+            "primary_p95_ms": float(np.percentile(cols["primary_ms"], 95)),
+            "candidate_p50_ms": float(np.percentile(cols["candidate_ms"], 50)),
+            "candidate_p95_ms": float(np.percentile(cols["candidate_ms"], 95)),
+        }
+
+
+def new_candidate_dir() -> str:
+    """Fresh directory for a retrained bundle; never one that is serving."""
+    return os.path.join(MODELS_DIR, time.strftime("candidate_%Y%m%d%H%M%S"))
+
+
+# ------------------------------------------------------------
+# REGISTRY (primary + optional candidate, hot-swapped via serving.json)
+# ------------------------------------------------------------
+class ModelRegistry:
+    """
+    Holds the primary bundle and an optional candidate side by side.
+
+    The serving config lives in models/serving.json so that promote /
+    rollback done through any worker (or by hand) is picked up by every
+    worker on its next request, without a restart:
+
+      {"primary": "models", "candidate": "models/candidate_20250101120000",
+       "shadow_fraction": 0.1, "previous": null}
+    """
+
+    def __init__(self, serving_file: str = SERVING_FILE):
+        self.serving_file = serving_file
+        self._lock = threading.Lock()
+        self._seen = None
+        # (config, bundles), swapped as one reference so readers never pair
+        # a new config with the old bundles
+        self._serving: tuple[dict, dict[str, ModelBundle]] = (
+            {"primary": MODELS_DIR, "candidate": None, "shadow_fraction": 0.0, "previous": None}, {})
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._shadow_lock = threading.Lock()
+        self._shadow_pending = 0
+        self.shadow_dropped = 0
+        self.shadow_log = ShadowLog()
+
+    # ---------------- config ----------------
+    def _read_config(self, defaults: dict) -> dict:
+        with open(self.serving_file) as f:
+            return {**defaults, **json.load(f)}
+
+    def _write_config(self, config: dict) -> None:
+        tmp = self.serving_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(config, f, indent=2)
+        os.replace(tmp, self.serving_file)
+
+    def _fingerprint(self, config: dict) -> tuple:
+        # serving.json plus the last file train.py writes in each live bundle,
+        # so an in-place retrain of the primary is also picked up
+        paths = [p for p in (config["primary"], config["candidate"]) if p]
+        return (_stamp(self.serving_file),
+                *(_stamp(os.path.join(p, "cat_meta.pkl")) for p in paths))
+
+    def _refresh(self) -> tuple[dict, dict]:
+        """The current (config, bundles) snapshot, reloaded if anything changed."""
+        serving = self._serving
+        fingerprint = self._fingerprint(serving[0])
+        if fingerprint == self._seen and serving[1]:
+            return serving
+        with self._lock:
+            current, loaded = self._serving
+            has_file = _stamp(self.serving_file) is not None
+            config = self._read_config(current) if has_file else dict(current)
+            wanted = {p for p in (config["primary"], config["candidate"]) if p}
+            bundles = {}
+            for p in wanted:
+                stamp = _stamp(os.path.join(p, "cat_meta.pkl"))
+                cached = loaded.get(p)
+                bundles[p] = cached if cached is not None and cached.stamp == stamp else ModelBundle(p)
+            self._serving = serving = (config, bundles)
+            self._seen = self._fingerprint(config)
+            logger.info(f"Serving primary={config['primary']} candidate={config['candidate']}")
+        return serving
+
+    def config(self) -> dict:
+        config, _ = self._refresh()
+        return dict(config)
+
+    def primary(self) -> ModelBundle:
+        config, bundles = self._refresh()
+        return bundles[config["primary"]]
+
+    def bundles(self) -> dict:
+        """Loaded bundles (primary + candidate) with their student metrics."""
+        _, bundles = self._refresh()
+        return {p: b.describe() for p, b in bundles.items()}
+
+    # ---------------- shadow scoring ----------------
+    def shadow(self, build_records, primary_prices, primary_ms: float) -> None:
+        """
+        Score a sample of requests with the candidate, off the request path.
+        `build_records(models_dir)` enriches the batch from that bundle's
+        demand / seasonal stats, so the candidate sees its own artifacts.
+        """
+        config, bundles = self._serving
+        if not config["candidate"] or random.random() >= config["shadow_fraction"]:
+            return
+        candidate = bundles.get(config["candidate"])
+        if candidate is None:
+            return
+        with self._shadow_lock:
+            # the shadow thread fell behind: drop rather than queue without bound
+            if self._shadow_pending >= SHADOW_MAX_PENDING:
+                self.shadow_dropped += 1
+                return
+            self._shadow_pending += 1
+        self._shadow_pool.submit(self._score_shadow, candidate, build_records, primary_prices, primary_ms)
+
+    def _score_shadow(self, candidate, build_records, primary_prices, primary_ms):
+        try:
+            records = build_records(candidate.path)
+            t0 = time.perf_counter()
+            cand = candidate.score_batch(records)
+            cand_ms = (time.perf_counter() - t0) * 1000
+            n = len(primary_prices)
+            self.shadow_log.append(
+                ts=time.time(),
+                rows=n,
+                primary_price=float(np.mean(primary_prices)),
+                candidate_price=float(np.mean(cand)),
+                delta=float(np.mean(cand - primary_prices)),
+                primary_ms=primary_ms / n,
+                candidate_ms=cand_ms / n,
+            )
+        except Exception as e:
+            logger.warning(f"Shadow scoring failed: {e}")
+        finally:
+            with self._shadow_lock:
+                self._shadow_pending -= 1
+
+    # ---------------- lifecycle ----------------
+    def set_candidate(self, path: str, shadow_fraction: float = 0.1) -> dict:
+        ModelBundle(path)  # fail before publishing a broken bundle
+        config = {**self.config(), "candidate": path, "shadow_fraction": float(shadow_fraction)}
+        self._write_config(config)
+        return config
+
+    def promote(self) -> dict:
+        config = self.config()
+        if not config["candidate"]:
+            raise ValueError("No candidate bundle to promote")
+        self.shadow_log.flush()
+        config = {**config, "previous": config["primary"], "primary": config["candidate"], "candidate": None}
+        self._write_config(config)
+        return config
+
+    def rollback(self) -> dict:
+        """Drop the candidate; if there is none, return to the previous primary."""
+        config = self.config()
+        if config["candidate"]:
+            config = {**config, "candidate": None}
+        elif config["previous"]:
+            config = {**config, "primary": config["previous"], "previous": None}
+        else:
+            raise ValueError("Nothing to roll back")
+        self._write_config(config)
+        return config
+
+
+registry = ModelRegistry()
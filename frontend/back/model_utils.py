@@ -1,19 +1,94 @@
+from datetime import datetime
+
 import pandas as pd
 import numpy as np
 
+# ------------------------------------------------------------
+# DTYPE POLICY
+#   strings  → pandas categoricals (int codes + one copy of each value)
+#   numerics → float32, the precision the boosters train in anyway
+# ------------------------------------------------------------
+FEATURE_DTYPE = np.float32
+
+
+def as_category(s: pd.Series, fill: str = "Unknown") -> pd.Series:
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype("category")
+    if s.isna().any():
+        if fill not in s.cat.categories:
+            s = s.cat.add_categories([fill])
+        s = s.fillna(fill)
+    return s
+
+
+def per_category(s: pd.Series, values, fill=0.0) -> np.ndarray:
+    """
+    Gather one value per distinct category back to rows. `values` is
+    aligned with s.cat.categories; missing codes (-1) get `fill`.
+    """
+    values = np.append(np.asarray(values, dtype=FEATURE_DTYPE), FEATURE_DTYPE(fill))
+    return values[s.cat.codes.to_numpy()]
+
+
+def map_category(s: pd.Series, mapping: dict, default) -> np.ndarray:
+    """Row-wise mapping.get(value, default), evaluated once per distinct value."""
+    s = as_category(s)
+    return per_category(s, [mapping.get(c, default) for c in s.cat.categories], default)
+
+
+def apply_dtype_policy(df: pd.DataFrame) -> pd.DataFrame:
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype) or dtype == FEATURE_DTYPE:
+            continue
+        if pd.api.types.is_numeric_dtype(dtype):
+            df[col] = df[col].astype(FEATURE_DTYPE)
+        else:
+            df[col] = as_category(df[col])
+    return df
+
+
 # ------------------------------------------------------------
 # PINCODE FEATURES
 # ------------------------------------------------------------
-def add_pincode_features(df: pd.DataFrame):
-    df = df.copy()
+def add_pincode_features(df: pd.DataFrame, copy: bool = True):
+    if copy:
+        df = df.copy()
+
+    pin = df["pincode"] if "pincode" in df.columns else pd.Series("", index=df.index)
+    pin = pin.astype("category")
+    df["pincode"] = pin                                  # numeric copy lives in pincode_int
 
-    df["pincode_str"] = df.get("pincode", "").astype(str).str.strip()
-    df["pincode_prefix"] = df["pincode_str"].str[:3]
-    df["pincode_suffix"] = df["pincode_str"].str[3:]
+    # string work happens once per distinct pincode, not once per row
+    labels = pin.cat.categories.astype(str).str.strip().tolist() + [""]
+    uniq, inverse = np.unique(np.asarray(labels, dtype=object), return_inverse=True)
+    codes = inverse[pin.cat.codes.to_numpy()]          # code -1 (NaN) → ""
+    df["pincode_str"] = pd.Categorical.from_codes(codes, pd.Index(uniq, dtype=str))
 
-    df["pincode_prefix"] = pd.to_numeric(df["pincode_prefix"], errors="coerce").fillna(0)
-    df["pincode_suffix"] = pd.to_numeric(df["pincode_suffix"], errors="coerce").fillna(0)
-    df["pincode_int"] = pd.to_numeric(df["pincode_str"], errors="coerce").fillna(0)
+    pins = pd.Series(uniq, dtype=str)
+    for col, part in [("pincode_prefix", pins.str[:3]),
+                      ("pincode_suffix", pins.str[3:]),
+                      ("pincode_int", pins)]:
+        values = pd.to_numeric(part, errors="coerce").fillna(0).to_numpy(FEATURE_DTYPE)
+        df[col] = values[codes]
+
+    return df
+
+
+# ------------------------------------------------------------
+# GEO FEATURES (nearby supply / price from geo_index.GeoIndex)
+# ------------------------------------------------------------
+def add_geo_features(df: pd.DataFrame, geo_index, copy: bool = True):
+    if copy:
+        df = df.copy()
+
+    if geo_index is None:
+        return df
+
+    pins = as_category(df["pincode_str"], fill="")
+    geo = geo_index.transform(pins.cat.categories)
+    for col in geo.columns:
+        df[col] = per_category(pins, geo[col].to_numpy())
 
     return df
 
@@ -29,15 +104,60 @@ def get_season(month: int) -> int:
     return 0
 
 
-def add_date_features(df: pd.DataFrame):
-    df = df.copy()
+SEASON_BY_MONTH = np.array([get_season(m) for m in range(13)], dtype=FEATURE_DTYPE)
+
+
+def parse_date(v) -> datetime | None:
+    """
+    One date value as a naive local datetime; None if unparsable. Every
+    created_at parse goes through here: a whole-column pd.to_datetime
+    infers one format from the first value and turns differently
+    formatted ISO strings into NaT.
+    """
+    try:
+        d = datetime.fromisoformat(str(v))
+    except ValueError:
+        d = pd.to_datetime(v, errors="coerce")
+        if d is pd.NaT:
+            return None
+        d = d.to_pydatetime()
+    return d.replace(tzinfo=None)
+
+
+def parse_dates(values) -> pd.Series:
+    """parse_date over a column (each distinct value once); NaT if unparsable."""
+    codes, uniques = pd.factorize(pd.Series(values, copy=False))
+    table = pd.Series([parse_date(v) for v in uniques] + [None], dtype="datetime64[us]")
+    return pd.Series(table.to_numpy()[codes])
+
+
+def calendar_fields(v) -> tuple:
+    """
+    (year, month, dayofyear) of one date value; zeros if unparsable.
+    Training (add_date_features) and serving (feature_pipeline) both use it.
+    """
+    d = parse_date(v)
+    if d is None:
+        return (0, 0, 0)
+    return (d.year, d.month, d.timetuple().tm_yday)
+
 
-    dt = pd.to_datetime(df.get("created_at", None), errors="coerce")
+def add_date_features(df: pd.DataFrame, copy: bool = True):
+    if copy:
+        df = df.copy()
 
-    df["created_year"]       = dt.dt.year.fillna(0).astype(int)
-    df["created_month"]      = dt.dt.month.fillna(0).astype(int)
-    df["created_dayofyear"]  = dt.dt.dayofyear.fillna(0).astype(int)
-    df["season"]             = df["created_month"].apply(get_season)
+    created = df["created_at"] if "created_at" in df.columns else pd.Series(np.nan, index=df.index)
+    created = created.astype("category")
+    df["created_at"] = created
+
+    # parse each distinct date string once
+    cal = np.asarray([calendar_fields(v) for v in created.cat.categories], dtype=np.intp).reshape(-1, 3)
+    month = cal[:, 1]
+
+    df["created_year"]       = per_category(created, cal[:, 0])
+    df["created_month"]      = per_category(created, month)
+    df["created_dayofyear"]  = per_category(created, cal[:, 2])
+    df["season"]             = per_category(created, SEASON_BY_MONTH[month])
 
     return df
 
@@ -45,13 +165,14 @@ def add_date_features(df: pd.DataFrame):
 # ------------------------------------------------------------
 # FREQUENCY ENCODING
 # ------------------------------------------------------------
-def apply_frequency_features(df: pd.DataFrame, freq_map: dict | None):
-    df = df.copy()
+def apply_frequency_features(df: pd.DataFrame, freq_map: dict | None, copy: bool = True):
+    if copy:
+        df = df.copy()
 
     if freq_map:
-        df["machine_type_freq"] = df["machine_type"].map(freq_map).fillna(1)
+        df["machine_type_freq"] = map_category(df["machine_type"], freq_map, 1)
     else:
-        df["machine_type_freq"] = 1.0
+        df["machine_type_freq"] = FEATURE_DTYPE(1.0)
 
     return df
 
@@ -59,56 +180,87 @@ def apply_frequency_features(df: pd.DataFrame, freq_map: dict | None):
 # ------------------------------------------------------------
 # NUMERIC CLEANING
 # ------------------------------------------------------------
-def sanitize_numeric(df: pd.DataFrame):
-    df = df.copy()
+def sanitize_numeric(df: pd.DataFrame, copy: bool = True, fill: dict | None = None):
+    """NaN / Inf → the column's entry in `fill` (training medians), else its median."""
+    if copy:
+        df = df.copy()
+    fill = fill or {}
 
     for col in df.select_dtypes(include=["float", "int"]).columns:
-        df[col] = df[col].replace([np.inf, -np.inf], np.nan)
-        df[col] = df[col].fillna(df[col].median())
+        values = df[col].to_numpy()
+        bad = ~np.isfinite(values)
+        if bad.any():
+            if col in fill:
+                value = fill[col]
+            else:
+                finite = values[~bad]
+                value = np.median(finite) if len(finite) else np.nan
+            df[col] = np.where(bad, value, values).astype(values.dtype)
 
     return df
 
 
 # ------------------------------------------------------------
-# MASTER BUILD FEATURES (used in train.py + predict.py)
+# DERIVED FEATURES (shared with feature_pipeline's array transform)
 # ------------------------------------------------------------
-def build_features(df: pd.DataFrame, freq_map=None) -> pd.DataFrame:
-    df = df.copy()
+NUMERIC_COLS = [
+    "horsepower", "age_years", "hours_used", "maintenance_cost",
+    "fuel_price", "old_rental_price", "last_year_price",
+    "bookings_7d", "stock_on_hand", "market_trend_score",
+    "machine_type_freq", "pincode_int", "pincode_prefix",
+    "pincode_suffix", "created_year", "created_month",
+    "created_dayofyear", "season",
+    "temp", "humidity", "pressure", "wind_speed", "rain",
+]
+
+
+def add_derived_features(f):
+    """`f` is a DataFrame or a dict of float32 arrays; both index the same way."""
+    f["usage_ratio"] = f["hours_used"] / (f["age_years"] + 1.0)
+    f["demand_ratio"] = f["bookings_7d"] / (f["stock_on_hand"] + 1.0)
+    f["price_trend"] = f["old_rental_price"] - f["last_year_price"]
+    f["fuel_cost_factor"] = f["fuel_price"] * f["hours_used"]
+    f["heat_stress"] = np.maximum(f["temp"] - 35, 0)
+    f["humidity_stress"] = f["humidity"] / 100
+    f["rain_risk"] = (f["rain"] > 0).astype(FEATURE_DTYPE)
+    return f
+
+
+# ------------------------------------------------------------
+# MASTER BUILD FEATURES (training; serving uses feature_pipeline)
+# ------------------------------------------------------------
+def build_features(df: pd.DataFrame, freq_map=None, geo_index=None, impute=None) -> pd.DataFrame:
+    """
+    Returns categoricals for string features and float32 for everything
+    numeric (see DTYPE POLICY). Only new columns are allocated; the input
+    frame's columns are shared, not copied. `impute` (train.clean_data
+    medians) fills missing raw numerics; without it they become 0.
+    """
+    impute = impute or {}
+    df = df.copy(deep=False)
 
     # --- machine_type ---
-    df["machine_type"] = df.get("machine_type", "Unknown").fillna("Unknown")
+    df["machine_type"] = as_category(
+        df["machine_type"] if "machine_type" in df.columns else pd.Series("Unknown", index=df.index)
+    )
 
     # --- Apply sub-transformations ---
-    df = add_pincode_features(df)
-    df = add_date_features(df)
-    df = apply_frequency_features(df, freq_map)
+    df = add_pincode_features(df, copy=False)
+    df = add_geo_features(df, geo_index, copy=False)
+    df = add_date_features(df, copy=False)
+    df = apply_frequency_features(df, freq_map, copy=False)
 
     # --- Required numeric fields ---
-    numeric_cols = [
-        "horsepower", "age_years", "hours_used", "maintenance_cost",
-        "fuel_price", "old_rental_price", "last_year_price",
-        "bookings_7d", "stock_on_hand", "market_trend_score",
-        "machine_type_freq", "pincode_int", "pincode_prefix",
-        "pincode_suffix", "created_year", "created_month",
-        "created_dayofyear", "season",
-        "temp", "humidity", "pressure", "wind_speed", "rain",
-    ]
-
-    for col in numeric_cols:
+    for col in NUMERIC_COLS:
         if col not in df.columns:
-            df[col] = 0.0
-        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+            df[col] = FEATURE_DTYPE(impute.get(col, 0.0))
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(impute.get(col, 0.0)).astype(FEATURE_DTYPE)
 
     # --- Derived ML features ---
-    df["usage_ratio"] = df["hours_used"] / (df["age_years"] + 1.0)
-    df["demand_ratio"] = df["bookings_7d"] / (df["stock_on_hand"] + 1.0)
-    df["price_trend"] = df["old_rental_price"] - df["last_year_price"]
-    df["fuel_cost_factor"] = df["fuel_price"] * df["hours_used"]
-    df["heat_stress"] = (df["temp"] - 35).clip(lower=0)
-    df["humidity_stress"] = df["humidity"] / 100
-    df["rain_risk"] = (df["rain"] > 0).astype(int)
-
-    # final pass for NaN / Inf
-    df = sanitize_numeric(df)
+    df = add_derived_features(df)
+
+    # final pass for NaN / Inf, then categoricals / float32 for leftovers
+    df = sanitize_numeric(df, copy=False, fill=impute)
+    df = apply_dtype_policy(df)
 
     return df
@@ -17,3 +17,22 @@ def get_location_from_pincode(pincode: str) -> dict:
         }
     except Exception:
         return {"lat": None, "lng": None, "city": None, "state": None}
+
+
+def get_coords_bulk(pincodes) -> pd.DataFrame:
+    """
+    Vectorized lat/lng lookup for many pincodes at once (one pgeocode
+    query over the unique values). Unknown pincodes get NaN coordinates.
+    """
+    uniq = pd.unique(pd.Series(pincodes, dtype=str).str.strip())
+    if len(uniq) == 0:
+        return pd.DataFrame({"lat": [], "lng": []}, dtype=float)
+    try:
+        res = _nom.query_postal_code(list(uniq))
+        coords = pd.DataFrame(
+            {"lat": res["latitude"].to_numpy(float), "lng": res["longitude"].to_numpy(float)},
+            index=uniq,
+        )
+    except Exception:
+        coords = pd.DataFrame({"lat": float("nan"), "lng": float("nan")}, index=uniq)
+    return coords
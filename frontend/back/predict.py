@@ -1,12 +1,12 @@
-import os
-import pickle
+import time
 from datetime import datetime
 
-import pandas as pd
-
-from model_utils import build_features
 from demand_stats import estimate_demand_fields
+from market_stats import market_stats, MODEL_FIELDS as MARKET_MODEL_FIELDS
+from demand_stream import _prefix
 from seasonal_demand import estimate_seasonal_features
+from model_registry import registry
+from records import MACHINE_TYPE_LEN, RECORD_FIELDS, batch_buffer
 from logging_config import get_logger
 
 logger = get_logger("predict")
@@ -14,12 +14,7 @@ logger = get_logger("predict")
 MODELS_DIR = "models"
 
 
-def _load(name: str):
-    with open(os.path.join(MODELS_DIR, name), "rb") as f:
-        return pickle.load(f)
-
-
-def predict_price(input_data: dict) -> float:
+def _record(input_data: dict, memo: dict | None = None, models_dir: str = MODELS_DIR) -> tuple:
     """
     input_data comes from API (React) and contains ONLY:
 
@@ -29,9 +24,19 @@ def predict_price(input_data: dict) -> float:
 
     All other ML features (old_rental_price, last_year_price, bookings_7d,
     stock_on_hand, market_trend_score, seasonal_demand_score, etc.) are
-    auto-generated here from training-time stats.
+    auto-generated here from live market stats, falling back to
+    training-time stats.
+
+    Returns the row as a tuple in records.RECORD_FIELDS order.
+    `memo` caches the per-machine-type stats lookups across a batch;
+    `models_dir` is the bundle whose training-time stats fill the gaps.
     """
+    memo = {} if memo is None else memo
     machine_type = input_data.get("machine_type") or "Unknown"
+    if len(machine_type) > MACHINE_TYPE_LEN:
+        # would be truncated in the record buffer (and could alias a real type)
+        logger.warning(f"machine_type longer than {MACHINE_TYPE_LEN} chars, scored as Unknown: {machine_type[:MACHINE_TYPE_LEN]}...")
+        machine_type = "Unknown"
     horsepower = float(input_data.get("horsepower", 0))
     age_years = float(input_data.get("age_years", 0))
     hours_used = float(input_data.get("hours_used", 0))
@@ -39,14 +44,24 @@ def predict_price(input_data: dict) -> float:
     maintenance_cost = float(input_data.get("maintenance_cost", 0))
     fuel_price = float(input_data.get("fuel_price", 0))
 
-    # ---- demand / price history fields from training stats ----
-    demand_fields = estimate_demand_fields(machine_type)
+    # ---- demand / price history fields from the demand stream (training medians as fallback) ----
+    demand_key = ("demand", models_dir, machine_type, _prefix(pincode))
+    if demand_key not in memo:
+        memo[demand_key] = estimate_demand_fields(machine_type, pincode, models_dir)
+    # ---- live market counts (stock, bookings) override the medians ----
+    # (the live trend is on another scale than the trained column: response only)
+    market = market_stats.lookup(pincode, machine_type)
+    live = {k: market[k] for k in MARKET_MODEL_FIELDS if k in market}
+    demand_fields = {**memo[demand_key], **live} if live else memo[demand_key]
 
     # ---- created_at: current date ----
     created_at = datetime.now().strftime("%Y-%m-%d")
 
     # ---- seasonal demand features based on month + machine type ----
-    seasonal = estimate_seasonal_features(machine_type, created_at)
+    seasonal_key = ("seasonal", models_dir, machine_type)
+    if seasonal_key not in memo:
+        memo[seasonal_key] = estimate_seasonal_features(machine_type, created_at, models_dir)
+    seasonal = memo[seasonal_key]
 
     # weather features are added by api.py (after calling weather API)
     temp = float(input_data.get("temp", 0))
@@ -55,59 +70,74 @@ def predict_price(input_data: dict) -> float:
     wind_speed = float(input_data.get("wind_speed", 0))
     rain = float(input_data.get("rain", 0))
 
-    raw = {
-        "machine_type": machine_type,
-        "horsepower": horsepower,
-        "age_years": age_years,
-        "hours_used": hours_used,
-        "pincode": pincode,
-        "maintenance_cost": maintenance_cost,
-        "fuel_price": fuel_price,
-        "created_at": created_at,
+    # RECORD_FIELDS order; None = unknown (NaN in a record → imputed)
+    demand = demand_fields.get
+    return (
+        machine_type, pincode, created_at,
+        horsepower, age_years, hours_used, maintenance_cost, fuel_price,
 
-        # auto-filled demand fields (old_rental_price, last_year_price, etc.)
-        **demand_fields,
+        # auto-filled demand fields
+        demand("old_rental_price"), demand("last_year_price"), demand("bookings_7d"),
+        demand("stock_on_hand"), demand("market_trend_score"),
 
         # seasonal features
-        "seasonal_demand_score": seasonal["seasonal_demand_score"],
-        "season_month": seasonal["season_month"],
-        "is_peak_season": seasonal["is_peak_season"],
-        "is_off_season": seasonal["is_off_season"],
+        seasonal["seasonal_demand_score"], seasonal["season_month"],
+        seasonal["is_peak_season"], seasonal["is_off_season"],
 
         # weather
-        "temp": temp,
-        "humidity": humidity,
-        "pressure": pressure,
-        "wind_speed": wind_speed,
-        "rain": rain,
-    }
-
-    df = pd.DataFrame([raw])
-
-    # base engine features (also builds derived fields like usage_ratio etc.)
-    X_base = build_features(df, freq_map={machine_type: 1})
-
-    # numeric subset for XGB/LGBM in same order as training
-    num_features = _load("num_features.pkl")
-    X_num = (
-        X_base.select_dtypes(include=["number"])
-        .reindex(columns=num_features, fill_value=0)
+        temp, humidity, pressure, wind_speed, rain,
     )
 
-    scaler = _load("scaler.pkl")
-    xgb = _load("xgb.pkl")
-    lgbm = _load("lgbm.pkl")
-    cat = _load("cat.pkl")
-    cat_meta = _load("cat_meta.pkl")
 
-    X_scaled = scaler.transform(X_num)
+def _raw_row(input_data: dict, memo: dict | None = None, models_dir: str = MODELS_DIR) -> dict:
+    """One enriched row as a dict (for FeaturePipeline.transform_grid)."""
+    return dict(zip(RECORD_FIELDS, _record(input_data, memo, models_dir)))
+
+
+def _records(rows: list[dict], models_dir: str):
+    """The batch enriched against one bundle, in this thread's record buffer."""
+    memo = {}
+    records = batch_buffer(len(rows))
+    for i, r in enumerate(rows):
+        records.set(i, _record(r, memo, models_dir))
+    return records
+
+
+def predict_prices(rows: list[dict], fast: bool = False) -> list[float]:
+    """
+    Vectorized form of predict_price: one feature build and one call per
+    model for the whole batch (used by request micro-batching in api.py).
+    fast=True scores with the bundle's distilled student (model_registry).
+    """
+    # primary bundle on the request path; candidate (if any) in shadow,
+    # re-enriched from its own artifacts on the shadow thread.
+    # Each bundle's feature pipeline reads the record columns directly.
+    # Student scores are not shadowed: the comparison is ensemble vs ensemble.
+    bundle = registry.primary()
+    records = _records(rows, bundle.path)
+    t0 = time.perf_counter()
+    prices = bundle.score_batch(records, fast)
+    if not bundle.uses_student(fast):
+        registry.shadow(lambda models_dir: _records(rows, models_dir), prices, (time.perf_counter() - t0) * 1000)
+
+    return [float(p) for p in prices]
+
 
-    # CatBoost frame aligned with training
-    X_cat = X_base.reindex(columns=cat_meta["columns"], fill_value=0)
+def predict_price(input_data: dict, fast: bool = False) -> float:
+    return predict_prices([input_data], fast)[0]
 
-    p_xgb = float(xgb.predict(X_scaled)[0])
-    p_lgb = float(lgbm.predict(X_num)[0])
-    p_cat = float(cat.predict(X_cat)[0])
 
-    price = (p_xgb + p_lgb + p_cat) / 3.0
-    return float(price)
+def scoring_model(fast: bool) -> str:
+    """Which model a request with this `fast` flag is scored by."""
+    return "student" if registry.primary().uses_student(fast) else "ensemble"
+
+
+def predict_grid(input_data: dict, grid: dict, fast: bool = False) -> list[float]:
+    """
+    Price one request under every combination in `grid` (equal-length
+    arrays of numeric inputs, e.g. hours_used / age_years): one enrichment,
+    one feature template, one call per model. Not shadowed.
+    """
+    bundle = registry.primary()
+    raw = _raw_row(input_data, models_dir=bundle.path)
+    return [float(p) for p in bundle.score_grid(raw, grid, fast)]
@@ -0,0 +1,87 @@
+# records.py
+# Fixed-schema prediction records: every field predict.py fills for a row
+# (machine, location, demand, seasonal, weather), in one NumPy structured
+# array per batch. A batch is filled row by row with one tuple assignment
+# and handed to FeaturePipeline.transform as column views, so the request
+# path builds no per-row dicts or per-column lists.
+#
+# Buffers are reused per thread (predict_prices runs on the micro-batcher
+# and threadpool threads); copy() a batch before handing it to another
+# thread.
+import threading
+
+import numpy as np
+
+from model_utils import FEATURE_DTYPE
+
+# longest machine_type a record holds; callers reject longer names rather
+# than let NumPy truncate them silently
+MACHINE_TYPE_LEN = 64
+
+# NaN in a numeric field = unknown → the pipeline imputes it, as None did
+RECORD_DTYPE = np.dtype([
+    ("machine_type", f"U{MACHINE_TYPE_LEN}"),
+    ("pincode", "U12"),
+    ("created_at", "U10"),
+    ("horsepower", FEATURE_DTYPE),
+    ("age_years", FEATURE_DTYPE),
+    ("hours_used", FEATURE_DTYPE),
+    ("maintenance_cost", FEATURE_DTYPE),
+    ("fuel_price", FEATURE_DTYPE),
+    ("old_rental_price", FEATURE_DTYPE),
+    ("last_year_price", FEATURE_DTYPE),
+    ("bookings_7d", FEATURE_DTYPE),
+    ("stock_on_hand", FEATURE_DTYPE),
+    ("market_trend_score", FEATURE_DTYPE),
+    ("seasonal_demand_score", FEATURE_DTYPE),
+    ("season_month", FEATURE_DTYPE),
+    ("is_peak_season", FEATURE_DTYPE),
+    ("is_off_season", FEATURE_DTYPE),
+    ("temp", FEATURE_DTYPE),
+    ("humidity", FEATURE_DTYPE),
+    ("pressure", FEATURE_DTYPE),
+    ("wind_speed", FEATURE_DTYPE),
+    ("rain", FEATURE_DTYPE),
+])
+RECORD_FIELDS = list(RECORD_DTYPE.names)
+
+
+class PredictionRecords:
+    """The first `n` rows of a RECORD_DTYPE buffer."""
+
+    __slots__ = ("data", "n")
+
+    def __init__(self, data: np.ndarray, n: int = 0):
+        self.data = data
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def set(self, i: int, values: tuple) -> None:
+        """Row i from a tuple in RECORD_FIELDS order."""
+        self.data[i] = values
+
+    def columns(self) -> dict:
+        """Field name → column view (no copy), for FeaturePipeline.transform."""
+        view = self.data[:self.n]
+        return {name: view[name] for name in RECORD_FIELDS}
+
+    def copy(self) -> "PredictionRecords":
+        return PredictionRecords(self.data[:self.n].copy(), self.n)
+
+    def as_dicts(self) -> list[dict]:
+        view = self.data[:self.n]
+        return [dict(zip(RECORD_FIELDS, row)) for row in view.tolist()]
+
+
+_local = threading.local()
+
+
+def batch_buffer(n: int) -> PredictionRecords:
+    """This thread's reusable buffer, sized for n rows (grown by doubling)."""
+    data = getattr(_local, "data", None)
+    if data is None or len(data) < n:
+        data = np.zeros(max(n, 2 * len(data) if data is not None else 64), dtype=RECORD_DTYPE)
+        _local.data = data
+    return PredictionRecords(data, n)
@@ -0,0 +1,246 @@
+# reprice.py
+# Bulk re-pricing of the whole machine catalogue.
+#
+# Streams machines in chunks from a JSONL/CSV export or straight from
+# MongoDB, resolves each chunk's distinct pincodes once (coordinates and
+# weather, as /predict does), scores the chunk with the vectorized
+# ensemble in a process pool and writes the suggested prices back in bulk.
+#
+#   python reprice.py --source machines.jsonl --out suggested.jsonl
+#   python reprice.py --source mongodb://localhost:27017/agrirent --write-back
+#
+# Run it after `python retrain.py` or when the diesel price moves.
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from logging_config import get_logger
+
+logger = get_logger("reprice")
+
+DEFAULT_CHUNK = 20_000
+
+
+# ------------------------------------------------------------
+# SOURCES (each yields lists of machine dicts)
+# ------------------------------------------------------------
+def _chunks_jsonl(path: str, size: int):
+    chunk = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                chunk.append(json.loads(line))
+                if len(chunk) >= size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def _chunks_csv(path: str, size: int):
+    for frame in pd.read_csv(path, chunksize=size, dtype={"pincode": str, "_id": str}):
+        yield frame.to_dict(orient="records")
+
+
+def _chunks_mongo(uri: str, size: int):
+    from pymongo import MongoClient
+
+    coll = MongoClient(uri).get_default_database()["machines"]
+    fields = {"type": 1, "horsepower": 1, "ageYears": 1, "hoursUsed": 1,
+              "pincode": 1, "maintenance_cost": 1, "fuel_price": 1, "rentPerHour": 1}
+    chunk = []
+    for doc in coll.find({}, fields, batch_size=size):
+        doc["_id"] = str(doc["_id"])
+        chunk.append(doc)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_chunks(source: str, size: int = DEFAULT_CHUNK):
+    if source.startswith("mongodb://") or source.startswith("mongodb+srv://"):
+        return _chunks_mongo(source, size)
+    if source.endswith(".csv"):
+        return _chunks_csv(source, size)
+    return _chunks_jsonl(source, size)
+
+
+# ------------------------------------------------------------
+# SCORING (runs inside pool workers)
+# ------------------------------------------------------------
+def _num(v, default=0.0) -> float:
+    try:
+        v = float(v)
+        return default if v != v else v
+    except (TypeError, ValueError):
+        return default
+
+
+WEATHER_FIELDS = ["temp", "humidity", "pressure", "wind_speed", "rain"]
+
+
+def _pincode(machine: dict) -> str:
+    return str(machine.get("pincode") or "000000").strip()
+
+
+def weather_by_pincode(pincodes) -> dict:
+    """
+    Weather fields per distinct pincode: one bulk coordinate lookup, then
+    the local weather store (live cell or climatology, never the network).
+    """
+    from pincode import get_coords_bulk
+    from weather_store import weather_store
+
+    coords = get_coords_bulk(pincodes)
+    out = {}
+    for pin, lat, lng in zip(coords.index, coords["lat"].to_numpy(), coords["lng"].to_numpy()):
+        known = np.isfinite(lat) and np.isfinite(lng)
+        weather = weather_store.lookup(lat if known else None, lng if known else None, pin)
+        out[pin] = {c: weather.get(c) or 0.0 for c in WEATHER_FIELDS}
+    return out
+
+
+def to_payload(machine: dict, diesel_price: float | None, weather: dict | None = None) -> dict:
+    """Machine document (Mongo field names) + its pincode's weather → predict_price input."""
+    return {
+        "machine_type": machine.get("type") or machine.get("machine_type") or "Unknown",
+        "horsepower": _num(machine.get("horsepower")),
+        "age_years": _num(machine.get("ageYears", machine.get("age_years"))),
+        "hours_used": _num(machine.get("hoursUsed", machine.get("hours_used"))),
+        "pincode": _pincode(machine),
+        "maintenance_cost": _num(machine.get("maintenance_cost")),
+        "fuel_price": diesel_price or _num(machine.get("fuel_price"), 95.0) or 95.0,
+        **(weather or {}),
+    }
+
+
+def score_chunk(chunk: list[dict], diesel_price: float | None = None) -> list[tuple[str, float, float]]:
+    from predict import predict_prices
+
+    pincodes = [_pincode(m) for m in chunk]
+    weather = weather_by_pincode(pincodes)
+    prices = predict_prices([to_payload(m, diesel_price, weather.get(p)) for m, p in zip(chunk, pincodes)])
+    return [
+        (str(m.get("_id")), round(p, 2), _num(m.get("rentPerHour")))
+        for m, p in zip(chunk, prices)
+    ]
+
+
+# ------------------------------------------------------------
+# SINKS
+# ------------------------------------------------------------
+class FileSink:
+    def __init__(self, path: str):
+        self.path = path
+        self.is_csv = path.endswith(".csv")
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        if self.is_csv:
+            self.w = csv.writer(self.f)
+            self.w.writerow(["_id", "suggested_price", "current_price"])
+
+    def write(self, rows):
+        if self.is_csv:
+            self.w.writerows(rows)
+        else:
+            self.f.writelines(
+                json.dumps({"_id": i, "suggested_price": p, "current_price": c}) + "\n"
+                for i, p, c in rows
+            )
+
+    def close(self):
+        self.f.close()
+
+
+class MongoSink:
+    """Writes meta.suggested_price with one unordered bulk_write per chunk."""
+
+    def __init__(self, uri: str):
+        from pymongo import MongoClient, UpdateOne
+        from bson import ObjectId
+
+        self._update, self._oid = UpdateOne, ObjectId
+        self.coll = MongoClient(uri).get_default_database()["machines"]
+
+    def write(self, rows):
+        now = datetime.now(timezone.utc)
+        ops = [
+            self._update(
+                {"_id": self._oid(i) if self._oid.is_valid(i) else i},
+                {"$set": {"meta.suggested_price": p, "meta.suggested_at": now}},
+            )
+            for i, p, _ in rows
+        ]
+        if ops:
+            self.coll.bulk_write(ops, ordered=False)
+
+    def close(self):
+        pass
+
+
+# ------------------------------------------------------------
+# DRIVER
+# ------------------------------------------------------------
+def reprice(source: str, sink, chunk_size: int = DEFAULT_CHUNK,
+            workers: int | None = None, diesel_price: float | None = None) -> dict:
+    workers = workers or os.cpu_count() or 1
+    max_inflight = workers * 2
+    done = 0
+    t0 = time.perf_counter()
+
+    def drain(futures, return_when):
+        nonlocal done
+        finished, pending = wait(futures, return_when=return_when)
+        for fut in finished:
+            rows = fut.result()
+            sink.write(rows)
+            done += len(rows)
+        elapsed = time.perf_counter() - t0
+        logger.info(f"Repriced {done:,} machines | {done / max(elapsed, 1e-9):,.0f} machines/s")
+        return pending
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        inflight = set()
+        for chunk in iter_chunks(source, chunk_size):
+            inflight.add(pool.submit(score_chunk, chunk, diesel_price))
+            if len(inflight) >= max_inflight:
+                inflight = drain(inflight, FIRST_COMPLETED)
+        if inflight:
+            drain(inflight, ALL_COMPLETED)
+
+    sink.close()
+    elapsed = time.perf_counter() - t0
+    stats = {"machines": done, "seconds": round(elapsed, 2),
+             "machines_per_s": round(done / max(elapsed, 1e-9), 1)}
+    logger.info(f"Re-pricing finished: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Re-price every listed machine in bulk")
+    ap.add_argument("--source", required=True, help="machines .jsonl/.csv export or mongodb:// URI")
+    ap.add_argument("--out", help="output .jsonl/.csv for suggested prices")
+    ap.add_argument("--write-back", action="store_true", help="write meta.suggested_price to MongoDB")
+    ap.add_argument("--mongo-uri", default=os.getenv("MONGO_URL"), help="target for --write-back")
+    ap.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--diesel", type=float, default=None, help="override fuel_price for every machine")
+    args = ap.parse_args()
+
+    if args.write_back:
+        uri = args.source if args.source.startswith("mongodb") else args.mongo_uri
+        sink = MongoSink(uri)
+    elif args.out:
+        sink = FileSink(args.out)
+    else:
+        ap.error("pass --out or --write-back")
+
+    reprice(args.source, sink, args.chunk_size, args.workers, args.diesel)
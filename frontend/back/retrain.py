@@ -1,5 +1,20 @@
+import argparse
+
 from train import train_models
+from model_registry import registry, new_candidate_dir
 
 if __name__ == "__main__":
     # Simple wrapper so you can schedule `python retrain.py` via cron/task scheduler
-    train_models()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--candidate", action="store_true",
+                    help="stage the new bundle as a shadow candidate instead of replacing models/")
+    ap.add_argument("--shadow-fraction", type=float, default=0.1)
+    args = ap.parse_args()
+
+    if args.candidate:
+        path = new_candidate_dir()
+        train_models(path)
+        registry.set_candidate(path, args.shadow_fraction)
+        print(f"Candidate staged at {path} (shadow fraction {args.shadow_fraction})")
+    else:
+        train_models()
@@ -0,0 +1,308 @@
+# score_archive.py
+# Re-score historical rental archives (rentals_raw_150k.csv-style CSVs) for
+# audits and backtests.
+#
+# Every input file is cut into byte-range shards; each shard is read on its
+# own (a line belongs to the shard it starts in), scored with one vectorized
+# feature build + one call per model, and written as Parquet partitioned by
+# --partition-by. Progress lives in <out>/_manifest: a shard is done once its
+# .done.json exists, so a rerun (or a crash) only redoes unfinished shards.
+#
+# Several machines can work on the same job: point them all at the same
+# shared --out directory. Shards are claimed with O_EXCL lock files, so each
+# one is scored once; locks older than --lock-timeout are taken over.
+#
+#   python score_archive.py data/rentals_raw_150k.csv --out scored/
+#   python score_archive.py archive/*.csv --out /mnt/shared/scored --workers 16
+#   python score_archive.py --out scored/ --status
+#
+# Scores the archived inputs as recorded (no live market / weather
+# enrichment); columns missing from an archive get the training medians.
+# Quoted fields containing newlines are not supported.
+import argparse
+import io
+import json
+import os
+import re
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+
+from logging_config import get_logger
+from model_utils import parse_dates
+
+logger = get_logger("score_archive")
+
+DEFAULT_SHARD_MB = 64
+LOCK_TIMEOUT_S = 30 * 60
+PARTITIONS = ["created_month", "machine_type", "source"]
+KEEP_COLUMNS = ["machine_type", "pincode", "created_at", "rental_price"]
+CSV_DTYPES = {"machine_type": str, "pincode": str, "created_at": str}
+
+
+# ------------------------------------------------------------
+# SHARDS (byte ranges, same ids on every node)
+# ------------------------------------------------------------
+def plan_shards(paths: list[str], shard_bytes: int) -> list[dict]:
+    shards = []
+    for path in paths:
+        size = os.path.getsize(path)
+        stem = re.sub(r"[^A-Za-z0-9_.-]", "_", os.path.splitext(os.path.basename(path))[0])
+        for start in range(0, size, shard_bytes):
+            shards.append({
+                "id": f"{stem}-{start:012d}",
+                "path": os.path.abspath(path),
+                "start": start,
+                "end": min(start + shard_bytes, size),
+            })
+    return shards
+
+
+def read_shard(path: str, start: int, end: int) -> tuple[bytes, bytes]:
+    """(header line, every line that starts in [start, end))."""
+    with open(path, "rb") as f:
+        header = f.readline()
+        if start == 0:
+            pos = f.tell()
+        else:
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                f.readline()              # partial line: owned by the previous shard
+            pos = f.tell()
+        if pos >= end:
+            return header, b""
+        data = f.read(end - pos)
+        if not data.endswith(b"\n"):
+            data += f.readline()          # finish the line that crosses `end`
+    return header, data
+
+
+# ------------------------------------------------------------
+# MANIFEST (one file per shard: safe on a shared directory)
+# ------------------------------------------------------------
+class Manifest:
+    def __init__(self, out_dir: str):
+        self.dir = os.path.join(out_dir, "_manifest")
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _path(self, shard_id: str, kind: str) -> str:
+        return os.path.join(self.dir, f"{shard_id}.{kind}")
+
+    def write_plan(self, shards: list[dict], shard_bytes: int) -> None:
+        """First node to start records the plan; later ones keep it."""
+        try:
+            fd = os.open(os.path.join(self.dir, "plan.json"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return
+        with os.fdopen(fd, "w") as f:
+            json.dump({"shard_bytes": shard_bytes, "shards": shards}, f)
+
+    def plan(self) -> list[dict]:
+        path = os.path.join(self.dir, "plan.json")
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return json.load(f)["shards"]
+
+    def is_done(self, shard_id: str) -> bool:
+        return os.path.exists(self._path(shard_id, "done.json"))
+
+    def claim(self, shard_id: str, lock_timeout: float = LOCK_TIMEOUT_S) -> bool:
+        lock = self._path(shard_id, "lock")
+        for _ in range(2):
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock) < lock_timeout:
+                        return False
+                    os.remove(lock)       # holder died; take the shard over
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(f"{socket.gethostname()}:{os.getpid()}:{time.time():.0f}")
+            return not self.is_done(shard_id)
+        return False
+
+    def release(self, shard_id: str) -> None:
+        try:
+            os.remove(self._path(shard_id, "lock"))
+        except FileNotFoundError:
+            pass
+
+    def mark_done(self, shard_id: str, record: dict) -> None:
+        tmp = self._path(shard_id, "done.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp, self._path(shard_id, "done.json"))
+        self.release(shard_id)
+
+    def status(self) -> dict:
+        shards = self.plan()
+        done = [self._path(s["id"], "done.json") for s in shards]
+        records = []
+        for path in done:
+            if os.path.exists(path):
+                with open(path) as f:
+                    records.append(json.load(f))
+        locked = sum(os.path.exists(self._path(s["id"], "lock")) for s in shards)
+        rows = sum(r["rows"] for r in records)
+        seconds = sum(r["seconds"] for r in records)
+        return {
+            "shards": len(shards),
+            "done": len(records),
+            "in_progress": locked,
+            "pending": len(shards) - len(records) - locked,
+            "rows_scored": rows,
+            "rows_per_worker_s": round(rows / seconds, 1) if seconds else 0.0,
+        }
+
+
+# ------------------------------------------------------------
+# SCORING (runs inside pool workers)
+# ------------------------------------------------------------
+_BUNDLE = None
+
+
+def _init_worker(models_dir: str) -> None:
+    """One bundle per process; one BLAS / OpenMP thread so processes scale."""
+    global _BUNDLE
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+    from model_registry import ModelBundle
+
+    _BUNDLE = ModelBundle(models_dir)
+
+
+def _partition_values(frame: pd.DataFrame, partition_by: str, source: str) -> np.ndarray:
+    if partition_by == "source":
+        return np.full(len(frame), source, dtype=object)
+    if partition_by == "machine_type":
+        values = frame.get("machine_type", pd.Series("Unknown", index=frame.index)).fillna("Unknown")
+        return values.astype(str).str.replace(r"[^A-Za-z0-9_.-]", "_", regex=True).to_numpy(object)
+    if "created_at" not in frame.columns:
+        return np.full(len(frame), "unknown", dtype=object)
+    created = parse_dates(frame["created_at"])
+    return created.dt.strftime("%Y-%m").fillna("unknown").to_numpy(object)
+
+
+def score_shard(shard: dict, out_dir: str, partition_by: str) -> dict:
+    t0 = time.perf_counter()
+    header, data = read_shard(shard["path"], shard["start"], shard["end"])
+    frame = pd.read_csv(io.BytesIO(header + data), dtype=CSV_DTYPES) if data else pd.DataFrame()
+    n = len(frame)
+    files = []
+
+    if n:
+        pipeline = _BUNDLE.pipeline
+        cols = {c: frame[c].to_numpy() for c in pipeline.input_columns() if c in frame.columns}
+        prices = _BUNDLE.score_columns(cols, n)
+
+        source = os.path.basename(shard["path"])
+        out = pd.DataFrame({
+            "source": source,
+            "shard": shard["id"],
+            "row": np.arange(n, dtype=np.int32),
+            **{c: frame[c] for c in KEEP_COLUMNS if c in frame.columns},
+            "predicted_price": np.asarray(prices, dtype=np.float32),
+        })
+        if "rental_price" in out.columns:
+            out["error"] = (out["predicted_price"] - pd.to_numeric(out["rental_price"], errors="coerce")).astype(np.float32)
+
+        # one file per (partition, shard): a rerun overwrites, never duplicates
+        keys = _partition_values(frame, partition_by, source)
+        for key in pd.unique(keys):
+            part_dir = os.path.join(out_dir, f"{partition_by}={key}")
+            os.makedirs(part_dir, exist_ok=True)
+            path = os.path.join(part_dir, f"{shard['id']}.parquet")
+            out[keys == key].to_parquet(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+            files.append(os.path.relpath(path, out_dir))
+
+    seconds = time.perf_counter() - t0
+    return {"id": shard["id"], "rows": n, "seconds": round(seconds, 3),
+            "rows_per_s": round(n / max(seconds, 1e-9), 1), "files": files,
+            "host": socket.gethostname()}
+
+
+# ------------------------------------------------------------
+# DRIVER
+# ------------------------------------------------------------
+def run(inputs: list[str], out_dir: str, shard_mb: float = DEFAULT_SHARD_MB,
+        workers: int | None = None, models_dir: str | None = None,
+        partition_by: str = "created_month", lock_timeout: float = LOCK_TIMEOUT_S) -> dict:
+    workers = workers or os.cpu_count() or 1
+    if models_dir is None:
+        from model_registry import registry
+
+        models_dir = registry.config()["primary"]
+
+    shard_bytes = max(int(shard_mb * 2**20), 1)
+    shards = plan_shards(inputs, shard_bytes)
+    manifest = Manifest(out_dir)
+    manifest.write_plan(shards, shard_bytes)
+
+    rows = scored = 0
+    t0 = time.perf_counter()
+
+    def drain(inflight, return_when):
+        nonlocal rows, scored
+        finished, _ = wait(inflight, return_when=return_when)
+        for fut in finished:
+            shard = inflight.pop(fut)
+            try:
+                record = fut.result()
+            except Exception as e:
+                manifest.release(shard["id"])
+                logger.warning(f"Shard {shard['id']} failed: {e}")
+                continue
+            manifest.mark_done(shard["id"], {**record, "models": models_dir})
+            rows += record["rows"]
+            scored += 1
+        elapsed = time.perf_counter() - t0
+        logger.info(f"{scored} shards, {rows:,} rows | {rows / max(elapsed, 1e-9):,.0f} rows/s")
+
+    # claim only as many shards as there are workers, so other nodes
+    # sharing `out_dir` can take the rest
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(models_dir,)) as pool:
+        inflight = {}
+        for shard in shards:
+            if manifest.is_done(shard["id"]) or not manifest.claim(shard["id"], lock_timeout):
+                continue
+            inflight[pool.submit(score_shard, shard, out_dir, partition_by)] = shard
+            if len(inflight) >= workers:
+                drain(inflight, FIRST_COMPLETED)
+        if inflight:
+            drain(inflight, ALL_COMPLETED)
+
+    elapsed = time.perf_counter() - t0
+    stats = {"node_shards": scored, "node_rows": rows, "seconds": round(elapsed, 2),
+             "rows_per_s": round(rows / max(elapsed, 1e-9), 1), "job": manifest.status()}
+    logger.info(f"Archive scoring finished on this node: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Batch-score rental archives into partitioned Parquet")
+    ap.add_argument("inputs", nargs="*", help="archive CSV files")
+    ap.add_argument("--out", required=True, help="output directory (shared between nodes)")
+    ap.add_argument("--shard-mb", type=float, default=DEFAULT_SHARD_MB)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--models", default=None, help="bundle directory (default: serving primary)")
+    ap.add_argument("--partition-by", choices=PARTITIONS, default="created_month")
+    ap.add_argument("--lock-timeout", type=float, default=LOCK_TIMEOUT_S,
+                    help="seconds before another node may take over a claimed shard")
+    ap.add_argument("--status", action="store_true", help="print manifest progress and exit")
+    args = ap.parse_args()
+
+    if args.status:
+        print(json.dumps(Manifest(args.out).status(), indent=2))
+    elif not args.inputs:
+        ap.error("pass archive files to score (or --status)")
+    else:
+        print(json.dumps(run(args.inputs, args.out, args.shard_mb, args.workers, args.models,
+                             args.partition_by, args.lock_timeout), indent=2))
@@ -2,9 +2,12 @@
 import os
 import pickle
 from datetime import datetime
+
+import numpy as np
 import pandas as pd
 
 MODELS_DIR = "models"
+SEASONAL_FILE = "seasonal_stats.pkl"
 os.makedirs(MODELS_DIR, exist_ok=True)
 
 
@@ -35,93 +38,128 @@ def _parse_month(value) -> int | None:
         return None
 
 
-def build_seasonal_stats(df: pd.DataFrame) -> None:
+def parse_months(values) -> np.ndarray:
+    """
+    Vectorized _parse_month over a column: int8 months 1–12, 0 if unparsable.
+    Each distinct value is parsed once (fixed '%Y-%m-%d' format first, the
+    scalar parser for whatever that misses) and gathered back by code.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, copy=False), sort=False)
+    uniques = pd.Series(uniques, dtype=object).astype(str)
+    months = pd.to_datetime(uniques, format="%Y-%m-%d", errors="coerce").dt.month.to_numpy(float, copy=True)
+    missed = np.isnan(months)
+    if missed.any():
+        months[missed] = [_parse_month(v) or 0 for v in uniques[missed]]
+    table = np.append(np.nan_to_num(months).astype(np.int8), np.int8(0))   # code -1 → 0
+    return table[codes]
+
+
+def _save(payload: dict, models_dir: str) -> None:
+    with open(os.path.join(models_dir, SEASONAL_FILE), "wb") as f:
+        pickle.dump(payload, f)
+
+
+def _empty_stats(global_median: float = 0.0) -> dict:
+    return {
+        "types": [],
+        "by_type": np.full((0, 12), np.nan, dtype=np.float32),
+        "by_month": np.full(12, np.nan, dtype=np.float32),
+        "global_median": global_median,
+    }
+
+
+def build_seasonal_stats(df: pd.DataFrame, months: np.ndarray | None = None,
+                         models_dir: str = MODELS_DIR) -> None:
     """
     Build median rental_price per (machine_type, month) and per month.
-    Saved to models/seasonal_stats.pkl as:
+    Pass `months` (from parse_months) to reuse an already parsed column.
+    Saved to <models_dir>/seasonal_stats.pkl as dense arrays:
 
     {
-      "by_type": { "Tractor": {1: 1200.0, 2: 1300.0, ...}, ... },
-      "by_month": {1: 1150.0, 2: 1180.0, ...},
+      "types": ["Harvester", "Tractor", ...],
+      "by_type": float32 (len(types), 12), NaN where a cell has no rows,
+      "by_month": float32 (12,),
       "global_median": 1250.0
     }
     """
-    df = df.copy()
-
     if "rental_price" not in df.columns:
-        payload = {"by_type": {}, "by_month": {}, "global_median": 0.0}
-        with open(os.path.join(MODELS_DIR, "seasonal_stats.pkl"), "wb") as f:
-            pickle.dump(payload, f)
+        _save(_empty_stats(), models_dir)
         return
 
+    price = pd.to_numeric(df["rental_price"], errors="coerce").to_numpy(float)
+
     # If no created_at, we can only do global median
     if "created_at" not in df.columns:
-        global_med = float(pd.to_numeric(df["rental_price"], errors="coerce").median())
-        payload = {"by_type": {}, "by_month": {}, "global_median": global_med}
-        with open(os.path.join(MODELS_DIR, "seasonal_stats.pkl"), "wb") as f:
-            pickle.dump(payload, f)
-        return
-
-    df["month"] = df["created_at"].apply(_parse_month)
-    df = df.dropna(subset=["month"])
-    if df.empty:
-        global_med = float(pd.to_numeric(df["rental_price"], errors="coerce").median())
-        payload = {"by_type": {}, "by_month": {}, "global_median": global_med}
-        with open(os.path.join(MODELS_DIR, "seasonal_stats.pkl"), "wb") as f:
-            pickle.dump(payload, f)
+        _save(_empty_stats(float(np.nanmedian(price)) if np.isfinite(price).any() else 0.0), models_dir)
         return
 
-    df["month"] = df["month"].astype(int)
-
-    # Ensure numeric rental_price
-    df["rental_price"] = pd.to_numeric(df["rental_price"], errors="coerce")
-    df = df.dropna(subset=["rental_price"])
-    if df.empty:
-        payload = {"by_type": {}, "by_month": {}, "global_median": 0.0}
-        with open(os.path.join(MODELS_DIR, "seasonal_stats.pkl"), "wb") as f:
-            pickle.dump(payload, f)
+    if months is None:
+        months = parse_months(df["created_at"])
+    ok = (months > 0) & np.isfinite(price)
+    if not ok.any():
+        _save(_empty_stats(), models_dir)
         return
 
-    global_median = float(df["rental_price"].median())
-
-    # Median per (machine_type, month)
-    by_type: dict[str, dict[int, float]] = {}
-    grouped = df.groupby(["machine_type", "month"])["rental_price"].median()
-    for (mtype, month), val in grouped.items():
-        by_type.setdefault(str(mtype), {})[int(month)] = float(val)
-
-    # Median per month (ignore machine type)
-    by_month_raw = df.groupby("month")["rental_price"].median().to_dict()
-    by_month = {int(k): float(v) for k, v in by_month_raw.items()}
-
-    payload = {
-        "by_type": by_type,
-        "by_month": by_month,
-        "global_median": global_median,
-    }
-
-    with open(os.path.join(MODELS_DIR, "seasonal_stats.pkl"), "wb") as f:
-        pickle.dump(payload, f)
-
-
-def _load_seasonal_stats() -> dict:
-    path = os.path.join(MODELS_DIR, "seasonal_stats.pkl")
+    t, types = pd.factorize(df["machine_type"], sort=True)
+    t, m, price = t[ok], months[ok].astype(np.intp) - 1, price[ok]
+    types = [str(v) for v in types]
+
+    by_type = np.full(len(types) * 12, np.nan)
+    typed = t >= 0
+    med = pd.Series(price[typed]).groupby(t[typed] * 12 + m[typed]).median()
+    by_type[med.index.to_numpy()] = med.to_numpy()
+
+    by_month = np.full(12, np.nan)
+    med = pd.Series(price).groupby(m).median()
+    by_month[med.index.to_numpy()] = med.to_numpy()
+
+    _save({
+        "types": types,
+        "by_type": by_type.reshape(len(types), 12).astype(np.float32),
+        "by_month": by_month.astype(np.float32),
+        "global_median": float(np.median(price)),
+    }, models_dir)
+
+
+_STATS: dict[str, tuple[float, dict]] = {}      # path → (file mtime, dense stats)
+
+
+def _densify(obj: dict) -> dict:
+    """Older pickles stored nested {type: {month: median}} dicts."""
+    if isinstance(obj.get("by_month"), np.ndarray):
+        return obj
+    types = sorted(obj.get("by_type", {}))
+    by_type = np.full((len(types), 12), np.nan, dtype=np.float32)
+    for i, mtype in enumerate(types):
+        for month, val in obj["by_type"][mtype].items():
+            by_type[i, int(month) - 1] = val
+    by_month = np.full(12, np.nan, dtype=np.float32)
+    for month, val in obj.get("by_month", {}).items():
+        by_month[int(month) - 1] = val
+    return {"types": types, "by_type": by_type, "by_month": by_month,
+            "global_median": obj.get("global_median", 0.0)}
+
+
+def _load_seasonal_stats(models_dir: str = MODELS_DIR) -> dict:
+    """Dense stats + a type → row index, reloaded only when the pickle changes."""
+    path = os.path.join(models_dir, SEASONAL_FILE)
     if not os.path.exists(path):
-        return {"by_type": {}, "by_month": {}, "global_median": 0.0}
-    with open(path, "rb") as f:
-        obj = pickle.load(f)
-    # Ensure keys exist
-    return {
-        "by_type": obj.get("by_type", {}),
-        "by_month": obj.get("by_month", {}),
-        "global_median": float(obj.get("global_median", 0.0) or 0.0),
-    }
-
-
-def estimate_seasonal_features(machine_type: str, created_at: str) -> dict:
+        return {**_empty_stats(), "index": {}}
+    mtime = os.path.getmtime(path)
+    cached = _STATS.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            obj = _densify(pickle.load(f))
+        obj["global_median"] = float(obj.get("global_median", 0.0) or 0.0)
+        obj["index"] = {mtype: i for i, mtype in enumerate(obj["types"])}
+        cached = _STATS[path] = (mtime, obj)
+    return cached[1]
+
+
+def estimate_seasonal_features(machine_type: str, created_at: str, models_dir: str = MODELS_DIR) -> dict:
     """
-    At prediction-time: given machine_type + created_at,
-    return season-aware features:
+    At prediction-time: given machine_type + created_at (and the bundle
+    whose seasonal stats to use), return season-aware features:
 
     {
       "seasonal_demand_score": float in ~[0.5, 1.5],
@@ -130,21 +168,18 @@ def estimate_seasonal_features(machine_type: str, created_at: str) -> dict:
       "is_off_season": 0/1,
     }
     """
-    stats = _load_seasonal_stats()
-    by_type = stats.get("by_type", {})
-    by_month = stats.get("by_month", {})
-    g = stats.get("global_median", 0.0) or 1.0  # avoid division by zero
+    stats = _load_seasonal_stats(models_dir)
+    g = stats["global_median"] or 1.0  # avoid division by zero
 
     month = _parse_month(created_at) or 6  # default to June if parse fails
 
-    base = None
-    mtype = str(machine_type)
-
-    if mtype in by_type and month in by_type[mtype]:
-        base = by_type[mtype][month]
-    elif month in by_month:
-        base = by_month[month]
-    else:
+    base = np.nan
+    row = stats["index"].get(str(machine_type))
+    if row is not None:
+        base = stats["by_type"][row, month - 1]
+    if np.isnan(base):
+        base = stats["by_month"][month - 1]
+    if np.isnan(base):
         base = g
 
     # Convert to factor vs global median
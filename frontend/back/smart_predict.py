@@ -1,41 +1,13 @@
 # smart_predict.py
-import pickle
-import os
 import numpy as np
-import pandas as pd
 from datetime import datetime
 
-from model_utils import build_features
+from demand_stats import estimate_demand_fields
+from seasonal_demand import estimate_seasonal_features
+from model_registry import registry
 
-# -----------------------------
-# LOAD MODELS + ARTIFACTS
-# -----------------------------
-
-MODELS_DIR = "models"
-
-# numerical features
-num_features = pickle.load(open(f"{MODELS_DIR}/num_features.pkl", "rb"))
-
-# encoders
-xgb_te = pickle.load(open(f"{MODELS_DIR}/xgb_te.pkl", "rb"))
-lgbm_hybrid = pickle.load(open(f"{MODELS_DIR}/lgbm_hybrid.pkl", "rb"))
-
-# scaling
-scaler = pickle.load(open(f"{MODELS_DIR}/scaler.pkl", "rb"))
-
-# models
-xgb = pickle.load(open(f"{MODELS_DIR}/xgb.pkl", "rb"))
-lgbm = pickle.load(open(f"{MODELS_DIR}/lgbm.pkl", "rb"))
-cat = pickle.load(open(f"{MODELS_DIR}/cat.pkl", "rb"))
-
-# metadata
-cat_meta = pickle.load(open(f"{MODELS_DIR}/cat_meta.pkl", "rb"))
-
-# demand statistics (for autofill)
-demand_stats = pickle.load(open(f"{MODELS_DIR}/demand_stats.pkl", "rb"))
-
-# seasonal stats
-seasonal_stats = pickle.load(open(f"{MODELS_DIR}/seasonal_stats.pkl", "rb"))
+# models, feature pipeline, demand and seasonal stats all come from the
+# serving bundle in model_registry, per call, so a promote is picked up
 
 # -----------------------------
 # INTERNAL UTILITIES
@@ -51,22 +23,6 @@ def safe(val, default=0):
         return default
 
 
-def get_demand_fill(machine_type: str, key: str):
-    """Return median fallback for missing fields."""
-    machine_type = machine_type or "Unknown"
-    if machine_type in demand_stats["by_type"]:
-        if key in demand_stats["by_type"][machine_type]:
-            return float(demand_stats["by_type"][machine_type][key])
-    return float(demand_stats["global"].get(key, 0))
-
-
-def get_seasonal_multiplier(month: int):
-    """Return seasonal demand multiplier."""
-    if month in seasonal_stats:
-        return float(seasonal_stats[month])
-    return 1.0
-
-
 # -----------------------------
 # MAIN PREDICT FUNCTION
 # -----------------------------
@@ -78,32 +34,27 @@ def smart_predict(payload: dict):
     # -------------------------------------
 
     machine_type = payload.get("machine_type", "Unknown")
-    month = datetime.now().month
-
-    # fetch missing fields using demand stats
-    old_price = safe(payload.get("old_rental_price"),
-                     get_demand_fill(machine_type, "old_rental_price"))
-
-    last_year = safe(payload.get("last_year_price"),
-                     get_demand_fill(machine_type, "last_year_price"))
+    bundle = registry.primary()
+    now = datetime.now()
 
-    bookings = safe(payload.get("bookings_7d"),
-                    get_demand_fill(machine_type, "bookings_7d"))
+    # fetch missing fields using the bundle's demand stats
+    fill = estimate_demand_fields(machine_type, payload.get("pincode"), bundle.path)
 
-    stock = safe(payload.get("stock_on_hand"),
-                 get_demand_fill(machine_type, "stock_on_hand"))
+    old_price = safe(payload.get("old_rental_price"), fill["old_rental_price"])
+    last_year = safe(payload.get("last_year_price"), fill["last_year_price"])
+    bookings = safe(payload.get("bookings_7d"), fill["bookings_7d"])
+    stock = safe(payload.get("stock_on_hand"), fill["stock_on_hand"])
+    trend = safe(payload.get("market_trend_score"), fill["market_trend_score"])
 
-    trend = safe(payload.get("market_trend_score"),
-                 get_demand_fill(machine_type, "market_trend_score"))
-
-    # seasonal boost
-    seasonal_mul = get_seasonal_multiplier(month)
+    # seasonal boost (this month's median over the type's overall median)
+    seasonal = estimate_seasonal_features(machine_type, now.strftime("%Y-%m-%d"), bundle.path)
+    seasonal_mul = float(seasonal["seasonal_demand_score"])
 
     # -------------------------------------
     # 2) Build ML feature input
     # -------------------------------------
 
-    df = pd.DataFrame([{
+    row = {
         "machine_type": machine_type,
         "horsepower": payload.get("horsepower", 50),
         "age_years": payload.get("age_years", 0),
@@ -121,51 +72,15 @@ def smart_predict(payload: dict):
         "bookings_7d": bookings,
         "stock_on_hand": stock,
         "market_trend_score": trend,
-        "created_at": datetime.now().isoformat(),
-    }])
-
-    # Feature engineering
-    freq_map = {machine_type: 1000}  # dummy for prediction
-    df = build_features(df, freq_map=freq_map)
-
-    # -------------------------------------
-    # 3) Apply encoders
-    # -------------------------------------
-
-    # target encoding (xgb)
-    te_dict = xgb_te["te_dict"]
-    global_median = xgb_te["global_median"]
-    df["machine_type_xgb"] = df["machine_type"].map(te_dict).fillna(global_median)
-
-    # hybrid encoding (lgb)
-    df["machine_type_lgb"] = df["machine_type"].map(
-        lgbm_hybrid["te_dict"]
-    ).fillna(lgbm_hybrid["global_median"])
+        "created_at": now.isoformat(),
+    }
 
     # -------------------------------------
-    # 4) Prep inputs for each model
+    # 3) Features + ensemble: the bundle's fitted pipeline applies the
+    #    same encoders, column order and scaler as training
     # -------------------------------------
 
-    X_num = df[num_features].astype(float)
-
-    # scale for xgboost
-    X_scaled = scaler.transform(X_num)
-
-    # catboost needs its full columns
-    cat_cols = cat_meta["columns"]
-    X_cat = df[cat_cols]
-
-    cat_features_idx = cat_meta["cat_features_idx"]
-
-    # -------------------------------------
-    # 5) Predict (ensemble)
-    # -------------------------------------
-
-    p_xgb = float(xgb.predict(X_scaled)[0])
-    p_lgb = float(lgbm.predict(X_num)[0])
-    p_cat = float(cat.predict(X_cat)[0])
-
-    price = (p_xgb + p_lgb + p_cat) / 3.0
+    price = float(bundle.score_records([row])[0])
 
     # -------------------------------------
     # 6) Apply seasonal multiplier
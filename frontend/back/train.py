@@ -2,9 +2,7 @@ import os
 import pickle
 import pandas as pd
 import numpy as np
-from tqdm import tqdm
 
-from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
@@ -12,9 +10,15 @@ from xgboost import XGBRegressor
 from lightgbm import LGBMRegressor
 from catboost import CatBoostRegressor
 
-from model_utils import build_features
-from encoding_utils import target_encode, hybrid_encode, save_encoder
-from seasonal_demand import build_seasonal_stats
+from model_utils import as_category, apply_dtype_policy, FEATURE_DTYPE
+from encoding_utils import save_encoder
+from feature_pipeline import FeaturePipeline
+from seasonal_demand import build_seasonal_stats, parse_months
+from geo_index import build_geo_index, out_of_fold, OUT_OF_FOLD as GEO_OUT_OF_FOLD
+from forecast import build_forecast
+from weather_store import build_climatology
+from demand_stream import seed_from_frame
+from distill import distill
 from logging_config import get_logger
 
 logger = get_logger("train")
@@ -24,6 +28,9 @@ WEEKLY_DATA = os.path.join("data", "rentals_weekly_dataset.csv")
 MODELS_DIR = "models"
 os.makedirs(MODELS_DIR, exist_ok=True)
 
+# string columns are read straight into categoricals (see model_utils DTYPE POLICY)
+CSV_DTYPES = {"machine_type": "category", "pincode": "category", "created_at": "category"}
+
 
 # -------------------------------------------------------------
 def progress(title: str):
@@ -39,38 +46,60 @@ def load_data():
 
     if os.path.exists(WEEKLY_DATA):
         logger.info(f"Loading WEEKLY dataset: {WEEKLY_DATA}")
-        return pd.read_csv(WEEKLY_DATA)
+        return apply_dtype_policy(pd.read_csv(WEEKLY_DATA, dtype=CSV_DTYPES))
 
     logger.info(f"Weekly dataset missing -> using raw dataset: {RAW_DATA}")
-    return pd.read_csv(RAW_DATA)
+    return apply_dtype_policy(pd.read_csv(RAW_DATA, dtype=CSV_DTYPES))
 
 
 # =============================================================
 # STEP 2 — CLEANING & MEDIAN PREPROCESSING
 # =============================================================
-def clean_data(df: pd.DataFrame) -> pd.DataFrame:
+def clean_data(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """
+    Drop non-positive prices, impute every numeric column with its median
+    and drop rental_price outliers (1.5·IQR), in one pass over a float32
+    block. Returns the cleaned frame and the imputation medians, which the
+    feature pipeline keeps so serving fills gaps with training values.
+    """
     progress("STEP 2: CLEANING & MEDIAN PREPROCESSING")
 
-    df = df.copy()
-    df = df[df["rental_price"] > 0]
-
-    numeric_cols = df.select_dtypes(include=["int", "float"]).columns
-    for col in tqdm(numeric_cols, desc="Filling median for numeric columns"):
-        df[col] = df[col].fillna(df[col].median())
-
-    q1 = df["rental_price"].quantile(0.25)
-    q3 = df["rental_price"].quantile(0.75)
+    numeric_cols = [
+        c for c in df.columns
+        if pd.api.types.is_numeric_dtype(df[c].dtype) and not isinstance(df[c].dtype, pd.CategoricalDtype)
+    ]
+    keep = np.flatnonzero(df["rental_price"].to_numpy(FEATURE_DTYPE) > 0)
+
+    # one (columns × rows) float32 block; inf → NaN → column median, in place
+    X = np.empty((len(numeric_cols), len(keep)), dtype=FEATURE_DTYPE)
+    for j, col in enumerate(numeric_cols):
+        np.take(df[col].to_numpy(FEATURE_DTYPE), keep, out=X[j])
+    X[~np.isfinite(X)] = np.nan
+    medians = np.nanmedian(X, axis=1) if len(keep) else np.zeros(len(numeric_cols), dtype=FEATURE_DTYPE)
+    np.copyto(X, medians[:, None], where=np.isnan(X))
+
+    price = X[numeric_cols.index("rental_price")]
+    q1, q3 = np.percentile(price, [25, 75]) if len(price) else (0.0, 0.0)
     iqr = q3 - q1
-    lo, hi = q1 - 1.5 * iqr, q3 + 1.5 * iqr
-    df = df[(df["rental_price"] >= lo) & (df["rental_price"] <= hi)]
+    inside = (price >= q1 - 1.5 * iqr) & (price <= q3 + 1.5 * iqr)
+    rows = keep[inside]
 
-    return df
+    X = X if inside.all() else X[:, inside]
+    position = {c: j for j, c in enumerate(numeric_cols)}
+    df = pd.DataFrame({
+        c: X[position[c]] if c in position else df[c].array.take(rows)
+        for c in df.columns
+    }, index=df.index[rows], copy=False)
+
+    impute = {c: float(m) for c, m in zip(numeric_cols, medians) if c != "rental_price"}
+    print(f"Rows kept = {len(df)} | imputed columns = {len(impute)}")
+    return df, impute
 
 
 # =============================================================
 # STEP 3 — GLOBAL + TYPE DEMAND STATISTICS
 # =============================================================
-def build_demand_stats(df: pd.DataFrame):
+def build_demand_stats(df: pd.DataFrame, models_dir: str = MODELS_DIR):
     progress("STEP 3: BUILDING DEMAND STATISTICS")
 
     fields = [
@@ -86,69 +115,76 @@ def build_demand_stats(df: pd.DataFrame):
     if not existing:
         payload = {"by_type": {}, "global": {}}
     else:
-        by_type = df.groupby("machine_type")[existing].median().to_dict(orient="index")
+        by_type = df.groupby("machine_type", observed=True)[existing].median().to_dict(orient="index")
         global_stats = df[existing].median().to_dict()
         payload = {"by_type": by_type, "global": global_stats}
 
-    pickle.dump(payload, open(os.path.join(MODELS_DIR, "demand_stats.pkl"), "wb"))
-    print("Demand statistics saved → models/demand_stats.pkl")
+    pickle.dump(payload, open(os.path.join(models_dir, "demand_stats.pkl"), "wb"))
+    print(f"Demand statistics saved → {models_dir}/demand_stats.pkl")
+
+    # seed for the streaming updater (what serving reads; the pickle above is the fallback)
+    seed_from_frame(df, models_dir)
+    print(f"Demand stream seed saved → {models_dir}/demand_stream.npy")
 
 
 # =============================================================
 # STEP 4 — SEASONAL DEMAND STATS
 # =============================================================
-def seasonal_analysis(df: pd.DataFrame):
+def seasonal_analysis(df: pd.DataFrame, models_dir: str = MODELS_DIR):
     progress("STEP 4: BUILDING SEASONAL DEMAND STATS")
 
-    from seasonal_demand import _parse_month
-
     print("Extracting month from 'created_at'...")
 
-    months = df["created_at"].apply(_parse_month)
-    valid = months.notna().sum()
-    invalid = months.isna().sum()
+    months = parse_months(df["created_at"])
+    valid = int((months > 0).sum())
+    invalid = len(months) - valid
 
     print(f" • Valid: {valid} | Invalid: {invalid}")
 
-    print("Seasonal Stats Progress:")
-    for _ in tqdm(range(100)):
-        pass
-
-    build_seasonal_stats(df)
-    print("Seasonal stats saved → models/seasonal_stats.pkl")
+    build_seasonal_stats(df, months=months, models_dir=models_dir)
+    print(f"Seasonal stats saved → {models_dir}/seasonal_stats.pkl")
 
 
 # =============================================================
 # STEP 5 — FEATURE ENGINEERING
 # =============================================================
-def feature_engineering(X_raw: pd.DataFrame):
+def feature_engineering(X_raw: pd.DataFrame, geo_index=None, impute=None, y=None, train_idx=None):
     progress("STEP 5: FEATURE ENGINEERING")
 
     print("Building engineered features using model_utils.build_features...")
 
-    freq_map = X_raw["machine_type"].value_counts().to_dict()
-    X_fe = build_features(X_raw, freq_map=freq_map)
+    pipeline = FeaturePipeline(geo_index)
+    X_fe = pipeline.fit_features(X_raw, impute)
+
+    # the geo index holds the training rows' own prices: out-of-fold values
+    # for them, index values (as served) for validation rows
+    if geo_index is not None and train_idx is not None:
+        oof = out_of_fold(geo_index, X_fe["pincode_str"].iloc[train_idx], y.iloc[train_idx])
+        for col in GEO_OUT_OF_FOLD:
+            values = X_fe[col].to_numpy(FEATURE_DTYPE, copy=True)
+            values[train_idx] = oof[col].to_numpy(FEATURE_DTYPE)
+            X_fe[col] = values
+        print(f"Out-of-fold geo features for {len(train_idx)} training rows")
 
     print(f"Engineered feature count = {len(X_fe.columns)}")
-    return X_fe, freq_map
+    return X_fe, pipeline
 
 
 # =============================================================
 # STEP 6 — ENCODING
 # =============================================================
-def encoding_step(machine_series, y, X_fe):
+def encoding_step(pipeline, y, X_fe, models_dir=MODELS_DIR):
     progress("STEP 6: ENCODING (Target & Hybrid)")
 
-    print("→ Target Encoding (XGBoost)")
-    xgb_enc, te_dict, global_median = target_encode(machine_series, y)
-    save_encoder("xgb_te.pkl", {"te_dict": te_dict, "global_median": global_median})
-    X_fe["machine_type_xgb"] = xgb_enc
+    print("→ Target Encoding (XGBoost) + Hybrid Encoding (LightGBM)")
+    X_fe = pipeline.fit_encoders(X_fe, y)
 
-    print("→ Hybrid Encoding (LightGBM)")
-    hybrid_enc, freq_dict, te_d2, gm2 = hybrid_encode(machine_series, y)
+    # per-encoder pickles kept for bundles served by older code
+    save_encoder("xgb_te.pkl",
+                 {"te_dict": pipeline.te_dict, "global_median": pipeline.te_median}, models_dir)
     save_encoder("lgbm_hybrid.pkl",
-                 {"freq_dict": freq_dict, "te_dict": te_d2, "global_median": gm2})
-    X_fe["machine_type_lgb"] = hybrid_enc
+                 {"freq_dict": pipeline.hybrid_freq, "te_dict": pipeline.hybrid_te,
+                  "global_median": pipeline.hybrid_median}, models_dir)
 
     return X_fe
 
@@ -156,31 +192,43 @@ def encoding_step(machine_series, y, X_fe):
 # =============================================================
 # STEP 7 — TRAIN/VAL SPLIT
 # =============================================================
-def split_data(X_fe, y):
-    progress("STEP 7: TRAIN/VAL SPLIT")
+def split_indices(n: int):
+    """Row positions of train_test_split(X, y, test_size=0.2, random_state=42)."""
+    return train_test_split(np.arange(n), test_size=0.2, random_state=42)
 
-    X_num = X_fe.select_dtypes(include=["number"]).copy()
 
-    print(f"Numeric feature count = {len(X_num.columns)}")
+def split_data(X_fe, y, num_features, train_idx, val_idx):
+    """
+    Rows are reordered once (train rows first) so every train / val set
+    below is a slice of one frame instead of its own copy. The split is
+    fixed by split_indices before any target statistic is built.
 
-    X_train, X_val, y_train, y_val = train_test_split(
-        X_num, y, test_size=0.2, random_state=42
-    )
+    Returns the reordered frame (CatBoost), the float32 numeric matrix
+    (XGBoost / LightGBM), y and the train size.
+    """
+    progress("STEP 7: TRAIN/VAL SPLIT")
+
+    order = np.concatenate([train_idx, val_idx])
+    X_fe = X_fe.take(order)
+    y = y.take(order)
+
+    X_num = X_fe[num_features].to_numpy(dtype=FEATURE_DTYPE)
 
-    print(f"Train rows = {len(X_train)}, Validation rows = {len(X_val)}")
+    print(f"Numeric feature count = {len(num_features)}")
+    print(f"Train rows = {len(train_idx)}, Validation rows = {len(val_idx)}")
 
-    return X_train, X_val, y_train, y_val, X_num
+    return X_fe, X_num, y, len(train_idx)
 
 
 # =============================================================
 # STEP 8 — SCALING NUMERIC FEATURES FOR XGBOOST
 # =============================================================
-def scale_data(X_train, X_val):
+def scale_data(pipeline, X_train, X_val):
     progress("STEP 8: SCALING NUMERIC FOR XGBOOST")
 
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_val_scaled = scaler.transform(X_val)
+    X_train_scaled = pipeline.fit_scaler(X_train)
+    X_val_scaled = pipeline.scaler.transform(X_val)
+    scaler = pipeline.scaler
 
     print("Scaling completed.")
     return scaler, X_train_scaled, X_val_scaled
@@ -189,38 +237,70 @@ def scale_data(X_train, X_val):
 # =============================================================
 # STEP 9 — TRAIN MODELS
 # =============================================================
-def train_models():
+def train_models(models_dir: str = MODELS_DIR):
+    """
+    Train the ensemble and write its bundle to `models_dir`. Pass a fresh
+    directory (model_registry.new_candidate_dir()) to stage a candidate
+    instead of overwriting the bundle that is serving.
+    """
+    os.makedirs(models_dir, exist_ok=True)
     df = load_data()
-    df = clean_data(df)
+    df, impute = clean_data(df)
 
-    df["machine_type"] = df["machine_type"].fillna("Unknown")
+    df["machine_type"] = as_category(df["machine_type"])
+
+    # split fixed up front: price statistics used as features see training rows only
+    train_idx, val_idx = split_indices(len(df))
 
     # ------------ STEP 3 ------------
-    build_demand_stats(df)
+    build_demand_stats(df, models_dir)
 
     # ------------ STEP 4 ------------
-    seasonal_analysis(df)
+    seasonal_analysis(df, models_dir)
+
+    # ------------ STEP 4b ------------
+    print("Building pincode spatial index...")
+    geo_index = build_geo_index(df.iloc[train_idx], models_dir)
+    print(f"Geo index (training split) saved → {models_dir}/geo_index.pkl")
+
+    # ------------ STEP 4c ------------
+    print("Building weekly price forecast curves...")
+    build_forecast(df, models_dir)
+    print(f"Forecast tensor saved → {models_dir}/forecast.npz")
+
+    # ------------ STEP 4d ------------
+    print("Building monthly weather climatology...")
+    build_climatology(df, models_dir)
+    print(f"Weather climatology saved → {models_dir}/weather_climatology.npz")
 
     # ------------ STEP 5 ------------
-    y = df["rental_price"].astype(float)
+    y = df["rental_price"].astype(FEATURE_DTYPE)
     X_raw = df.drop(columns=["rental_price"])
-    X_fe, freq_map = feature_engineering(X_raw)
+    del df
+    X_fe, pipeline = feature_engineering(X_raw, geo_index, impute, y, train_idx)
 
     # ------------ STEP 6 ------------
-    X_fe = encoding_step(X_raw["machine_type"], y, X_fe)
+    X_fe = encoding_step(pipeline, y, X_fe, models_dir)
+
+    num_features = list(X_fe.select_dtypes(include=["number"]).columns)
+    pipeline.fit_columns(X_fe, num_features)
+    mismatched = pipeline.check(X_raw, X_fe, skip=GEO_OUT_OF_FOLD)
+    print(f"Serving transform parity: {'OK' if not mismatched else mismatched}")
+    del X_raw
 
     # ------------ STEP 7 ------------
-    X_train, X_val, y_train, y_val, X_num = split_data(X_fe, y)
+    X_fe, X_num, y, n_train = split_data(X_fe, y, num_features, train_idx, val_idx)
+    y_train, y_val = y.iloc[:n_train], y.iloc[n_train:]
 
-    # For CatBoost
-    X_cat_train = X_fe.loc[X_train.index].copy()
-    X_cat_val = X_fe.loc[X_val.index].copy()
+    # XGBoost / LightGBM: float32 views into the one numeric matrix
+    X_train, X_val = X_num[:n_train], X_num[n_train:]
 
-    X_cat_train = X_cat_train.fillna("Unknown")
-    X_cat_val = X_cat_val.fillna("Unknown")
+    # CatBoost: slices of the feature frame (categoricals already have no NaN)
+    X_cat_train = X_fe.iloc[:n_train]
+    X_cat_val = X_fe.iloc[n_train:]
 
     # ------------ STEP 8 ------------
-    scaler, X_train_scaled, X_val_scaled = scale_data(X_train, X_val)
+    scaler, X_train_scaled, X_val_scaled = scale_data(pipeline, X_train, X_val)
 
     # =============================================================
     # STEP 9 — TRAINING MODELS
@@ -250,10 +330,7 @@ def train_models():
     lgbm.fit(X_train, y_train)
 
     print("🐈 Training CatBoost...")
-    cat_features_idx = [
-        i for i, col in enumerate(X_cat_train.columns)
-        if X_cat_train[col].dtype == "object"
-    ]
+    cat_features_idx = pipeline.cat_features_idx
 
     cat = CatBoostRegressor(
         iterations=300,
@@ -291,28 +368,51 @@ def train_models():
     print(f"   RMSE: {rmse:.4f}")
     print(f"   R2  : {r2:.4f}\n")
 
+    # =============================================================
+    # STEP 10b — DISTILLED FAST PATH (student fit on ensemble outputs)
+    # =============================================================
+    progress("STEP 10b: DISTILLING FAST-PATH STUDENT")
+
+    def teacher(idx, split):
+        scaled, num, frame = ((X_train_scaled, X_train, X_cat_train) if split == "train"
+                              else (X_val_scaled, X_val, X_cat_val))
+        return (xgb.predict(scaled[idx]) + lgbm.predict(num[idx]) + cat.predict(frame.iloc[idx])) / 3.0
+
+    student = distill(teacher, X_train, X_val, y_val, preds, num_features)
+    sm = student.metrics
+    print(f"   MAE vs ensemble : {sm['mae_vs_ensemble']:.4f}")
+    print(f"   MAE (student)   : {sm['mae_student']:.4f}  (ensemble {sm['mae_ensemble']:.4f})")
+    print(f"   CPU/row single  : {sm['cpu_us_per_row_single']['ensemble']:.0f} us → "
+          f"{sm['cpu_us_per_row_single']['student']:.0f} us")
+    print(f"   CPU/row batch   : {sm['cpu_us_per_row_batch']['ensemble']:.1f} us → "
+          f"{sm['cpu_us_per_row_batch']['student']:.1f} us\n")
+
 
     # =============================================================
     # STEP 11 — SAVE MODELS
     # =============================================================
     progress("STEP 11: SAVING MODELS & ARTIFACTS")
 
-    with open(os.path.join(MODELS_DIR, "scaler.pkl"), "wb") as f:
+    pipeline.save(models_dir)
+
+    with open(os.path.join(models_dir, "scaler.pkl"), "wb") as f:
         pickle.dump(scaler, f)
 
-    with open(os.path.join(MODELS_DIR, "xgb.pkl"), "wb") as f:
+    with open(os.path.join(models_dir, "xgb.pkl"), "wb") as f:
         pickle.dump(xgb, f)
 
-    with open(os.path.join(MODELS_DIR, "lgbm.pkl"), "wb") as f:
+    with open(os.path.join(models_dir, "lgbm.pkl"), "wb") as f:
         pickle.dump(lgbm, f)
 
-    with open(os.path.join(MODELS_DIR, "cat.pkl"), "wb") as f:
+    with open(os.path.join(models_dir, "cat.pkl"), "wb") as f:
         pickle.dump(cat, f)
 
-    with open(os.path.join(MODELS_DIR, "num_features.pkl"), "wb") as f:
-        pickle.dump(list(X_num.columns), f)
+    with open(os.path.join(models_dir, "num_features.pkl"), "wb") as f:
+        pickle.dump(num_features, f)
+
+    student.save(models_dir)
 
-    with open(os.path.join(MODELS_DIR, "cat_meta.pkl"), "wb") as f:
+    with open(os.path.join(models_dir, "cat_meta.pkl"), "wb") as f:
         pickle.dump(
             {"columns": list(X_cat_train.columns), "cat_features_idx": cat_features_idx},
             f,
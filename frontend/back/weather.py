@@ -25,3 +25,22 @@ def get_weather(lat: float | None, lon: float | None) -> dict:
     except Exception as e:
         logger.warning(f"Weather API error: {e}")
         return {}
+
+
+def normalize_weather(raw: dict) -> dict:
+    """OpenWeather /weather payload → the flat fields the model uses."""
+    main = raw.get("main", {})
+    wind = raw.get("wind", {})
+
+    rain = 0.0
+    if isinstance(raw.get("rain"), dict):
+        rain = list(raw["rain"].values())[0]
+
+    return {
+        "temp": main.get("temp"),
+        "humidity": main.get("humidity"),
+        "pressure": main.get("pressure"),
+        "wind_speed": wind.get("speed"),
+        "rain": rain,
+        "description": (raw.get("weather") or [{}])[0].get("description", ""),
+    }
@@ -0,0 +1,281 @@
+# weather_store.py
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from logging_config import get_logger
+from model_utils import parse_dates
+from weather import get_weather, normalize_weather
+
+logger = get_logger("weather_store")
+
+MODELS_DIR = "models"
+CLIMATE_FILE = "weather_climatology.npz"             # inside each bundle dir
+WEATHER_DB = os.getenv("WEATHER_DB", os.path.join("data", "weather_cache.sqlite"))
+
+GRID = 10                      # cells per degree (≈ 11 km)
+FRESH_S = 3 * 3600             # newer than this → hit
+STALE_S = 48 * 3600            # newer than this → stale (served, refresh queued)
+REFRESH_GAP_S = 1.0            # pause between OpenWeather calls
+SWEEP_S = 15 * 60              # how often known cells are checked for age
+SHRINK = 10.0                  # pseudo-observations toward the monthly all-region mean
+
+FIELDS = ["temp", "humidity", "pressure", "wind_speed", "rain"]
+# used only when no climatology has been built yet
+CLIMATE_DEFAULT = {"temp": 28.0, "humidity": 65.0, "pressure": 1008.0, "wind_speed": 3.0, "rain": 0.0}
+
+
+def _cell(lat: float, lng: float) -> tuple[int, int]:
+    return (round(float(lat) * GRID), round(float(lng) * GRID))
+
+
+# ------------------------------------------------------------
+# CLIMATOLOGY (train.py) — mean weather per (pincode prefix, month)
+# ------------------------------------------------------------
+def build_climatology(df: pd.DataFrame, models_dir: str = MODELS_DIR) -> dict:
+    month = parse_dates(df["created_at"]).dt.month
+    ok = month.notna().to_numpy()
+    m = month[ok].to_numpy(int) - 1
+    prefix = df["pincode"][ok].astype(str).str.strip().str[:3].astype("category")
+    regions = prefix.cat.categories.astype(str)
+    r = prefix.cat.codes.to_numpy()
+    R = len(regions)
+
+    values = np.column_stack([
+        pd.to_numeric(df[c][ok], errors="coerce").to_numpy(float) if c in df else np.full(ok.sum(), np.nan)
+        for c in FIELDS
+    ])
+    default = np.array([CLIMATE_DEFAULT[c] for c in FIELDS])
+
+    def _means(key, size):
+        sums = np.zeros((size, len(FIELDS)))
+        counts = np.zeros((size, len(FIELDS)))
+        for j in range(len(FIELDS)):
+            v = values[:, j]
+            good = np.isfinite(v)
+            sums[:, j] = np.bincount(key[good], v[good], size)
+            counts[:, j] = np.bincount(key[good], minlength=size)
+        return sums, counts
+
+    g_sum, g_n = _means(np.zeros(len(m), dtype=int), 1)
+    overall = np.where(g_n[0] > 0, g_sum[0] / np.maximum(g_n[0], 1), default)
+    m_sum, m_n = _means(m, 12)
+    monthly = (m_sum + SHRINK * overall) / (m_n + SHRINK)                       # (12, F)
+    rm_sum, rm_n = _means(r * 12 + m, R * 12)
+    parent = np.tile(monthly, (R, 1))
+    regional = ((rm_sum + SHRINK * parent) / (rm_n + SHRINK)).reshape(R, 12, -1)
+
+    # extra region slot R = all regions (unknown pincode prefix)
+    table = np.concatenate([regional, monthly[None]], axis=0).astype(np.float32)   # (R+1, 12, F)
+    payload = {"table": table, "regions": np.asarray(regions, dtype=str), "fields": np.asarray(FIELDS)}
+    path = os.path.join(models_dir, CLIMATE_FILE)
+    np.savez(path, **payload)
+    logger.info(f"Weather climatology {table.shape} saved → {path}")
+    return payload
+
+
+# ------------------------------------------------------------
+# STORE (serving) — latest observation per grid cell, never blocks
+# ------------------------------------------------------------
+class WeatherStore:
+    """
+    Latest OpenWeather observation per rounded (lat, lng) cell, held in
+    memory and persisted to SQLite keyed by (cell, hour). Lookups never
+    touch the network: a fresh observation is a hit, an aging one is
+    served as stale, and with nothing usable the monthly climatology for
+    the pincode prefix answers. Stale and missing cells are queued for
+    the background refresher.
+    """
+
+    def __init__(self, db_path: str = WEATHER_DB, models_dir: str | None = None, fetch=get_weather):
+        self.db_path = db_path
+        self.models_dir = models_dir         # climatology bundle; None: follow the serving primary
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._latest: dict[tuple[int, int], tuple[float, dict]] = {}
+        self._coords: dict[tuple[int, int], tuple[float, float]] = {}
+        self._pending: set = set()
+        self._queue: queue.Queue = queue.Queue()
+        self._climate = None                 # (path, mtime, table, regions, fields)
+        self._thread = None
+        self.counts = {"hit": 0, "stale": 0, "miss": 0, "refreshed": 0, "refresh_errors": 0}
+        self._loaded = False                 # SQLite is opened on first use, not at import
+
+    # ---------------- persistence ----------------
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS weather ("
+            " lat_cell INTEGER, lng_cell INTEGER, hour INTEGER, fetched_at REAL,"
+            " temp REAL, humidity REAL, pressure REAL, wind_speed REAL, rain REAL, description TEXT,"
+            " PRIMARY KEY (lat_cell, lng_cell, hour))"
+        )
+        return conn
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load_db()
+                self._loaded = True
+
+    def _load_db(self) -> None:
+        try:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT lat_cell, lng_cell, MAX(fetched_at), temp, humidity, pressure, wind_speed, rain, description"
+                " FROM weather GROUP BY lat_cell, lng_cell"
+            ).fetchall()
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Weather cache unavailable ({self.db_path}): {e}")
+            return
+        for lat_c, lng_c, fetched_at, *vals in rows:
+            cell = (lat_c, lng_c)
+            self._latest[cell] = (fetched_at, dict(zip(FIELDS + ["description"], vals)))
+            self._coords[cell] = (lat_c / GRID, lng_c / GRID)
+        logger.info(f"Weather cache: {len(rows)} cells loaded from {self.db_path}")
+
+    def _save(self, conn, cell, fetched_at: float, obs: dict) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO weather VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (*cell, int(fetched_at // 3600), fetched_at, *(obs.get(c) for c in FIELDS), obs.get("description", "")),
+        )
+        conn.commit()
+
+    # ---------------- climatology ----------------
+    def _climate_path(self) -> str:
+        models_dir = self.models_dir
+        if models_dir is None:
+            from model_registry import registry      # lazy: train.py imports this module without serving
+            models_dir = registry.config()["primary"]
+        return os.path.join(models_dir, CLIMATE_FILE)
+
+    def _climatology(self, pincode, month: int) -> dict:
+        path = self._climate_path()
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if self._climate is None or self._climate[:2] != (path, mtime):
+            if mtime is not None:
+                with np.load(path) as z:
+                    regions = {p: i for i, p in enumerate(z["regions"].tolist())}
+                    self._climate = (path, mtime, z["table"], regions, z["fields"].tolist())
+            else:
+                self._climate = (path, None, None, {}, FIELDS)
+        table, regions, fields = self._climate[2:]
+        if table is None:
+            return dict(CLIMATE_DEFAULT)
+        ri = regions.get(str(pincode or "").strip()[:3], len(regions))
+        return dict(zip(fields, table[ri, month - 1].astype(float).tolist()))
+
+    # ---------------- lookup ----------------
+    def lookup(self, lat, lng, pincode=None, when: datetime | None = None) -> dict:
+        """Model weather fields + description + source ("live" / "stale" / "climatology")."""
+        self._ensure_loaded()
+        now = time.time()
+        cell = None if lat is None or lng is None else _cell(lat, lng)
+        entry = self._latest.get(cell) if cell is not None else None
+        age = now - entry[0] if entry else None
+
+        if age is not None and age <= STALE_S:
+            kind = "hit" if age <= FRESH_S else "stale"
+            out = {**entry[1], "source": "live" if kind == "hit" else "stale", "age_s": round(age)}
+        else:
+            kind = "miss"
+            out = {**self._climatology(pincode, (when or datetime.now()).month),
+                   "description": "", "source": "climatology"}
+        with self._lock:
+            self.counts[kind] += 1
+
+        if cell is not None and kind != "hit":
+            self._enqueue(cell, float(lat), float(lng))
+        # a live observation may lack a field; fill it from climatology, never zero
+        if any(out.get(c) is None for c in FIELDS):
+            clim = self._climatology(pincode, (when or datetime.now()).month)
+            out.update({c: clim[c] for c in FIELDS if out.get(c) is None})
+        return out
+
+    # ---------------- background refresher ----------------
+    def _enqueue(self, cell, lat: float, lng: float) -> None:
+        with self._lock:
+            self._coords.setdefault(cell, (lat, lng))
+            if cell in self._pending:
+                return
+            self._pending.add(cell)
+        self._queue.put(cell)
+
+    def refresh(self, conn, cell) -> bool:
+        lat, lng = self._coords[cell]
+        raw = self._fetch(lat, lng)
+        if not raw:
+            with self._lock:
+                self.counts["refresh_errors"] += 1
+            return False
+        fetched_at = time.time()
+        obs = normalize_weather(raw)
+        self._latest[cell] = (fetched_at, obs)
+        self._save(conn, cell, fetched_at, obs)
+        with self._lock:
+            self.counts["refreshed"] += 1
+        return True
+
+    def _sweep(self) -> None:
+        """Queue every known cell whose observation is no longer fresh."""
+        cutoff = time.time() - FRESH_S
+        for cell, (lat, lng) in list(self._coords.items()):
+            entry = self._latest.get(cell)
+            if entry is None or entry[0] < cutoff:
+                self._enqueue(cell, lat, lng)
+
+    def _run(self) -> None:
+        conn = self._connect()
+        last_sweep = 0.0
+        while True:
+            if time.time() - last_sweep >= SWEEP_S:
+                self._sweep()
+                last_sweep = time.time()
+            try:
+                cell = self._queue.get(timeout=SWEEP_S)
+            except queue.Empty:
+                continue
+            try:
+                self.refresh(conn, cell)
+            except Exception as e:
+                logger.warning(f"Weather refresh failed for {cell}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(cell)
+            time.sleep(REFRESH_GAP_S)
+
+    def start_refresher(self):
+        self._ensure_loaded()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="weather-refresher", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stats(self) -> dict:
+        self._ensure_loaded()
+        with self._lock:
+            counts = dict(self.counts)
+            queued = len(self._pending)
+        lookups = counts["hit"] + counts["stale"] + counts["miss"]
+        return {
+            **counts,
+            "lookups": lookups,
+            "hit_ratio": round(counts["hit"] / lookups, 4) if lookups else 0.0,
+            "stale_ratio": round(counts["stale"] / lookups, 4) if lookups else 0.0,
+            "miss_ratio": round(counts["miss"] / lookups, 4) if lookups else 0.0,
+            "cells": len(self._latest),
+            "queued": queued,
+        }
+
+
+weather_store = WeatherStore()